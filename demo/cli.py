@@ -0,0 +1,204 @@
+"""
+合同生成命令行入口
+Contract Generation Command Line Entry
+无需图形界面和 PyQt5，即可在服务器、容器或批处理任务中执行合同推荐与生成。
+
+用法 / Usage（在 demo 目录下）:
+    python cli.py recommend --type Ministerial --input 纪要.txt
+    python cli.py generate --type Ministerial --template "保管合同　GF—2000—0801" --input 纪要.txt --output out.docx
+    cat 纪要.txt | python cli.py generate --type Ministerial
+    python cli.py recommend-batch --type Ministerial --input-dir 历史纪要/ > 推荐结果.jsonl
+    python cli.py index add --type Ministerial "新模板名称"
+    python cli.py index update|remove --type Ministerial "模板名称"
+    python cli.py index rebuild --type Regional
+    python cli.py index convert --type Regional --index-type hnsw --param M=32
+    python cli.py index tune --type Regional --param efSearch=128
+    python cli.py index convert --type Regional --index-type pq --param m=48
+    python cli.py --no-llm-cache recommend --type Ministerial --input 纪要.txt
+    python cli.py --log-level DEBUG generate --type Ministerial --input 纪要.txt
+    python cli.py --trace generate --type Ministerial --input 纪要.txt
+"""
+import sys
+import os
+import json
+import argparse
+from contextlib import redirect_stdout
+from services.contract import ContractService
+from services.pipeline import run_recommendation, run_generation, save_generation_result
+from services.knowledge_base import INDEX_TYPES
+from services.log_sink import setup_logging
+from services.tracing import enable_tracing, trace
+from core.config import *
+
+
+def read_minutes(path):
+    """从文件或标准输入（path 为 '-' 时）读取会议纪要"""
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def log(message):
+    """命令行日志输出到标准错误，标准输出只保留结果"""
+    print(message, file=sys.stderr)
+
+
+def recommend(contract_service, args, user_input):
+    """执行合同推荐，返回推荐结果字典"""
+    with redirect_stdout(sys.stderr), trace("recommendation"):
+        result = run_recommendation(contract_service, user_input, args.type, progress=log)
+    if result is None:
+        raise RuntimeError("输入为空或与合同无关，未生成推荐结果")
+    if result["status"] == "failed":
+        raise RuntimeError(result["message"])
+    return result
+
+
+def cmd_recommend(contract_service, args):
+    """recommend 子命令：输出推荐的合同模板"""
+    result = recommend(contract_service, args, read_minutes(args.input))
+    data = result["data"]
+    if args.json:
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+        return
+    for row, rec in enumerate(data["recommendations"], start=1):
+        print(f"{row}\t{rec['name']}\t{rec['score']}%\t{rec['confidence']}")
+
+
+def cmd_recommend_batch(contract_service, args):
+    """recommend-batch 子命令：对目录中的全部会议纪要批量推荐，每行输出一条 JSON"""
+    names = sorted(name for name in os.listdir(args.input_dir) if name.endswith(".txt"))
+    minutes = [read_minutes(os.path.join(args.input_dir, name)) for name in names]
+    with redirect_stdout(sys.stderr):
+        results = contract_service.recommend_batch(minutes, args.type, analyze=args.analyze)
+    for name, result in zip(names, results):
+        print(json.dumps({"file": name, **(result or {"recommendations": [], "analysis": None})}, ensure_ascii=False))
+
+
+def cmd_generate(contract_service, args):
+    """generate 子命令：填充合同模板并保存 .docx"""
+    user_input = read_minutes(args.input)
+    template = args.template
+    if not template:
+        # 未指定模板时使用推荐结果中的第一个
+        recommendations = recommend(contract_service, args, user_input)["data"]["recommendations"]
+        if not recommendations:
+            raise RuntimeError("未找到匹配的合同模板，请使用 --template 指定")
+        template = recommendations[0]["name"]
+        log(f"使用推荐模板: {template}")
+
+    with redirect_stdout(sys.stderr), trace("generation"):
+        result = run_generation(contract_service, user_input, template, args.type, progress=log)
+        if result is None:
+            raise RuntimeError(f"合同生成失败，请检查模板和占位符文件: {template}")
+        if result["status"] == "failed":
+            raise RuntimeError(result["message"])
+        result = save_generation_result(contract_service, result, args.output)
+    log(f"智能填写的合同已保存到 {result['data']['file_path']}")
+    print(result["data"]["file_path"])
+
+
+def parse_params(items):
+    """解析 --param KEY=VALUE 形式的索引参数，值按整数处理"""
+    params = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"索引参数格式应为 KEY=VALUE: {item}")
+        params[key.strip()] = int(value)
+    return params
+
+
+def cmd_index(contract_service, args):
+    """index 子命令：增量维护知识库索引，只对变化的模板编码"""
+    params = parse_params(args.param)
+    if args.action in ("rebuild", "convert"):
+        if args.action == "convert" and not args.index_type:
+            raise ValueError("index convert 需要指定 --index-type")
+        with redirect_stdout(sys.stderr):
+            if args.action == "rebuild":
+                count = contract_service.rebuild_knowledge_base(args.type, args.index_type, params or None)
+            else:
+                count = contract_service.convert_knowledge_base(args.type, args.index_type, params or None)
+        print(f"{args.type}\t{count}")
+        return
+    if args.action == "tune":
+        if not params:
+            raise ValueError("index tune 需要至少一个 --param，如 efSearch=128、nprobe=16 或 rescore=8")
+        with redirect_stdout(sys.stderr):
+            contract_service.set_search_params(args.type, **params)
+        print(f"{args.type}\t{params}")
+        return
+    if not args.names:
+        raise ValueError(f"index {args.action} 需要至少一个模板名称")
+    operation = {
+        "add": contract_service.add_template,
+        "update": contract_service.update_template,
+        "remove": contract_service.remove_template,
+    }[args.action]
+    for name in args.names:
+        with redirect_stdout(sys.stderr):
+            template_id = operation(args.type, name)
+        print(f"{args.action}\t{template_id}\t{name}")
+
+
+def build_parser():
+    """构造命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="合同推荐与生成（命令行版）")
+    parser.add_argument("--no-llm-cache", action="store_true", help="不使用大模型响应缓存，每次都调用 API")
+    parser.add_argument("--log-level", default=LOG_LEVEL, help="服务日志级别，DEBUG 时输出调试信息（输出到标准错误）")
+    parser.add_argument("--trace", action="store_true", default=TRACE_ENABLED,
+                        help=f"记录各阶段耗时，追加到 {TRACE_JSONL_PATH} 并更新 {TRACE_PROMETHEUS_PATH}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    recommend_parser = subparsers.add_parser("recommend", help="根据会议纪要推荐合同模板")
+    recommend_parser.add_argument("--type", required=True, help="合同类型，如 Ministerial、Regional")
+    recommend_parser.add_argument("--input", default="-", help="会议纪要文件路径，默认从标准输入读取")
+    recommend_parser.add_argument("--json", action="store_true", help="以JSON格式输出推荐结果和需求分析")
+    recommend_parser.set_defaults(func=cmd_recommend)
+
+    batch_parser = subparsers.add_parser("recommend-batch", help="对目录中的全部会议纪要（.txt）批量推荐合同模板")
+    batch_parser.add_argument("--type", required=True, help="合同类型，如 Ministerial、Regional")
+    batch_parser.add_argument("--input-dir", required=True, help="会议纪要目录，每个 .txt 文件为一份纪要")
+    batch_parser.add_argument("--analyze", action="store_true", help="逐条调用大模型做需求分析和关键词提取（较慢）")
+    batch_parser.set_defaults(func=cmd_recommend_batch)
+
+    generate_parser = subparsers.add_parser("generate", help="根据会议纪要填充合同模板")
+    generate_parser.add_argument("--type", required=True, help="合同类型，如 Ministerial、Regional")
+    generate_parser.add_argument("--template", help="合同模板名称，默认使用推荐结果中的第一个")
+    generate_parser.add_argument("--input", default="-", help="会议纪要文件路径，默认从标准输入读取")
+    generate_parser.add_argument("--output", help=f"输出 .docx 路径，默认保存到 {GENERATED_DIR}")
+    generate_parser.set_defaults(func=cmd_generate)
+
+    index_parser = subparsers.add_parser("index", help="维护知识库索引（新增/更新/删除单个模板、重建、转换索引类型、调整检索参数）")
+    index_parser.add_argument("action", choices=["add", "update", "remove", "rebuild", "convert", "tune"], help="操作类型")
+    index_parser.add_argument("names", nargs="*", help="模板名称（对应 template/<type>/关键词/<名称>.txt）")
+    index_parser.add_argument("--type", required=True, help="合同类型，如 Ministerial、Regional")
+    index_parser.add_argument("--index-type", choices=list(INDEX_TYPES), help="索引类型（rebuild/convert）")
+    index_parser.add_argument("--param", action="append", metavar="KEY=VALUE",
+                              help="索引参数，可重复，如 M=32、efSearch=128、nlist=256、nprobe=16、m=48、rescore=8")
+    index_parser.set_defaults(func=cmd_index)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level)
+    if args.trace:
+        enable_tracing(TRACE_JSONL_PATH, TRACE_PROMETHEUS_PATH)
+    # 资源加载的日志同样输出到标准错误
+    with redirect_stdout(sys.stderr):
+        contract_service = ContractService(lazy=True)
+    if args.no_llm_cache:
+        contract_service.llm_cache_enabled = False
+    try:
+        args.func(contract_service, args)
+    except Exception as e:
+        log(f"错误: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,9 @@ BASE_DIR = Path(__file__).parent.parent
 # Embedding model configuration
 MiniLM_MODEL_NAME = 'all-MiniLM-L6-v2'  # 嵌入模型名称/Embedding model name
 MODEL_DIR = BASE_DIR.joinpath('embed_model').absolute()  # 嵌入模型目录/Embedding model directory
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # 查询向量缓存条目数，0为禁用/Query embedding cache entries, 0 disables
+QUERY_EMBEDDING_CACHE_TTL = 3600  # 查询向量缓存有效期（秒）/Query embedding cache TTL in seconds
+EMBEDDING_STORE_PATH = os.path.join(MODEL_DIR, 'embedding_store.sqlite3')  # 模板向量持久化存储/Template embedding store
 
 # 合同模板相关目录
 # Contract template related directories
@@ -22,7 +25,12 @@ CONTRACT_DIR = os.path.join(BASE_DIR, "contracts")  # 合同主目录/Contract m
 TEMPLATE_DIR = os.path.join(CONTRACT_DIR, "template")  # 模板目录/Template directory
 GENERATED_DIR = os.path.join(CONTRACT_DIR, "generated")  # 生成合同目录/Generated contracts directory
 RAG_DIR = os.path.join(CONTRACT_DIR, "RAG")  # RAG知识库目录/RAG knowledge base directory
+INDEX_TYPE = "flat"  # 重建知识库时的索引类型：flat/hnsw/ivf/sq8/pq/Index type used when rebuilding a knowledge base
+INDEX_PARAMS = {}  # 索引参数，未指定的使用默认值，如 {"efSearch": 128}/Index parameters, defaults apply when omitted
+INDEX_MMAP = True  # 以只读内存映射方式加载索引，多进程共享页缓存/Load indexes memory-mapped and read-only, shared across processes
 TRAN_TEMPLATE_DIR = os.path.join(CONTRACT_DIR, "tran_template")  # 翻译模板目录/Translation template directory
+TEMPLATE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 内存中缓存的已解析模板的估算大小上限，0为不缓存/Memory budget for parsed templates, 0 disables the cache
+GENERATION_BACKEND = "docx"  # 生成方式：docx（python-docx 加载后填充）/stream（流式改写模板 XML，内存占用与文档大小无关）/Generation backend: python-docx or streaming OOXML rewrite
 
 # 确保目录存在
 # Ensure directories exist
@@ -32,4 +40,44 @@ for dir_path in [CONTRACT_DIR, TEMPLATE_DIR, GENERATED_DIR, RAG_DIR]:
 # 大模型API配置
 # LLM API configuration
 API_KEY = "YOUR_API_KEY_OF_QWEN"  # 千问API密钥/Qwen API key
-LLM_MODEL_NAME = 'qwen-turbo'  # 千问模型名称/Qwen model name
\ No newline at end of file
+LLM_MODEL_NAME = 'qwen-turbo'  # 千问模型名称/Qwen model name
+LLM_BACKEND = "http"  # 调用方式：http（连接池直连接口）/sdk（dashscope SDK）/Transport: pooled HTTP or dashscope SDK
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")  # 接口地址，可指向本地模拟服务/API base URL, may point to the local mock server
+LLM_POOL_SIZE = 8  # HTTP连接池大小/HTTP connection pool size
+LLM_TIMEOUT = 60  # 单次调用截止时间（秒，含重试）/Per-call deadline in seconds, including retries
+LLM_MAX_RETRIES = 3  # 超时、限流和服务端错误的最大重试次数/Max retries on timeouts, 429 and 5xx
+LLM_RETRY_BACKOFF = 0.5  # 首次重试的退避上限（秒），之后翻倍并随机抖动/Initial retry backoff cap in seconds
+LLM_STREAM = True  # 流式提取占位符，模板加载和填充与模型输出并行进行/Stream placeholder extraction and fill the template while tokens arrive
+PH_GROUP_SIZE = 40  # 每次调用提取的最多占位符数，超过时分组并发提取，0为不分组/Max placeholders per extraction call, 0 disables grouping
+PH_GROUP_WORKERS = 4  # 占位符分组的最大并发调用数/Max concurrent calls for placeholder groups
+PRE_EXTRACT_ENABLED = True  # 调用模型前先用规则提取日期、金额、电话等结构化占位符/Rule-based pre-extraction before the LLM
+LLM_MAX_TOKENS_IN_FLIGHT = 32000  # 同时发往模型的 token 总数上限，0为不限制/Cap on tokens in flight across concurrent calls, 0 for unlimited
+LLM_OUTPUT_TOKENS = 800  # 估算在途 token 时每次调用预计的输出长度/Expected output tokens per call for the in-flight estimate
+LONG_INPUT_CHARS = 6000  # 会议纪要超过该长度时分段提取再合并/Minutes longer than this are segmented and map-reduced
+LONG_INPUT_SEGMENT_CHARS = 3000  # 每个分段的最大字符数/Max characters per segment
+LONG_INPUT_WORKERS = 4  # 分段的最大并发数/Max concurrent segments
+LLM_CACHE_ENABLED = True  # 是否使用大模型响应缓存，False 时每次都调用 API/Whether to use the LLM response cache
+LLM_CACHE_PATH = os.path.join(MODEL_DIR, 'llm_cache.sqlite3')  # 大模型响应持久化缓存/LLM response cache database
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 缓存响应文本总大小上限，0为不限制/Total cached response size limit, 0 for unlimited
+LLM_CACHE_TTL = {  # 各调用类型的缓存有效期（秒），0为不缓存/Cache TTL per call kind in seconds, 0 disables
+    "analysis": 7 * 24 * 3600,  # 用户需求分析/User needs analysis
+    "keywords": 7 * 24 * 3600,  # 会议纪要关键词/Minutes keywords
+    "placeholders": 24 * 3600,  # 占位符提取（含当事人信息）/Placeholder extraction (contains party details)
+    "template_keywords": 30 * 24 * 3600,  # 模板结构化关键词/Template keywords
+}
+
+# 日志配置
+# Logging configuration
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")  # 服务日志级别，DEBUG 时输出会议纪要原文、模型原始响应、检索细节等调试信息/Service log level, DEBUG adds verbose diagnostics
+LOG_FLUSH_MS = 100  # 界面日志的刷新间隔（毫秒）/GUI log flush interval in milliseconds
+LOG_FLUSH_MAX_LINES = 500  # 每次刷新最多写入界面的日志行数/Max log lines appended to the GUI per flush
+LOG_BUFFER_LINES = 10000  # 等待写入界面的日志行数上限，超出时丢弃最早的/Max pending GUI log lines, oldest are dropped beyond this
+LOG_MAX_LINES = 2000  # 界面日志保留的最多行数/GUI log scrollback in lines
+
+# 耗时追踪配置
+# Tracing configuration
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "0") == "1"  # 记录每次推荐/生成各阶段的耗时，未启用时几乎没有开销/Record per-stage latency of each recommendation/generation
+TRACE_DIR = os.path.join(BASE_DIR, "traces")  # 追踪输出目录/Trace output directory
+TRACE_JSONL_PATH = os.path.join(TRACE_DIR, "traces.jsonl")  # 每次流程一行 JSON 的追踪记录/One JSON line per pipeline run
+TRACE_PROMETHEUS_PATH = os.path.join(TRACE_DIR, "contract_latency.prom")  # Prometheus 文本格式的耗时直方图/Latency histograms in Prometheus text format
+TRACE_METRICS_PORT = 0  # 大于 0 时在该端口通过 HTTP /metrics 提供指标/Serve /metrics over HTTP on this port when > 0
@@ -1,21 +1,18 @@
 import sys
 import os
-import json
-import re
-import docx
-import gc
-import numpy as np
-from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QLabel, QComboBox, QPushButton, 
-                           QTextEdit, QFileDialog, QMessageBox, QProgressBar,
+                           QTextEdit, QMessageBox, QProgressBar,
                            QStatusBar, QTableWidget, QTableWidgetItem, QHeaderView)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QColor
 from services.contract import ContractService
 from core.config import *
 from services.RecommendationWorker import RecommendationWorker
 from services.GenerationWorker import GenerationWorker
+from services.ResourceLoadWorker import ResourceLoadWorker
+from services.log_sink import LogBuffer, setup_logging
+from services.tracing import enable_tracing
 
 
 class ContractGenerator(QMainWindow):
@@ -24,15 +21,20 @@ class ContractGenerator(QMainWindow):
     Main Window for Contract Generation
     提供合同类型选择、模板推荐、合同生成等完整交互。
     """
-    def __init__(self):
+    def __init__(self, contract_service: ContractService = None):
         """
         初始化主界面。
         Initialize main window.
+        :param contract_service: 合同服务实例，默认以 lazy=True 创建，资源在窗口显示后由后台线程加载
         """
         super().__init__()
-        self.contract_service = ContractService()
+        self.contract_service = contract_service or ContractService(lazy=True)
         self.recommendation_worker = None
+        self.resource_worker = None
+        # 后台线程的日志先写入缓冲，由定时器按固定间隔批量写入日志控件
+        self.log_buffer = LogBuffer(LOG_BUFFER_LINES)
         self.initUI()
+        self.start_resource_loading()
 
     def initUI(self):
         """
@@ -52,8 +54,7 @@ class ContractGenerator(QMainWindow):
         type_layout = QHBoxLayout()
         type_label = QLabel('合同类型:')
         self.type_combo = QComboBox()
-        template_types = self.contract_service.get_template_types()
-        self.type_combo.addItems(template_types.keys())
+        self.type_combo.addItems(self.contract_service.get_template_types().keys())
         self.type_combo.currentTextChanged.connect(self.update_templates)
         type_layout.addWidget(type_label)
         type_layout.addWidget(self.type_combo)
@@ -84,7 +85,11 @@ class ContractGenerator(QMainWindow):
         layout.addWidget(log_label)
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.document().setMaximumBlockCount(LOG_MAX_LINES)  # 超出时自动删除最早的行
         layout.addWidget(self.log_text)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(LOG_FLUSH_MS)
 
         # 结果表格
         result_label = QLabel('推荐结果:')
@@ -116,6 +121,36 @@ class ContractGenerator(QMainWindow):
         if self.type_combo.count() > 0:
             self.update_templates(self.type_combo.currentText())
 
+    def start_resource_loading(self):
+        """
+        在后台线程中加载模型、索引和合同类型映射，窗口无需等待。
+        Load model, indexes and template types on a worker thread so the window shows immediately.
+        """
+        if self.contract_service.is_loaded():
+            return
+        self.status_bar.showMessage('正在加载模型和索引...')
+
+        self.resource_worker = ResourceLoadWorker(self.contract_service)
+        self.resource_worker.progress.connect(self.status_bar.showMessage)
+        self.resource_worker.templates_ready.connect(self.handle_templates_ready)
+        self.resource_worker.finished.connect(self.handle_resources_loaded)
+        self.resource_worker.finished.connect(self.resource_worker.deleteLater)
+        self.resource_worker.start()
+
+    def handle_templates_ready(self, template_types):
+        """合同类型映射就绪后填充类型下拉框"""
+        if self.type_combo.count() > 0:
+            return
+        self.type_combo.addItems(template_types.keys())
+
+    def handle_resources_loaded(self, result):
+        """处理资源加载结果"""
+        if result["status"] == "failed":
+            self.status_bar.showMessage('资源加载失败')
+            QMessageBox.critical(self, "加载失败", result["message"])
+            return
+        self.status_bar.showMessage('就绪')
+
     def update_templates(self, contract_type: str):
         """更新模板列表"""
         self.template_combo.clear()
@@ -130,6 +165,7 @@ class ContractGenerator(QMainWindow):
             return
         
         # 清空之前的结果
+        self.log_buffer.clear()
         self.log_text.clear()
         self.result_table.setRowCount(0)
         self.progress_bar.setVisible(True)
@@ -147,7 +183,8 @@ class ContractGenerator(QMainWindow):
         )
         
         # 连接信号
-        self.recommendation_worker.progress.connect(self.update_log)
+        # 在后台线程中直接写入日志缓冲，不经过界面线程的事件队列
+        self.recommendation_worker.progress.connect(self.log_buffer.put, Qt.DirectConnection)
         self.recommendation_worker.update_progress.connect(self.update_progress_bar)
         self.recommendation_worker.finished.connect(self.handle_recommendation_result)
         self.recommendation_worker.finished.connect(self.recommendation_worker.deleteLater)
@@ -156,10 +193,21 @@ class ContractGenerator(QMainWindow):
         self.recommendation_worker.start()
 
     def update_log(self, message):
-        """更新日志显示"""
-        self.log_text.append(message)
-        self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
-        QApplication.processEvents()  # 确保UI及时更新
+        """更新日志显示：写入日志缓冲，下次定时刷新时显示"""
+        self.log_buffer.put(message)
+
+    def flush_log(self):
+        """把缓冲中的日志批量写入日志控件，每次最多 LOG_FLUSH_MAX_LINES 条"""
+        lines, dropped = self.log_buffer.drain(LOG_FLUSH_MAX_LINES)
+        if dropped:
+            lines.insert(0, f"……日志过多，已省略 {dropped} 条……")
+        if not lines:
+            return
+        scroll_bar = self.log_text.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+        self.log_text.append("\n".join(lines))
+        if at_bottom:  # 用户向上翻看时不强制滚动到底部
+            scroll_bar.setValue(scroll_bar.maximum())
 
     def update_progress_bar(self, value):
         """更新进度条"""
@@ -250,7 +298,8 @@ class ContractGenerator(QMainWindow):
         )
         
         # 连接信号
-        self.generation_worker.progress.connect(self.update_log)
+        # 在后台线程中直接写入日志缓冲，不经过界面线程的事件队列
+        self.generation_worker.progress.connect(self.log_buffer.put, Qt.DirectConnection)
         self.generation_worker.update_progress.connect(self.update_progress_bar)
         self.generation_worker.finished.connect(self.handle_generation_result)
         self.generation_worker.finished.connect(self.generation_worker.deleteLater)
@@ -272,33 +321,15 @@ class ContractGenerator(QMainWindow):
         
         self.status_bar.showMessage('合同生成完成')
         
+        # 文件已由后台线程保存，这里只显示路径和大小
         generation_file = result["data"]
-
-        # 保存文件
-        try:
-            file_path = os.path.join(GENERATED_DIR, generation_file["file_name"])
-            generation_file["filled_docx"].save(file_path)
-            
-            # 确保文件权限正确
-            try:
-                os.chmod(file_path, 0o644)  # 确保文件可读
-            except Exception as e:
-                print(f"警告: 设置文件权限失败: {str(e)}")
-        except Exception as e:
-            print(f"保存文件失败: {str(e)}")
-            ereply = QMessageBox.question(
-                self, 
-                '失败', 
-                f"保存文件失败: {str(e)}",
-                QMessageBox.No
-            )
-
+        file_path = generation_file["file_path"]
 
         # 显示成功消息
         reply = QMessageBox.question(
             self, 
             '完成', 
-            f'合同已生成到:\n{file_path}\n\n是否打开文件？',
+            f'合同已生成到:\n{file_path}（{generation_file["file_size"] / 1024:.0f}KB）\n\n是否打开文件？',
             QMessageBox.Yes | QMessageBox.No
         )
         
@@ -310,6 +341,9 @@ class ContractGenerator(QMainWindow):
         
 
 def main():
+    setup_logging(LOG_LEVEL)
+    if TRACE_ENABLED:
+        enable_tracing(TRACE_JSONL_PATH, TRACE_PROMETHEUS_PATH, TRACE_METRICS_PORT)
     app = QApplication(sys.argv)
     window = ContractGenerator()
     window.show()
@@ -0,0 +1,67 @@
+import traceback
+from PyQt5.QtCore import QThread, pyqtSignal
+from services.contract import ContractService
+
+
+class ResourceLoadWorker(QThread):
+    """
+    资源加载后台线程
+    Resource Loading Background Thread
+    在窗口显示后加载嵌入模型、FAISS索引和合同类型映射，并逐阶段发出就绪信号。
+    """
+    finished = pyqtSignal(dict)  # 全部资源加载完成时发送结果
+    progress = pyqtSignal(str)   # 进度更新信号
+    templates_ready = pyqtSignal(dict)  # 合同类型映射就绪信号
+    model_ready = pyqtSignal()   # 嵌入模型就绪信号
+    index_ready = pyqtSignal()   # FAISS索引就绪信号
+
+    def __init__(self, contract_service: ContractService):
+        """
+        初始化资源加载线程。
+        Initialize resource loading thread.
+        :param contract_service: 合同服务实例（以 lazy=True 创建）
+        """
+        super().__init__()
+        self.contract_service = contract_service
+        self.templates_emitted = False
+
+    def on_stage(self, stage: str):
+        """
+        将 ContractService 的加载阶段转换为Qt信号。
+        Translate ContractService loading stages into Qt signals.
+        """
+        if stage == "templates":
+            self.progress.emit("合同类型映射已加载")
+            self.templates_emitted = True
+            self.templates_ready.emit(self.contract_service.get_template_types())
+        elif stage == "model":
+            self.progress.emit("嵌入模型已加载")
+            self.model_ready.emit()
+        elif stage == "index":
+            self.progress.emit("FAISS 索引已加载")
+            self.index_ready.emit()
+
+    def run(self):
+        """
+        线程主逻辑，加载全部资源。
+        Main thread logic, load all resources.
+        """
+        try:
+            self.progress.emit("正在加载模型和索引...")
+            self.contract_service.ensure_loaded(on_stage=self.on_stage)
+            # 若资源已被其他线程加载，on_stage 不会被触发，这里补发类型映射
+            if not self.templates_emitted:
+                self.templates_ready.emit(self.contract_service.get_template_types())
+            self.finished.emit({
+                "status": "completed",
+                "message": "资源加载完成"
+            })
+        except Exception as e:
+            error_details = traceback.format_exc()
+            print(f"资源加载失败! 错误: {str(e)}")
+            print(f"详细错误信息:\n{error_details}")
+            self.progress.emit(f"资源加载失败: {str(e)}")
+            self.finished.emit({
+                "status": "failed",
+                "message": str(e)
+            })
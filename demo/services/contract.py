@@ -1,27 +1,44 @@
+from __future__ import annotations
+
 import os
 import shutil
-import docx
-from docx import Document
-from docx.text.paragraph import Paragraph
 import json
 from datetime import datetime
-from sentence_transformers import SentenceTransformer, util
-import torch
-import numpy as np
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Union, Any, cast, Sequence
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional, Union, Any, cast, Sequence, Callable, Iterator
 from core.config import *
-from dashscope import Generation
-from dashscope.api_entities.dashscope_response import GenerationResponse, Message
 import re
 import gc
-import faiss
+import logging
 import time
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from PyQt5.QtWidgets import QTextEdit
 from io import BytesIO
 import uuid
+import tempfile
 import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.embedding_cache import EmbeddingCache
+from services.embedding_store import EmbeddingStore, model_fingerprint
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMError, get_client
+from services.fill_engine import FillPlan, clean_document, document_roots
+from services.ooxml_stream import StreamedDocument
+from services.template_cache import TemplateCache
+from services.timing import in_context, span, traced
+from services.pre_extract import RuleExtractor
+from services.long_input import (TokenBudget, estimate_tokens, merge_analysis, merge_keywords,
+                                 merge_placeholders, split_segments)
+from services.knowledge_base import KnowledgeBase, create_index, template_filename
+
+# torch、sentence_transformers、faiss、dashscope、docx 等依赖导入耗时较长，
+# 仅在首次执行需要它们的代码路径时在函数内部导入，这里只为类型标注导入
+# Heavy dependencies are imported inside the functions that need them; these imports are for type hints only
+if TYPE_CHECKING:
+    import numpy as np
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
 
 class ContractService:
     """
@@ -29,22 +46,74 @@ class ContractService:
     Contract Service Core Class
     负责合同模板管理、嵌入模型加载、FAISS索引、合同推荐与生成等核心业务逻辑。
     """
-    def __init__(self):
+    def __init__(self, lazy: bool = False):
         """
         初始化合同服务，加载所有必要资源。
         Initialize contract service, load all required resources.
+        :param lazy: 为True时不在构造函数中加载资源，由 ensure_loaded() 在首次使用或后台线程中加载
         """
         self.model: Optional[SentenceTransformer] = None
         self.template_embeddings: Dict[str, np.ndarray] = {}
-        self.index: Dict[str, faiss.IndexFlatL2] = {}
+        self.index: Dict[str, faiss.Index] = {}
+        self.knowledge_bases: Dict[str, KnowledgeBase] = {}  # 合同类型 -> 知识库（索引+模板ID映射）
         self.filenames: List[str] = []
         self.template_types: Dict[str, List[str]] = {}
-        self.desc_edit: Optional[QTextEdit] = None  # 将在UI初始化时设置
+        self.model_name: Optional[str] = None  # 已加载模型的标识，用作查询向量缓存键的一部分
+        self.model_version: Optional[str] = None  # 已加载模型的版本指纹，用作向量存储键的一部分
+        self.query_embedding_cache = EmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+        self._embedding_store: Optional[EmbeddingStore] = None
+        self.llm_cache_enabled = LLM_CACHE_ENABLED  # 为 False 时绕过大模型响应缓存
+        self._llm_cache: Optional[LLMResponseCache] = None
+        self.token_budget = TokenBudget(LLM_MAX_TOKENS_IN_FLIGHT)  # 限制并发调用的在途 token 总量
+        self.pre_extract_enabled = PRE_EXTRACT_ENABLED  # 为 False 时全部占位符交给模型提取
+        self.rule_extractor = RuleExtractor()
+        self.template_cache = TemplateCache(TEMPLATE_CACHE_MAX_BYTES)  # 已解析的模板，生成时复制使用
+
+        # 资源加载状态：同一时间只允许一个线程加载，其余调用方等待其完成
+        # Resource loading state: only one thread loads, the others wait for it
+        self._load_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._index_lock = threading.Lock()  # 串行化知识库的增删改
         
         # 初始化关键组件
-        self.load_model()                  # 加载嵌入模型
+        if not lazy:
+            self.ensure_loaded()
+
+    # 加载全部资源
+    def load_resources(self, on_stage: Optional[Callable[[str], None]] = None):
+        """
+        依次加载合同类型映射、嵌入模型和 FAISS 索引。
+        Load template types, embedding model and FAISS indexes in order.
+        :param on_stage: 每个阶段完成后的回调，参数为阶段名（templates/model/index）
+        """
         self.load_template_types()         # 加载合同类型映射
+        if on_stage:
+            on_stage("templates")
+        self.load_model()                  # 加载嵌入模型
+        if on_stage:
+            on_stage("model")
         self.load_faiss_index()            # 加载 FAISS 索引
+        if on_stage:
+            on_stage("index")
+        self._loaded.set()
+
+    # 确保资源已加载
+    def ensure_loaded(self, on_stage: Optional[Callable[[str], None]] = None):
+        """
+        确保资源已加载。若其他线程正在加载，则等待其完成而不是重复加载。
+        Ensure resources are loaded. If another thread is loading, wait for it instead of loading again.
+        :param on_stage: 传给 load_resources 的阶段回调，仅在本次调用实际执行加载时触发
+        """
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if not self._loaded.is_set():
+                self.load_resources(on_stage)
+
+    # 资源是否已全部加载
+    def is_loaded(self) -> bool:
+        """资源是否已全部加载"""
+        return self._loaded.is_set()
     
     # 加载嵌入模型
     def load_model(self):
@@ -53,19 +122,24 @@ class ContractService:
         Load SentenceTransformer embedding model.
         优先本地加载，不存在则自动下载。
         """
+        model_path = os.path.join(MODEL_DIR, MiniLM_MODEL_NAME)
         try:
-            # 优先从本地加载模型
-            model_path = os.path.join(MODEL_DIR, MiniLM_MODEL_NAME)
-            # 确保模型目录存在
+            from sentence_transformers import SentenceTransformer
+
+            # 优先从本地加载模型，确保模型目录存在
             os.makedirs(MODEL_DIR, exist_ok=True)
             if os.path.exists(model_path):
                 self.model = SentenceTransformer(model_path)
+                self.model_name = model_path
+                self.model_version = model_fingerprint(model_path)
                 print(f"从本地加载模型成功: {model_path}")
             else:
                 # 本地模型不存在时从HuggingFace下载
                 self.model = SentenceTransformer(MiniLM_MODEL_NAME)
                 # 保存模型到本地
                 self.model.save(model_path)
+                self.model_name = model_path
+                self.model_version = model_fingerprint(model_path)
                 print(f"模型下载并保存成功: {model_path}")
         except Exception as e:
             if "MaxRetryError" in str(e) or "Failed to establish a new connection" in str(e):
@@ -84,13 +158,11 @@ class ContractService:
             for type_dir in os.listdir(RAG_DIR):
                 type_path = os.path.join(RAG_DIR, type_dir)
                 if os.path.isdir(type_path):
-                    for index in os.listdir(type_path):
-                        if index.endswith('.index'):
-                            index_path = os.path.join(type_path, index)
-                            # 使用 faiss.read_index 加载索引
-                            faiss_index = faiss.read_index(index_path)
-                            self.index[type_dir] = faiss_index
-                            print(f"{type_dir} 的 FAISS 索引已加载，包含 {self.index[type_dir].ntotal} 个向量")
+                    # 加载索引和模板ID映射（兼容旧格式的扁平索引 + filenames.txt）
+                    knowledge_base = KnowledgeBase.load(type_path, mmap=INDEX_MMAP)
+                    self.knowledge_bases[type_dir] = knowledge_base
+                    self.index[type_dir] = knowledge_base.index
+                    print(f"{type_dir} 的 FAISS 索引已加载（{knowledge_base.index_type}），包含 {self.index[type_dir].ntotal} 个向量")
         except Exception as e:
             print(f"从磁盘加载 FAISS 索引失败: {str(e)}")
 
@@ -102,9 +174,7 @@ class ContractService:
             for type_dir in os.listdir(RAG_DIR):
                 type_path = os.path.join(RAG_DIR, type_dir)
                 if os.path.isdir(type_path):
-                    filenames_path = os.path.join(type_path, "filenames.txt")
-                    with open(filenames_path, 'r', encoding='utf-8') as f:
-                        templates = f.readlines()
+                    templates = KnowledgeBase.read_filenames(type_path)
                     templates = [os.path.splitext(line.strip())[0] for line in templates if line.strip()]
                     if templates:
                         self.template_types[type_dir] = templates
@@ -299,89 +369,190 @@ class ContractService:
         Returns:
             清理后的Document对象
         """
-        # 清理段落中的占位符标记
-        for paragraph in docx.paragraphs:
-            # 使用正则表达式匹配剩余的空占位符标记
-            for run in paragraph.runs:
-                # 移除空的占位符标记 {xxxx}
-                run.text = re.sub(r'\{\s*\}', '', run.text)
-                
-            # 设置段落对齐方式为向左对齐（如果有明显格式问题）
-            # 仅在段落没有明确设置对齐方式时使用
-            if paragraph.alignment is None:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        
+        # 一次遍历正文、页眉和页脚：移除空的占位符标记 {}，正文段落没有明确设置对齐方式时设为左对齐。
+        # 只改写 w:t 文本，run 中的图片、域代码等保持不变
+        clean_document(document_roots(docx))
         return docx
 
+    # 大模型响应缓存（首次使用时打开）
+    @property
+    def llm_cache(self) -> LLMResponseCache:
+        """大模型响应持久化缓存，首次访问时打开数据库"""
+        if self._llm_cache is None:
+            self._llm_cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL)
+        return self._llm_cache
+
+    # 调用大模型
+    def call_llm(self, messages, kind) -> Optional[str]:
+        """
+        调用大模型并返回响应文本，相同模型和消息的成功响应会被缓存。
+        :param messages: 消息列表
+        :param kind: 调用类型（analysis/keywords/placeholders/template_keywords），决定缓存有效期
+        :return: 响应文本，调用失败（重试耗尽、超时、响应格式不正确等）时返回 None
+        """
+        if self.llm_cache_enabled:
+            cached = self.llm_cache.get(LLM_MODEL_NAME, messages, kind)
+            if cached is not None:
+                print(f"大模型响应缓存命中: {kind}")
+                return cached
+
+        try:
+            with span(f"llm.{kind}"), self.token_budget.reserve(estimate_tokens(messages, LLM_OUTPUT_TOKENS)):
+                response_text = get_client().chat(messages, model=LLM_MODEL_NAME)
+        except LLMError as e:
+            print(f"大模型调用失败: {str(e)}")
+            return None
+
+        # 只缓存非空的成功响应
+        if self.llm_cache_enabled and response_text:
+            self.llm_cache.put(LLM_MODEL_NAME, messages, kind, response_text)
+        return response_text
+
+    # 流式调用大模型
+    def stream_llm(self, messages, kind) -> Iterator[str]:
+        """
+        流式调用大模型，逐段返回响应文本；缓存命中时一次返回完整文本。
+        完整接收的非空响应写入缓存；调用失败时打印错误并结束，已返回的文本保持有效。
+        """
+        if self.llm_cache_enabled:
+            cached = self.llm_cache.get(LLM_MODEL_NAME, messages, kind)
+            if cached is not None:
+                print(f"大模型响应缓存命中: {kind}")
+                yield cached
+                return
+
+        pieces = []
+        try:
+            with self.token_budget.reserve(estimate_tokens(messages, LLM_OUTPUT_TOKENS)):
+                for piece in get_client().stream(messages, model=LLM_MODEL_NAME):
+                    pieces.append(piece)
+                    yield piece
+        except LLMError as e:
+            print(f"大模型流式调用失败: {str(e)}")
+            return
+
+        response_text = "".join(pieces)
+        if self.llm_cache_enabled and response_text:
+            self.llm_cache.put(LLM_MODEL_NAME, messages, kind, response_text)
+
+    # 大模型响应缓存统计
+    def get_llm_cache_stats(self) -> Dict[str, Any]:
+        """返回大模型响应缓存的条目数、大小及按调用类型的命中率"""
+        return self.llm_cache.stats()
+
+    # 模板缓存统计
+    def get_template_cache_stats(self) -> Dict[str, Any]:
+        """返回模板缓存的条目数、估算内存占用、命中率及平均解析和复制耗时"""
+        return self.template_cache.stats()
+
+    # 规则预提取统计
+    def get_pre_extract_stats(self) -> Dict[str, Any]:
+        """返回规则预提取的占位符数和减少的模型调用数"""
+        return self.rule_extractor.stats()
+
+    # 长会议纪要分段
+    def long_input_segments(self, text) -> Optional[List[str]]:
+        """会议纪要超过 LONG_INPUT_CHARS 时返回按段落切分的分段，否则返回 None"""
+        if not text or len(text) <= LONG_INPUT_CHARS:
+            return None
+        segments = split_segments(text, LONG_INPUT_SEGMENT_CHARS)
+        if len(segments) <= 1:
+            return None
+        print(f"会议纪要长度 {len(text)} 字符，分为 {len(segments)} 段分别提取后合并")
+        return segments
+
+    # 对各分段并发执行
+    def map_segments(self, func, segments: List[str]) -> list:
+        """对每个分段并发调用 func，结果按分段顺序返回；实际在途调用量由 token_budget 限制"""
+        with ThreadPoolExecutor(max_workers=min(LONG_INPUT_WORKERS, len(segments)), thread_name_prefix="segment") as executor:
+            return list(executor.map(in_context(func), segments))
+
+    # 占位符分组
+    def placeholder_groups(self, ph: List[str]) -> List[List[str]]:
+        """
+        占位符较多时按 PH_GROUP_SIZE 分成大小相近的若干组，每组单独调用模型，
+        避免单次输出过长导致耗时过久或 JSON 被截断。
+        """
+        if PH_GROUP_SIZE <= 0 or len(ph) <= PH_GROUP_SIZE:
+            return [ph]
+        count = -(-len(ph) // PH_GROUP_SIZE)
+        size = -(-len(ph) // count)
+        return [ph[i:i + size] for i in range(0, len(ph), size)]
+
+    # 构造占位符提取的消息
+    def placeholder_messages(self, text, ph_json):
+        """
+        加载占位符文件，先用规则预提取能确定的占位符，再把其余占位符分组构造发送给模型的消息。
+        :return: (每组的消息列表, 占位符列表, 规则预提取的结果)；占位符为空、用户输入为空或
+                 全部占位符已由规则提取时每组的消息列表为空
+        """
+        # 使用类方法加载JSON
+        ph = self.load_contract_json(ph_json)
+        logger.debug("从JSON文件加载的占位符: %s", ph)
+        
+        if not ph:
+            print(f"警告: 占位符列表为空，返回空字典")
+            return [], [], {}
+            
+        logger.debug("需要提取的关键词: %s", ",".join(ph))
+
+        # 检查输入是否为空
+        if not text or not text.strip():
+            print("警告: 用户输入为空，返回空字典")
+            return [], ph, {}
+
+        # 记录完整的用户输入到调试日志
+        if logger.isEnabledFor(logging.DEBUG):
+            lines = "\n".join(f"行{i+1}: {line}" for i, line in enumerate(text.split('\n')))
+            logger.debug("用户输入原始内容(每行，共 %d 字符):\n%s", len(text), lines)
+
+        # 规则预提取：已确定的占位符不再发给模型，提示词和调用次数随之减少
+        prefilled = self.rule_extractor.extract(text, ph) if self.pre_extract_enabled else {}
+        remaining = [key for key in ph if key not in prefilled]
+        groups = self.placeholder_groups(remaining) if remaining else []
+        self.rule_extractor.record(len(ph), len(prefilled), len(groups),
+                                   len(self.placeholder_groups(ph)) - len(groups))
+        if prefilled:
+            print(f"规则预提取 {len(prefilled)}/{len(ph)} 个占位符: {prefilled}")
+        if not groups:
+            print("全部占位符已由规则提取，无需调用模型")
+            return [], ph, prefilled
+
+        if len(groups) > 1:
+            print(f"占位符共 {len(remaining)} 个，分为 {len(groups)} 组并发提取")
+        messages_list = [self.format_message(text, ','.join(group)) for group in groups]
+
+        # 记录传给模型的消息
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, msg in enumerate(messages_list[0]):
+                logger.debug("消息%d - 角色: %s，内容(前100字符): %s...", i + 1, msg['role'], msg['content'][:100])
+        return messages_list, ph, prefilled
+
     # 合同信息提取主流程
+    @traced("extract_placeholders")
     def extract_ph(self, text, ph_json):
         # 从text中提取占位符对应的信息
         # return json格式
+        segments = self.long_input_segments(text)
+        if segments:
+            # 各分段分别提取，同一占位符的不同取值按最新或最具体者优先合并
+            return merge_placeholders(self.map_segments(lambda segment: self.extract_ph(segment, ph_json), segments))
         try:
-            # 使用类方法加载JSON
-            ph = self.load_contract_json(ph_json)
-            print(f"从JSON文件加载的占位符: {ph}")
-            
-            if not ph:
-                print(f"警告: 占位符列表为空，返回空字典")
-                return {}
-                
-            ph = ','.join(ph)
-            print(f"用户输入文本: {text}")
-            print(f"需要提取的关键词: {ph}")
-
-            # 检查输入是否为空
-            if not text or not text.strip():
-                print("警告: 用户输入为空，返回空字典")
-                return {}
+            messages_list, _, prefilled = self.placeholder_messages(text, ph_json)
+            if not messages_list:
+                return prefilled
 
-            # 记录完整的用户输入到日志，便于调试
-            print(f"=== 详细调试信息 - 开始 ===")
-            print(f"用户输入原始内容(每行):")
-            for i, line in enumerate(text.split('\n')):
-                print(f"行{i+1}: {line}")
-            print(f"用户输入内容长度: {len(text)}")
-            print(f"=== 详细调试信息 - 结束 ===")
-
-            messages = self.format_message(text, ph)
-
-            # 记录传给模型的消息
-            print(f"发送给模型的messages:")
-            for i, msg in enumerate(messages):
-                print(f"消息{i+1} - 角色: {msg['role']}")
-                print(f"消息{i+1} - 内容(前100字符): {msg['content'][:100]}...")
-            
-            # 调用API生成响应
-            print(f"开始调用大模型API...")
-            try:
-                response = Generation.call(
-                    api_key=API_KEY,
-                    model=LLM_MODEL_NAME,
-                    messages=messages,
-                    result_format="message"
-                )
-                print(f"大模型API调用完成")
-            except Exception as e:
-                print(f"大模型API调用失败: {str(e)}")
-                return {}  # API调用失败时返回空字典
-            
-            response_text = ""
-            if hasattr(response, 'output') and hasattr(response.output, 'choices'):
-                # 获取处理后的结果
-                try:
-                    response_text = response['output']['choices'][0]['message']['content']
-                    print(f"模型返回的原始响应: {response_text}")
-                except (KeyError, IndexError, TypeError) as e:
-                    print(f"解析模型响应失败: {str(e)}")
-                    return {}  # 解析响应失败时返回空字典
+            # 各组并发调用，结果按分组顺序合并
+            if len(messages_list) == 1:
+                results = [self.extract_ph_group(messages_list[0])]
             else:
-                print("API响应格式不正确")
-                print(f"响应对象内容: {str(response)}")
-                return {}  # 响应格式不正确时返回空字典
-            
-            print(f"开始解析JSON响应...")
-            response_json = self.clean_contract_json(response_text)
-            print(f"解析后的JSON数据: {response_json}")
+                with ThreadPoolExecutor(max_workers=min(PH_GROUP_WORKERS, len(messages_list)),
+                                        thread_name_prefix="ph") as executor:
+                    results = list(executor.map(in_context(self.extract_ph_group), messages_list))
+            response_json = {}
+            for result in results:
+                response_json.update(result)
+            response_json.update(prefilled)  # 规则提取的占位符未发给模型，以规则结果为准
             
             # 检查解析结果是否为空
             if not response_json:
@@ -393,12 +564,107 @@ class ContractService:
             # 捕获所有异常，确保函数总是返回字典而不是抛出异常
             return {}
 
+    # 提取一组占位符
+    def extract_ph_group(self, messages) -> Dict[str, Any]:
+        """调用模型提取一组占位符，调用或解析失败时返回空字典"""
+        # 调用API生成响应
+        print(f"开始调用大模型API...")
+        try:
+            response_text = self.call_llm(messages, "placeholders")
+            print(f"大模型API调用完成")
+        except Exception as e:
+            print(f"大模型API调用失败: {str(e)}")
+            return {}  # API调用失败时返回空字典
+        
+        if response_text is None:
+            return {}  # 响应格式不正确时返回空字典
+        logger.debug("模型返回的原始响应: %s", response_text)
+        response_json = self.clean_contract_json(response_text)
+        logger.debug("解析后的JSON数据: %s", response_json)
+        return response_json if isinstance(response_json, dict) else {}
+
+    # 流式提取占位符信息
+    @traced("extract_placeholders")
+    def extract_ph_stream(self, text, ph_json, on_item: Optional[Callable[[str, Any, int, int], None]] = None):
+        """
+        与 extract_ph 相同，但流式接收模型输出并增量解析 JSON，每个键值对完整后立即回调。
+        响应不是标准 JSON 时，在结束后用 clean_contract_json 整体解析，并为尚未回调的键补充回调。
+        占位符分组时各组并发流式调用，回调加锁串行执行，调用方无需自行同步。
+        长会议纪要分段提取时，后面分段的取值可能覆盖前面的，因此在合并后再逐个回调。
+        :param on_item: 回调 (键, 值, 已完成数量, 占位符总数)
+        :return: 提取结果字典，与 extract_ph 一致
+        """
+        from services.json_stream import JSONObjectStream
+
+        if self.long_input_segments(text):
+            response_json = self.extract_ph(text, ph_json)
+            for received, (key, value) in enumerate(response_json.items(), start=1):
+                if on_item:
+                    on_item(key, value, received, len(response_json))
+            return response_json
+
+        try:
+            messages_list, ph, prefilled = self.placeholder_messages(text, ph_json)
+            response_json: Dict[str, Any] = {}
+            emit_lock = threading.Lock()
+
+            def emit(key, value):
+                with emit_lock:
+                    if key in response_json:
+                        return
+                    response_json[key] = value
+                    if on_item:
+                        on_item(key, value, len(response_json), len(ph))
+
+            # 规则预提取的结果立即回调，模型只需提取其余占位符
+            for key, value in prefilled.items():
+                emit(key, value)
+            if not messages_list:
+                return response_json
+
+            def stream_group(messages):
+                parser = JSONObjectStream()
+                pieces = []
+                with span("llm.placeholders"):
+                    for piece in self.stream_llm(messages, "placeholders"):
+                        pieces.append(piece)
+                        for key, value in parser.feed(piece):
+                            emit(key, value)
+                response_text = "".join(pieces)
+                logger.debug("大模型API调用完成，模型返回的原始响应: %s", response_text)
+
+                if not parser.done and response_text:
+                    # 增量解析未能完整解析（格式不规范或输出被截断），整体清理后补齐
+                    logger.debug("增量解析未完成，整体解析JSON响应")
+                    for key, value in self.clean_contract_json(response_text).items():
+                        emit(key, value)
+
+            print(f"开始流式调用大模型API...")
+            if len(messages_list) == 1:
+                stream_group(messages_list[0])
+            else:
+                with ThreadPoolExecutor(max_workers=min(PH_GROUP_WORKERS, len(messages_list)),
+                                        thread_name_prefix="ph") as executor:
+                    list(executor.map(in_context(stream_group), messages_list))
+            logger.debug("解析后的JSON数据: %s", response_json)
+
+            if not response_json:
+                print(f"警告: 解析后的JSON为空! 这可能导致合同填充失败")
+            return response_json
+        except Exception as e:
+            print(f"提取占位符过程中发生异常: {str(e)}")
+            return {}
+
     # 从用户输入提取合同关键词
     def extract_keywords(self, text):
         """
         从用户输入中提取合同相关的关键词
         增强版：提取更多法律专业术语，增加合同类型识别能力
         """
+        segments = self.long_input_segments(text)
+        if segments:
+            return merge_keywords(self.map_segments(self.extract_keywords, segments))
+
         messages = [
                     { 'role': 'system', 'content': '''
                         # 角色定位
@@ -459,19 +725,9 @@ class ContractService:
                 ]
         
         # 调用大模型API生成响应
-        response = Generation.call(
-            api_key=API_KEY,
-            model=LLM_MODEL_NAME,
-            messages=messages,
-            result_format="message"
-        )
-        
-        response_text = ""
-        if hasattr(response, 'output') and hasattr(response.output, 'choices'):
-            response_text = response['output']['choices'][0]['message']['content']
-            print(f"提取的合同关键词: {response_text}")
-        else:
-            print("API响应格式不正确")
+        response_text = self.call_llm(messages, "keywords") or ""
+        if response_text:
+            logger.debug("提取的合同关键词: %s", response_text)
 
         # 优化文本清理：保留法律术语中可能包含的特殊字符
         return self.clean_text_for_legal(response_text)
@@ -493,13 +749,15 @@ class ContractService:
         return text.strip()
 
     # 模板填充核心功能
-    def fill_template(self, template_docx, ph_json):
+    @traced("fill_template")
+    def fill_template(self, template_docx, ph_json, plan: Optional[FillPlan] = None):
         """
         把占位符对应的信息填入模版的占位符，并保持原始格式
         
         Args:
             template_docx: Document对象，加载的docx模板
             ph_json: 字典，包含占位符名称和对应的值
+            plan: load_template 返回的占位符位置，未提供时扫描模板
             
         Returns:
             填充后的Document对象
@@ -510,141 +768,118 @@ class ContractService:
             print("警告: 占位符JSON为空或不是字典格式，将使用空字典")
             ph_json = {}
         
-        # 首先收集所有需要替换的占位符
-        all_placeholders = {f"{{{key}}}": value for key, value in ph_json.items()}
-        
         try:
-            # 遍历文档中的所有段落
-            for paragraph in template_docx.paragraphs:
-                # 存储所有runs的文本内容，以便后续处理
-                runs_text = []
-                for run in paragraph.runs:
-                    runs_text.append(run.text)
-                
-                # 检查段落中是否包含占位符
-                paragraph_has_placeholder = False
-                for ph in all_placeholders.keys():
-                    if any(ph in run_text for run_text in runs_text):
-                        paragraph_has_placeholder = True
-                        break
-                        
-                if paragraph_has_placeholder:            
-                    # 使用run级别替换，保留格式
-                    for i, run in enumerate(paragraph.runs):
-                        # 检查当前run是否包含占位符
-                        original_text = run.text
-                        modified_text = original_text
-                        
-                        # 替换所有匹配的占位符
-                        for ph, value in all_placeholders.items():
-                            if ph in modified_text:
-                                # 确保value是字符串类型
-                                if value is None:
-                                    value = ""
-                                if not isinstance(value, str):
-                                    value = str(value)
-                                    
-                                # 使用空格替代"没有内容"
-                                replacement = "    " if value == "没有内容" else value
-                                modified_text = modified_text.replace(ph, replacement)
-                        
-                        # 只有当文本发生变化时才更新
-                        if modified_text != original_text:
-                            run.text = modified_text
-            
-            # 再次检查是否还有未替换的占位符
-            for paragraph in template_docx.paragraphs:
-                for run in paragraph.runs:
-                    # 安全检查，确保run.text是字符串
-                    if not hasattr(run, 'text') or not isinstance(run.text, str):
-                        continue
-                        
-                    if '{' in run.text and '}' in run.text:
-                        pattern = r'\{[^{}]+\}'  # 匹配{xxx}格式
-                        matches = re.findall(pattern, run.text)
-                        if matches:
-                            print(f"警告：发现未替换的占位符: {matches}")
-                            # 将未替换的占位符替换为空格，而不是保留
-                            for match in matches:
-                                run.text = run.text.replace(match, "    ")
-            
-            # 检查表格中的占位符
-            for table in template_docx.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs:
-                            # 存储所有runs的文本内容
-                            runs_text = []
-                            for run in paragraph.runs:
-                                # 安全检查
-                                if hasattr(run, 'text') and isinstance(run.text, str):
-                                    runs_text.append(run.text)
-                            
-                            # 检查段落中是否包含占位符
-                            paragraph_has_placeholder = False
-                            for ph in all_placeholders.keys():
-                                if any(ph in run_text for run_text in runs_text):
-                                    paragraph_has_placeholder = True
-                                    break
-                                    
-                            if paragraph_has_placeholder:
-                                print(f"在表格单元格段落中发现占位符: {paragraph.text}")
-                                
-                                # 使用run级别替换，保留格式
-                                for i, run in enumerate(paragraph.runs):
-                                    # 检查当前run是否包含占位符
-                                    # 安全检查
-                                    if not hasattr(run, 'text') or not isinstance(run.text, str):
-                                        continue
-                                        
-                                    original_text = run.text
-                                    modified_text = original_text
-                                    
-                                    # 替换所有匹配的占位符
-                                    for ph, value in all_placeholders.items():
-                                        if ph in modified_text:
-                                            # 确保value是字符串类型
-                                            if value is None:
-                                                value = ""
-                                            if not isinstance(value, str):
-                                                value = str(value)
-                                                
-                                            # 使用空格替代"没有内容"
-                                            replacement = "    " if value == "没有内容" else value
-                                            modified_text = modified_text.replace(ph, replacement)
-                                    
-                                    # 只有当文本发生变化时才更新
-                                    if modified_text != original_text:
-                                        run.text = modified_text
-            
-            # 处理表格中可能剩余的未替换占位符
-            for table in template_docx.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs:
-                            for run in paragraph.runs:
-                                # 安全检查
-                                if not hasattr(run, 'text') or not isinstance(run.text, str):
-                                    continue
-                                    
-                                if '{' in run.text and '}' in run.text:
-                                    pattern = r'\{[^{}]+\}'  # 匹配{xxx}格式
-                                    matches = re.findall(pattern, run.text)
-                                    if matches:
-                                        print(f"警告：表格中发现未替换的占位符: {matches}")
-                                        # 将未替换的占位符替换为空格，而不是保留
-                                        for match in matches:
-                                            run.text = run.text.replace(match, "    ")
-            
+            # 一次遍历定位全部占位符，每个段落只改写一次，未提取到值的占位符同时置空
+            plan = plan or self.fill_plan(template_docx)
+            for key, value in ph_json.items():
+                self.fill_placeholder(plan, key, value)
             # 清理空白行和多余符号
-            template_docx = self.clean_contract(template_docx)
-            
-            return template_docx
+            return self.finish_fill(template_docx, plan)
         except Exception as e:
             print(f"填充模板时发生异常: {str(e)}")
             # 返回原始模板，而不是抛出异常，确保流程能继续
             return template_docx
 
+    # 占位符的替换文本
+    @staticmethod
+    def placeholder_text(value) -> str:
+        """将提取到的值转换为填入文档的文本"""
+        # 确保value是字符串类型
+        if value is None:
+            value = ""
+        if not isinstance(value, str):
+            value = str(value)
+        # 使用空格替代"没有内容"
+        return "    " if value == "没有内容" else value
+
+    # 加载模板及其占位符位置
+    @traced("load_template")
+    def load_template(self, docx_path) -> Tuple[Any, FillPlan]:
+        """
+        加载模板，并按模板同级“占位符位置”目录中的位置表直接定位占位符；
+        位置表缺失或与模板哈希不一致时扫描模板并更新位置表。
+        已解析的模板缓存在内存中，再次使用时复制一份，不再重新解析 docx。
+        :return: (Document, FillPlan)
+        """
+        docx, plan = self.template_cache.get(docx_path)
+        print(f"模板中共 {plan.stats['placeholders']} 处占位符（{len(plan.keys)} 个不同名称），"
+              f"其中 {plan.stats['split']} 处跨多个 run")
+        return docx, plan
+
+    # 定位文档中的占位符
+    def fill_plan(self, template_docx) -> FillPlan:
+        """
+        遍历一次文档正文、页眉和页脚（含表格、嵌套表格和文本框），记录全部占位符的位置，包括被拆分到多个 run 中的占位符。
+        :return: FillPlan，供逐个填入占位符
+        """
+        plan = FillPlan(document_roots(template_docx))
+        print(f"模板中共 {plan.stats['placeholders']} 处占位符（{len(plan.keys)} 个不同名称），"
+              f"其中 {plan.stats['split']} 处跨多个 run")
+        return plan
+
+    # 填入单个占位符
+    def fill_placeholder(self, plan: FillPlan, key, value) -> int:
+        """
+        填入一个占位符的值，保持原始格式；所在段落的占位符全部有值时立即改写该段落。
+        :return: 文档中包含该占位符的段落数
+        """
+        return plan.fill(key, self.placeholder_text(value))
+
+    # 完成填充
+    @traced("finish_fill")
+    def finish_fill(self, template_docx, plan: FillPlan):
+        """所有值填入后，在同一次遍历中改写其余段落（未替换的占位符置为空格）并清理文档"""
+        leftovers = plan.finish()
+        if leftovers:
+            print(f"警告：发现未替换的占位符: {leftovers}")
+        print(f"已填入 {plan.stats['filled']} 处占位符，{plan.stats['leftover']} 处未提取到值")
+        timings = plan.timings
+        print(f"填充耗时: 定位 {timings['locate'] * 1000:.1f}ms，填入 {timings['fill'] * 1000:.1f}ms，"
+              f"收尾 {timings['finish'] * 1000:.1f}ms，遍历文档 {plan.stats['passes']} 次")
+        return template_docx
+
+    # 流式填充模板
+    def stream_template(self, docx_path, ph_json) -> StreamedDocument:
+        """
+        不加载模板，返回保存时才从模板 zip 流式改写正文、页眉和页脚的文档，可直接交给 save_contract。
+        占位符替换和清理与 fill_template 一致，内存占用与文档大小无关。
+        """
+        if not ph_json or not isinstance(ph_json, dict):
+            print("警告: 占位符JSON为空或不是字典格式，将使用空字典")
+            ph_json = {}
+        values = {key: self.placeholder_text(value) for key, value in ph_json.items()}
+        return StreamedDocument(docx_path, values)
+
+    # 保存生成的合同
+    @traced("save_contract")
+    def save_contract(self, template_docx, file_path):
+        """
+        将填充后的合同保存到指定路径，并确保文件可读。
+        先写入同一目录下的临时文件，写完后再替换为目标文件，保存中断时不会留下不完整的合同。
+        Save the filled contract atomically to the given path and make sure it is readable.
+        :return: 保存后的文件路径
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".docx.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                template_docx.save(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 确保文件权限正确（临时文件默认仅所有者可读写）
+            try:
+                os.chmod(temp_path, 0o644)  # 确保文件可读
+            except Exception as e:
+                print(f"警告: 设置文件权限失败: {str(e)}")
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path
+
     # 将填充后的文档转为内存字节流
     def template_to_bytes(self, template_docx):
         # 将文档保存到内存中的字节流
@@ -691,28 +926,237 @@ class ContractService:
         
         return text.strip()
 
+    # 已加载模型的标识（名称@版本）
+    @property
+    def model_id(self) -> Optional[str]:
+        """已加载模型的标识（名称@版本指纹），模型未加载时为 None"""
+        if not self.model_name:
+            return None
+        return f"{os.path.basename(self.model_name)}@{self.model_version}"
+
+    # 模板向量持久化存储（首次使用时打开）
+    @property
+    def embedding_store(self) -> EmbeddingStore:
+        """模板向量持久化存储，首次访问时打开数据库"""
+        if self._embedding_store is None:
+            self._embedding_store = EmbeddingStore(EMBEDDING_STORE_PATH)
+        return self._embedding_store
+
     # 将文本内容向量化
     def generate_embeddings(self, documents, model):
         """
         使用 SentenceTransformer 模型将文档内容转换为向量。
         返回文件名列表和对应的向量矩阵。
+        使用已加载的模型时，向量按内容哈希持久化，只对新增或变化的模板重新编码。
         """
+        import numpy as np
+
         filenames, contents = zip(*documents)  # 分离文件名和内容
         # 清理内容
         contents = [self.clean_text(content) for content in contents]
 
-        embeddings = model.encode(contents, convert_to_tensor=False)  # 生成向量
+        if model is self.model and self.model_id:
+            embeddings = self.embedding_store.encode(model, contents, self.model_id)
+        else:
+            embeddings = model.encode(contents, convert_to_tensor=False)  # 生成向量
         return list(filenames), np.array(embeddings).astype('float32')
 
     # 构建 FAISS 索引并保存
-    def build_faiss_index(self, embeddings, dimension):
+    def build_faiss_index(self, embeddings, dimension, index_type=INDEX_TYPE, params=None):
         """
-        使用 FAISS 构建向量索引。
+        使用 FAISS 构建向量索引，检索返回向量的行号。
+        :param index_type: 索引类型 flat/hnsw/ivf/sq8/pq
+        :param params: 索引参数，默认使用 INDEX_PARAMS
         """
-        index = faiss.IndexFlatL2(dimension)  # 使用 L2 距离
-        index.add(embeddings)  # 添加向量到索引
+        import numpy as np
+
+        index, _ = create_index(index_type, embeddings.reshape(-1, dimension), np.arange(len(embeddings)),
+                                INDEX_PARAMS if params is None else params)
         return index
 
+    # 知识库中模板关键词文件所在目录
+    def get_keywords_folder(self, contract_type):
+        """返回合同类型对应的模板关键词目录 template/<type>/关键词"""
+        return os.path.join(TEMPLATE_DIR, contract_type, "关键词")
+
+    # 读取并编码单个模板的关键词
+    def embed_template(self, contract_type, name):
+        """读取模板关键词文件并生成向量，返回形状为 (dim,) 的 float32 向量"""
+        file_path = os.path.join(self.get_keywords_folder(contract_type), template_filename(name))
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        if not content:
+            raise ValueError(f"模板关键词文件为空: {file_path}")
+        _, embeddings = self.generate_embeddings([(template_filename(name), content)], self.model)
+        return embeddings[0]
+
+    # 修改知识库（写时复制）
+    def _update_knowledge_base(self, contract_type, update):
+        """
+        复制指定类型的知识库，对副本执行 update 并保存，成功后再替换内存中的索引。
+        正在进行的检索继续使用旧索引，不受修改影响。
+        """
+        self.ensure_loaded()
+        with self._index_lock:
+            current = self.knowledge_bases.get(contract_type)
+            if current is None:
+                raise KeyError(f"合同类型不存在: {contract_type}")
+            knowledge_base = current.copy()
+            result = update(knowledge_base)
+            knowledge_base.save()
+            if INDEX_MMAP:
+                # 重新以内存映射方式打开刚保存的索引，释放修改时复制到进程内存中的副本
+                knowledge_base = KnowledgeBase.load(knowledge_base.type_path, mmap=True)
+
+            self.knowledge_bases[contract_type] = knowledge_base
+            self.index[contract_type] = knowledge_base.index
+            self.template_types[contract_type] = [os.path.splitext(name)[0] for name in knowledge_base.filenames]
+            return result
+
+    # 新增单个模板
+    def add_template(self, contract_type, name) -> int:
+        """
+        将模板关键词文件 template/<type>/关键词/<name>.txt 编码后加入知识库。
+        Add one template to the knowledge base without rebuilding it.
+        :return: 新模板的ID
+        """
+        vector = self.embed_template(contract_type, name)
+        template_id = self._update_knowledge_base(contract_type, lambda kb: kb.add(name, vector))
+        print(f"已新增模板: {name} (ID: {template_id})")
+        return template_id
+
+    # 更新单个模板
+    def update_template(self, contract_type, name) -> int:
+        """
+        重新编码模板关键词文件并替换知识库中的向量，模板ID不变。
+        Re-embed one template and replace its vector in place.
+        :return: 模板ID
+        """
+        vector = self.embed_template(contract_type, name)
+        template_id = self._update_knowledge_base(contract_type, lambda kb: kb.replace(name, vector))
+        print(f"已更新模板: {name} (ID: {template_id})")
+        return template_id
+
+    # 删除单个模板
+    def remove_template(self, contract_type, name) -> int:
+        """
+        从知识库中删除模板。
+        Remove one template from the knowledge base.
+        :return: 被删除模板的ID
+        """
+        template_id = self._update_knowledge_base(contract_type, lambda kb: kb.remove(name))
+        print(f"已删除模板: {name} (ID: {template_id})")
+        return template_id
+
+    # 重建整个知识库
+    def rebuild_knowledge_base(self, contract_type, index_type=None, index_params=None) -> int:
+        """
+        根据关键词目录中的全部文件重建指定类型的知识库，模板ID重新分配。
+        Rebuild the knowledge base of a contract type from all of its keyword files.
+        :param index_type: 索引类型，默认沿用当前类型，新知识库使用 INDEX_TYPE
+        :param index_params: 索引参数，默认沿用当前参数，新知识库使用 INDEX_PARAMS
+        :return: 知识库中的模板数量
+        """
+        self.ensure_loaded()
+        documents = self.load_txt_files(self.get_keywords_folder(contract_type))
+        if not documents:
+            raise ValueError(f"关键词目录中没有模板: {self.get_keywords_folder(contract_type)}")
+        filenames, embeddings = self.generate_embeddings(documents, self.model)
+
+        current = self.knowledge_bases.get(contract_type)
+        if index_type is None:
+            index_type = current.index_type if current is not None else INDEX_TYPE
+        if index_params is None:
+            same_type = current is not None and current.index_type == index_type
+            index_params = current.index_params if same_type else INDEX_PARAMS
+        knowledge_base = KnowledgeBase.build(os.path.join(RAG_DIR, contract_type), filenames, embeddings,
+                                             self.model_id, index_type, index_params)
+
+        with self._index_lock:
+            # 沿用原有代次编号，保证新索引文件名不与旧文件冲突
+            current = self.knowledge_bases.get(contract_type)
+            if current is not None:
+                knowledge_base.meta["generation"] = current.meta.get("generation", 0)
+            knowledge_base.save()
+            if INDEX_MMAP:
+                knowledge_base = KnowledgeBase.load(knowledge_base.type_path, mmap=True)
+            self.knowledge_bases[contract_type] = knowledge_base
+            self.index[contract_type] = knowledge_base.index
+            self.template_types[contract_type] = [os.path.splitext(name)[0] for name in knowledge_base.filenames]
+        print(f"{contract_type} 知识库已重建（{index_type}），共 {len(knowledge_base)} 个模板")
+        return len(knowledge_base)
+
+    # 转换索引类型
+    def convert_knowledge_base(self, contract_type, index_type, index_params=None) -> int:
+        """
+        用已有向量将知识库转换为其他索引类型或修改索引参数，不重新编码模板。
+        Switch a knowledge base to another index type without re-embedding.
+        :return: 知识库中的模板数量
+        """
+        def convert(knowledge_base):
+            knowledge_base.rebuild_index(index_type, index_params)
+            return len(knowledge_base)
+
+        count = self._update_knowledge_base(contract_type, convert)
+        print(f"{contract_type} 知识库已转换为 {index_type} 索引，共 {count} 个模板")
+        return count
+
+    # 调整检索参数
+    def set_search_params(self, contract_type, **params):
+        """
+        修改知识库的检索参数（HNSW 的 efSearch、IVF 的 nprobe）并保存到元数据。
+        Tune efSearch/nprobe of a knowledge base; the values are persisted in its metadata.
+        """
+        self._update_knowledge_base(contract_type, lambda kb: kb.set_search_params(**params))
+        print(f"{contract_type} 检索参数已更新: {params}")
+
+    # 生成查询向量（带缓存）
+    def encode_query(self, query, model=None):
+        """
+        生成单条查询的向量，相同模型下相同的规范化查询直接复用缓存结果。
+        Encode a single query, reusing the cached vector for the same model and normalized query.
+        :param query: 查询文本（已清理的关键词）
+        :param model: SentenceTransformer模型，默认使用已加载的模型
+        :return: 形状为 (1, dim) 的 float32 向量
+        """
+        return self.encode_queries([query], model)
+
+    # 批量生成查询向量（带缓存）
+    @traced("encode_query")
+    def encode_queries(self, queries, model=None):
+        """
+        批量生成查询向量，缓存未命中的查询在一次前向计算中编码。
+        Encode queries in one batched forward pass, skipping cached ones.
+        :param queries: 查询文本列表（已清理的关键词）
+        :param model: SentenceTransformer模型，默认使用已加载的模型
+        :return: 形状为 (len(queries), dim) 的 float32 矩阵
+        """
+        import numpy as np
+
+        model = model if model is not None else self.model
+        # 已加载模型用其路径标识，外部传入的其他模型对象用对象id区分
+        model_key = self.model_name if model is self.model else ("model", id(model))
+
+        vectors = [self.query_embedding_cache.get(model_key, query) for query in queries]
+        # 同一批次中重复的查询只编码一次
+        missing = list(dict.fromkeys(
+            self.query_embedding_cache.normalize(query) for query, vector in zip(queries, vectors) if vector is None))
+        if missing:
+            encoded = np.asarray(model.encode(missing, convert_to_tensor=False), dtype='float32')
+            encoded_by_query = {}
+            for query, vector in zip(missing, encoded):
+                vector = vector.reshape(1, -1)
+                self.query_embedding_cache.put(model_key, query, vector)
+                encoded_by_query[query] = vector
+            vectors = [vector if vector is not None else encoded_by_query[self.query_embedding_cache.normalize(query)]
+                       for query, vector in zip(queries, vectors)]
+        return np.vstack(vectors).astype('float32')
+
+    # 查询向量缓存统计
+    def get_query_cache_stats(self) -> Dict[str, Any]:
+        """返回查询向量缓存的命中统计（size/hits/misses/evictions/hit_rate）"""
+        return self.query_embedding_cache.stats()
+
     # 查询知识库
     def search_in_knowledge_base(self, query, top_k=5):
         """
@@ -726,7 +1170,7 @@ class ContractService:
     
         try:
             # 使用预加载的模型生成查询向量
-            query_vector = self.model.encode([query], convert_to_tensor=False).astype('float32')
+            query_vector = self.encode_query(query)
             
             # 使用预加载的FAISS索引进行搜索
             distances, indices = self.index.search(query_vector, top_k)
@@ -771,21 +1215,10 @@ class ContractService:
             # 构造消息（可复用预定义的格式）
             messages = self.format_template_keywords(docx_content)
             
-            # 调用API（API密钥可考虑在初始化时加载）
-            response = Generation.call(
-                api_key=API_KEY,
-                model=LLM_MODEL_NAME,
-                messages=messages,
-                result_format="message"
-            )
-
-            response_text = ""
-            if hasattr(response, 'output') and hasattr(response.output, 'choices'):
-                # 获取处理后的结果
-                response_text = response['output']['choices'][0]['message']['content']
-                print(f"提取的合同模板结构化关键词: {response_text}")
-            else:
-                print("API响应格式不正确")
+            # 调用API（相同模板重复处理时直接使用缓存结果）
+            response_text = self.call_llm(messages, "template_keywords") or ""
+            if response_text:
+                logger.debug("提取的合同模板结构化关键词: %s", response_text)
         
             return response_text
         except Exception as e:
@@ -857,6 +1290,10 @@ class ContractService:
         分析用户需求，提取更深层次的意图和偏好，
         加强对无关内容的识别
         """
+        segments = self.long_input_segments(text)
+        if segments:
+            return merge_analysis(self.map_segments(self.analyze_user_needs, segments))
+
         # 检查输入文本长度，如果过短则直接返回无相关合同
         if not text or len(text.strip()) < 8:
             return {
@@ -917,18 +1354,9 @@ class ContractService:
                     ]
         
         # 调用API生成响应
-        response = Generation.call(
-            api_key=API_KEY,
-            model=LLM_MODEL_NAME,
-            messages=messages,
-            result_format="message"
-        )
-        
-        response_text = ""
-        if hasattr(response, 'output') and hasattr(response.output, 'choices'):
-            # 获取处理后的结果
-            response_text = response['output']['choices'][0]['message']['content']
-            print(f"用户需求分析结果: {response_text}")
+        response_text = self.call_llm(messages, "analysis")
+        if response_text is not None:
+            logger.debug("用户需求分析结果: %s", response_text)
             
             # 尝试解析JSON
             try:
@@ -956,7 +1384,6 @@ class ContractService:
                     "special_concerns": []
                 }
         else:
-            print("API响应格式不正确")
             return {
                 "contract_category": "无相关合同",
                 "specific_type": "N/A",
@@ -1022,6 +1449,7 @@ class ContractService:
             return {}
 
     # 通过预定义关键词映射识别合同类型
+    @traced("detect_contract_type")
     def extract_contract_type_from_keywords(self, keywords_text):
         """
         从用户输入的关键词中识别可能的合同类型
@@ -1058,6 +1486,38 @@ class ContractService:
         
         return list(set(identified_types))  # 去重
 
+    # 按合同类型对检索结果重排序
+    @traced("rerank_by_category")
+    def split_by_category(self, basic_results, contract_types, categories_map):
+        """
+        将检索结果分为匹配和不匹配用户合同类型的两组，各自按距离升序排列。
+        匹配组的距离乘以 0.7，排名提升。
+        :return: (匹配结果, 不匹配结果)，元素均为 (filename, score)
+        """
+        category_matched = []
+        category_unmatched = []
+        for filename, score in basic_results:
+            try:
+                file_key = os.path.splitext(filename.strip())[0]
+                
+                # 查找该文件的合同类型
+                file_categories = categories_map.get(file_key, "")
+                
+                # 判断是否匹配用户需求的合同类型
+                if any(ct in file_categories for ct in contract_types):
+                    # 匹配合同类型的文件得分提升
+                    category_matched.append((filename, score * 0.7))  # 降低距离分数，提高排名
+                else:
+                    category_unmatched.append((filename, score))
+            except Exception as e:
+                print(f"处理文件 {filename} 时出错: {str(e)}")
+                # 发生错误但不中断，继续处理其他文件
+                continue
+
+        category_matched.sort(key=lambda x: x[1])
+        category_unmatched.sort(key=lambda x: x[1])
+        return category_matched, category_unmatched
+
     # 高级检索流程
     def advanced_search_in_knowledge_base(self, query, model, index, filenames, categories_map, user_text, top_k=10):
         """
@@ -1066,8 +1526,8 @@ class ContractService:
         参数:
         - query: 查询文本（已处理的关键词）
         - model: SentenceTransformer模型
-        - index: FAISS索引
-        - filenames: 文件名列表
+        - index: 知识库（KnowledgeBase，量化索引会用原始向量重排候选）或 FAISS 索引
+        - filenames: 模板ID到文件名的映射（KnowledgeBase.templates），也接受按行号排列的文件名列表
         - categories_map: 合同类型映射
         - user_text: 用户原始输入
         - top_k: 返回结果数量
@@ -1076,13 +1536,16 @@ class ContractService:
         - 排序后的结果列表：[(filename, score), ...]
         """
         try:
-            print(f"高级搜索开始，查询文本: {query}")
-            print(f"索引中的文件数量: {len(filenames)}")
-            print(f"Faiss索引大小: {index.ntotal}")
+            # 统一为 模板ID -> 文件名 的映射
+            if not isinstance(filenames, dict):
+                filenames = dict(enumerate(filenames))
+
+            logger.debug("高级搜索开始，查询文本: %s，索引中的文件数量: %d，Faiss索引大小: %d",
+                         query, len(filenames), index.ntotal)
             
             # 1. 基础向量搜索 (检索更多结果用于后处理)
-            query_vector = model.encode([query], convert_to_tensor=False).astype('float32')
-            print(f"查询向量生成完成，维度: {query_vector.shape}")
+            query_vector = self.encode_query(query, model)
+            logger.debug("查询向量生成完成，维度: %s, 缓存统计: %s", query_vector.shape, self.get_query_cache_stats())
             
             # 检查索引和文件名长度匹配
             if index.ntotal != len(filenames):
@@ -1090,74 +1553,43 @@ class ContractService:
             
             # 计算实际检索数量
             actual_top_k = min(top_k * 2, len(filenames))
-            print(f"将检索 {actual_top_k} 个结果")
+            logger.debug("将检索 %d 个结果", actual_top_k)
             
-            distances, indices = index.search(query_vector, actual_top_k)
-            print(f"检索完成，获得 {len(indices[0])} 个结果")
+            with span("index_search"):
+                distances, indices = index.search(query_vector, actual_top_k)
+            logger.debug("检索完成，获得 %d 个结果", len(indices[0]))
             
             # 安全检查索引值有效性
-            valid_indices = [i for i in indices[0] if 0 <= i < len(filenames)]
+            valid_indices = [i for i in indices[0] if i in filenames]
             if len(valid_indices) < len(indices[0]):
                 print(f"警告: 检索到 {len(indices[0]) - len(valid_indices)} 个无效索引，已过滤")
             
             basic_results = []
             for j, i in enumerate(indices[0]):
-                if 0 <= i < len(filenames):
+                if i in filenames:
                     basic_results.append((filenames[i], float(distances[0][j])))
                 else:
-                    print(f"警告: 跳过无效索引 {i}，超出范围 [0, {len(filenames)-1}]")
+                    print(f"警告: 跳过无效索引 {i}，不是知识库中的模板ID")
             
-            print(f"基础检索结果数量: {len(basic_results)}")
+            logger.debug("基础检索结果数量: %d", len(basic_results))
             
             # 2. 识别用户输入中的合同类型
             contract_types = self.extract_contract_type_from_keywords(user_text + " " + query)
-            print(f"从用户输入中识别的合同类型: {contract_types}")
+            logger.debug("从用户输入中识别的合同类型: %s", contract_types)
             
             # 3. 根据合同类型进行结果重排序
-            final_results = []
-            category_matched = []
-            category_unmatched = []
-            
             # 如果没有识别出合同类型，直接返回基础检索结果
             if not contract_types:
-                print("未识别出合同类型，直接返回基础检索结果")
+                logger.debug("未识别出合同类型，直接返回基础检索结果")
                 return basic_results[:top_k]
             
-            # 根据合同类型对结果进行分类
-            for filename, score in basic_results:
-                try:
-                    file_key = os.path.splitext(filename.strip())[0]
-                    
-                    # 查找该文件的合同类型
-                    file_categories = categories_map.get(file_key, "")
-                    
-                    # 判断是否匹配用户需求的合同类型
-                    matched = False
-                    for ct in contract_types:
-                        if ct in file_categories:
-                            matched = True
-                            # 匹配合同类型的文件得分提升
-                            category_matched.append((filename, score * 0.7))  # 降低距离分数，提高排名
-                            break
-                    
-                    if not matched:
-                        category_unmatched.append((filename, score))
-                except Exception as e:
-                    print(f"处理文件 {filename} 时出错: {str(e)}")
-                    # 发生错误但不中断，继续处理其他文件
-                    continue
-            
-            print(f"类型匹配结果数量: {len(category_matched)}")
-            print(f"类型不匹配结果数量: {len(category_unmatched)}")
+            category_matched, category_unmatched = self.split_by_category(basic_results, contract_types, categories_map)
+            logger.debug("类型匹配结果数量: %d，类型不匹配结果数量: %d", len(category_matched), len(category_unmatched))
             
-            # 4. 分别对匹配和未匹配的结果进行排序
-            category_matched.sort(key=lambda x: x[1])
-            category_unmatched.sort(key=lambda x: x[1])
-            
-            # 5. 组合结果：优先返回类型匹配的结果，然后是其他结果
+            # 4. 组合结果：优先返回类型匹配的结果，然后是其他结果
             final_results = category_matched + category_unmatched
             
-            print(f"最终返回结果数量: {min(top_k, len(final_results))}")
+            logger.debug("最终返回结果数量: %d", min(top_k, len(final_results)))
             return final_results[:top_k]
         
         except Exception as e:
@@ -1167,4 +1599,177 @@ class ContractService:
             print(f"详细错误信息: {error_details}")
             
             # 返回空结果而不是抛出异常
-            return []
\ No newline at end of file
+            return []
+
+    # 用需求分析结果增强检索关键词
+    def enhance_query(self, user_input_keywords, user_analysis):
+        """
+        在大模型提取的关键词后追加分析出的合同类别和具体类型，并做法律文本清理。
+        :param user_input_keywords: extract_keywords 的结果
+        :param user_analysis: analyze_user_needs 的结果
+        :return: 检索用的查询文本
+        """
+        enhanced_keywords = user_input_keywords
+        if user_analysis["contract_category"] and user_analysis["contract_category"] != "无相关合同":
+            enhanced_keywords += " " + user_analysis["contract_category"]
+        if user_analysis["specific_type"] and user_analysis["specific_type"] != "N/A":
+            enhanced_keywords += " " + user_analysis["specific_type"]
+        return self.clean_text_for_legal(enhanced_keywords)
+
+    # 检索结果转换为推荐列表
+    def score_recommendations(self, results, input_length, no_relevant_contract=False, verbose=True):
+        """
+        将检索距离换算为 0-100 的匹配度并评定置信度，按输入长度和需求分析结果降权。
+        :param results: 检索结果 [(filename, score), ...]
+        :param input_length: 用户输入（去除首尾空白后）的长度
+        :param no_relevant_contract: 需求分析是否显示无相关合同
+        :param verbose: 是否打印每个结果的计算详情
+        :return: 按匹配度降序的推荐列表，最多5个（无相关合同时最多2个）
+        """
+        recommendations = []
+        is_extremely_short = input_length < 10
+
+        # 获取输入文本长度用于评分调整
+        # 设置长度阈值和权重，短文本将获得较低的可信度
+        min_input_length = 50  # 最小有效输入长度
+        # 调整权重计算方式，对短文本更加严格
+        length_weight = min(1.0, max(0.3, (input_length / min_input_length) ** 0.8))
+        if verbose:
+            print(f"输入长度: {input_length}, 长度权重: {length_weight}")
+
+        # 如果分析显示无相关合同，进一步降低权重
+        if no_relevant_contract:
+            length_weight *= 0.5
+            if verbose:
+                print(f"分析结果显示无相关合同，进一步降低权重至: {length_weight}")
+
+        for filename, score in results:
+            filename = os.path.splitext(filename.strip())[0]
+            try:
+                #  更精确的分数计算，考虑文本长度和更严格的距离惩罚
+                raw_score = (1 - score) * 100  # 基础分数
+                adjusted_score = raw_score * length_weight  # 按输入长度调整
+                
+                # 对分数进行缩放和拉伸，使得差异更明显
+                # 小于70的分数会被更严重地惩罚，实现门槛效应
+                if raw_score < 70:
+                    scaled_score = adjusted_score * 0.7  # 更严格的惩罚
+                else:
+                    scaled_score = adjusted_score
+                
+                # 对极短文本特殊处理，进一步降低分数
+                if is_extremely_short:
+                    scaled_score *= 0.5  # 对极短文本再减半
+                
+                # 获得最终分数
+                final_score = max(0, min(100, scaled_score))
+                
+                # 记录匹配度计算详情
+                if verbose:
+                    print(f"匹配度详情 - 文件: {filename}, 原始距离: {score}, 基础分数: {raw_score:.2f}, 长度调整后: {adjusted_score:.2f}, 最终分数: {final_score:.2f}")
+                
+                # 添加置信度评级
+                confidence_rating = "高" if final_score >= 80 else ("中" if final_score >= 60 else "低")
+                
+                recommendations.append({
+                    "name": filename,
+                    "score": round(final_score, 1),  # 将调整后的分数四舍五入到一位小数
+                    "confidence": confidence_rating  # 添加置信度评级
+                })
+            except Exception as e:
+                print(f"获取合同ID出错: {filename}, {str(e)}")
+                continue
+
+        # 按照分数从高到低排序，直接获取前5个结果
+        recommendations.sort(key=lambda x: x["score"], reverse=True)
+        filtered_recommendations = recommendations[:5]
+        
+        # 如果无相关合同，限制返回数量为2个
+        if no_relevant_contract and len(filtered_recommendations) > 2:
+            filtered_recommendations = filtered_recommendations[:2]
+            if verbose:
+                print(f"分析显示无相关合同，但有匹配结果，只保留前2个")
+        return filtered_recommendations
+
+    # 批量检索
+    def search_knowledge_base_batch(self, queries, index, filenames, categories_map, user_texts, top_k=10):
+        """
+        advanced_search_in_knowledge_base 的批量版本：一次前向计算编码全部查询，
+        一次矩阵检索，再逐条按合同类型重排序。
+        :param queries: 查询文本列表（已处理的关键词）
+        :param index: 知识库（KnowledgeBase）或 FAISS 索引
+        :param filenames: 模板ID到文件名的映射
+        :param categories_map: 合同类型映射
+        :param user_texts: 与 queries 一一对应的用户原始输入
+        :param top_k: 每条查询返回的结果数量
+        :return: 与 queries 一一对应的结果列表 [[(filename, score), ...], ...]
+        """
+        if not queries:
+            return []
+        query_vectors = self.encode_queries(queries)
+        distances, indices = index.search(query_vectors, min(top_k * 2, len(filenames)))
+
+        batch_results = []
+        for query, user_text, row_distances, row_indices in zip(queries, user_texts, distances, indices):
+            basic_results = [(filenames[i], float(d)) for d, i in zip(row_distances, row_indices) if i in filenames]
+            contract_types = self.extract_contract_type_from_keywords(user_text + " " + query)
+            if contract_types:
+                category_matched, category_unmatched = self.split_by_category(basic_results, contract_types, categories_map)
+                basic_results = category_matched + category_unmatched
+            batch_results.append(basic_results[:top_k])
+        return batch_results
+
+    # 批量合同推荐
+    def recommend_batch(self, user_inputs: List[str], contract_type, analyze=False) -> List[Optional[dict]]:
+        """
+        批量推荐合同模板，适用于对大量历史会议纪要重新分类等后台任务。
+        Recommend templates for many inputs with one batched encode and one matrix search.
+        :param user_inputs: 用户输入文本（会议纪要）列表
+        :param contract_type: 合同类型
+        :param analyze: 是否逐条调用大模型做需求分析和关键词提取（与单条推荐相同，但每条输入需两次大模型调用）；
+                        默认直接用清理后的输入文本检索
+        :return: 与 user_inputs 一一对应的结果，元素为 {"recommendations": [...], "analysis": ...}，
+                 输入为空（或分析显示无相关合同且输入极短）时为 None
+        """
+        self.ensure_loaded()
+        knowledge_base = self.knowledge_bases[contract_type]
+        categories_map = self.load_contract_categories(TEMPLATE_DIR, contract_type)
+
+        # 1. 清理输入并构造查询
+        pending = []  # (输入序号, 查询, 去除首尾空白的输入, 需求分析)
+        for position, user_input in enumerate(user_inputs):
+            user_input = user_input.strip() if user_input else ""
+            if not user_input:
+                continue
+            user_analysis = None
+            if analyze:
+                user_analysis = self.analyze_user_needs(user_input)
+                no_relevant_contract = not user_analysis["contract_category"] or user_analysis["contract_category"] == "无相关合同"
+                if no_relevant_contract and len(user_input) < 10:
+                    continue
+                query = self.enhance_query(self.extract_keywords(user_input), user_analysis)
+            else:
+                query = self.clean_text_for_legal(user_input)
+            pending.append((position, query, user_input, user_analysis))
+
+        # 2. 批量编码、检索、重排序
+        batch_results = self.search_knowledge_base_batch(
+            [query for _, query, _, _ in pending],
+            knowledge_base,
+            knowledge_base.templates,
+            categories_map,
+            [user_input for _, _, user_input, _ in pending],
+            top_k=5
+        )
+
+        # 3. 换算匹配度
+        outputs: List[Optional[dict]] = [None] * len(user_inputs)
+        for (position, _, user_input, user_analysis), results in zip(pending, batch_results):
+            no_relevant_contract = bool(user_analysis) and (
+                not user_analysis["contract_category"] or user_analysis["contract_category"] == "无相关合同")
+            outputs[position] = {
+                "recommendations": self.score_recommendations(results, len(user_input), no_relevant_contract, verbose=False),
+                "analysis": user_analysis
+            }
+        print(f"批量推荐完成: {len(pending)}/{len(user_inputs)} 条输入得到推荐结果")
+        return outputs
@@ -0,0 +1,82 @@
+"""
+查询向量缓存
+Query Embedding Cache
+按（模型标识, 规范化查询文本）缓存查询向量，带容量和过期时间限制，线程安全。
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class EmbeddingCache:
+    """
+    有界LRU查询向量缓存
+    Bounded LRU cache for query embeddings
+    超过 max_size 时淘汰最久未使用的条目，超过 ttl 秒的条目在读取时视为未命中并删除。
+    """
+    def __init__(self, max_size: int = 2048, ttl: Optional[float] = 3600.0):
+        """
+        :param max_size: 最大缓存条目数，<=0 时禁用缓存
+        :param ttl: 条目有效期（秒），None 表示永不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """规范化查询文本：合并连续空白并去除首尾空白"""
+        return " ".join(query.split())
+
+    def get(self, model_key: Hashable, query: str):
+        """
+        读取缓存的查询向量，未命中或已过期时返回 None。
+        返回的是副本，调用方可以随意修改。
+        """
+        key = (model_key, self.normalize(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1].copy()
+
+    def put(self, model_key: Hashable, query: str, vector):
+        """写入查询向量（保存副本），必要时淘汰最久未使用的条目"""
+        if self.max_size <= 0:
+            return
+        key = (model_key, self.normalize(query))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存，计数器保留"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,130 @@
+"""
+模板向量持久化存储
+Template Embedding Store
+以（模型名称+版本, 清理后文本）的哈希为键，将向量保存在本地 SQLite 数据库中。
+重建索引时只需对新增或内容变化的模板关键词重新编码。
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+
+# 计算模型版本指纹
+def model_fingerprint(model_path) -> str:
+    """
+    根据本地模型目录中的配置文件内容和权重文件大小生成版本指纹。
+    模型被替换后指纹随之改变，旧向量不会被误用；仓库换机器检出时指纹保持不变。
+    """
+    digest = hashlib.sha256()
+    found = False
+    for name in ["config.json", "modules.json", "sentence_bert_config.json", "tokenizer.json"]:
+        file_path = os.path.join(model_path, name)
+        if os.path.isfile(file_path):
+            with open(file_path, "rb") as f:
+                digest.update(name.encode("utf-8") + f.read())
+            found = True
+    for name in ["model.safetensors", "pytorch_model.bin"]:
+        file_path = os.path.join(model_path, name)
+        if os.path.isfile(file_path):
+            digest.update(f"{name}:{os.path.getsize(file_path)}".encode("utf-8"))
+            found = True
+    return digest.hexdigest()[:16] if found else "unknown"
+
+
+class EmbeddingStore:
+    """
+    内容寻址的向量存储
+    Content-addressed embedding store
+    同一模型版本下，相同文本只编码一次；可被多个线程和进程共享。
+    """
+    def __init__(self, db_path):
+        """
+        :param db_path: SQLite 数据库文件路径，不存在时自动创建
+        """
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        """由模型标识（名称@版本）和清理后的文本计算存储键"""
+        return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, "np.ndarray"]:
+        """批量读取向量，返回 {key: 向量}，不存在的键不出现在结果中"""
+        import numpy as np
+
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite 对单条语句的参数个数有限制，分批查询
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, model_id: str, items: Dict[str, "np.ndarray"]):
+        """批量写入向量 {key: 向量}"""
+        rows = [(key, model_id, int(vector.shape[-1]), vector.astype("float32").tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def encode(self, model, texts: List[str], model_id: str) -> "np.ndarray":
+        """
+        返回 texts 对应的向量矩阵，只对存储中不存在的文本调用模型编码（一次批量前向）。
+        :param model: SentenceTransformer模型
+        :param texts: 已清理的文本列表
+        :param model_id: 模型标识（名称@版本），模型或版本变化时向量不会被复用
+        :return: 形状为 (len(texts), dim) 的 float32 矩阵
+        """
+        import numpy as np
+
+        keys = [self.make_key(model_id, text) for text in texts]
+        found = self.get_many(keys)
+
+        missing_count = sum(1 for key in keys if key not in found)
+        with self._lock:
+            self.hits += len(keys) - missing_count
+            self.misses += missing_count
+
+        # 同一批次中重复的文本只编码一次
+        missing = [(key, text) for key, text in dict(zip(keys, texts)).items() if key not in found]
+        if missing:
+            print(f"向量存储未命中 {len(missing)} 条，开始编码")
+            vectors = model.encode([text for _, text in missing], convert_to_tensor=False)
+            new_items = {key: np.asarray(vector, dtype="float32") for (key, _), vector in zip(missing, vectors)}
+            self.put_many(model_id, new_items)
+            found.update(new_items)
+
+        return np.vstack([found[key] for key in keys]).astype("float32")
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中统计及存储中的向量数量"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": count, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,321 @@
+"""
+单遍占位符填充
+Single-pass Placeholder Fill
+一次遍历文档 XML，找出全部段落（含表格、嵌套表格和文本框）中的占位符并记录位置，之后每个段落只改写一次。
+占位符按段落的完整文本匹配，因此能处理 Word 拆分到多个 run 中的占位符：替换文本写入占位符起始处的 run，
+保留该 run 的格式，后续 run 中属于占位符的部分被删除。匹配使用一个统一的正则 {名称} 加字典查找，
+耗时只与文档长度有关，与占位符数量无关。未提取到值的占位符在同一次改写中置为空格。
+填充结束时再遍历一次文档（正文、页眉、页脚，含嵌套表格和文本框），在同一次遍历中改写尚未改写的段落、
+删除空花括号，并为正文中未设置对齐方式的段落设置左对齐。
+"""
+import re
+import time
+from bisect import bisect_right
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_P, W_T, W_TAB, W_BR, W_CR = (f"{{{W_NS}}}{tag}" for tag in ("p", "t", "tab", "br", "cr"))
+W_BODY, W_PPR, W_JC, W_VAL = (f"{{{W_NS}}}{tag}" for tag in ("body", "pPr", "jc", "val"))
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+# 段落属性中位于 w:jc 之后的子元素，w:jc 需插在它们之前（OOXML 的元素顺序）
+AFTER_JC = ("textDirection", "textAlignment", "textboxTightWrap", "outlineLvl", "divId", "cnfStyle", "rPr",
+            "sectPr", "pPrChange")
+
+# 占位符：花括号中至少有一个非空白字符；{{名称}} 这样多余的花括号一并替换
+PLACEHOLDER = re.compile(r"\{+([^{}\n]*[^{}\s][^{}\n]*)\}+")
+EMPTY_TEXT = "    "  # 未提取到值的占位符替换为空格，保留填写位置
+EMPTY_BRACES = re.compile(r"\{\s*\}")  # 填充后残留的空花括号
+
+
+def document_roots(docx) -> list:
+    """需要填充的 XML 根元素：正文，以及按部件名排序的页眉和页脚"""
+    parts = [part for part in docx.part.package.iter_parts()
+             if str(part.partname).startswith(("/word/header", "/word/footer")) and hasattr(part, "element")]
+    return [docx.element.body] + [part.element for part in sorted(parts, key=lambda part: str(part.partname))]
+
+
+def iter_paragraphs(root) -> Iterator[Tuple[object, list]]:
+    """
+    按文档顺序遍历 root 下的全部段落，返回 (段落元素, [w:t 或制表符/换行元素])。
+    文本框中的段落单独返回，其文本不计入外层段落。
+    """
+    from lxml import etree
+
+    stack: List[list] = []
+    for event, element in etree.iterwalk(root, events=("start", "end"), tag=(W_P, W_T, W_TAB, W_BR, W_CR)):
+        if element.tag == W_P:
+            if event == "start":
+                stack.append([])
+            else:
+                yield element, stack.pop()
+        elif event == "start" and stack:
+            stack[-1].append(element)
+
+
+def segment_texts(segments: list) -> List[str]:
+    """段落各部分的文本；制表符和换行记为 \\n，占位符不会跨越它们"""
+    return [(segment.text or "") if segment.tag == W_T else "\n" for segment in segments]
+
+
+def set_text(element, text: str):
+    """改写 w:t 的文本；文本中的制表符和换行转换为 w:tab/w:br 元素（与 python-docx 的 run.text 一致）"""
+    parts = re.split(r"([\t\n])", text)
+    _set_preserved(element, parts[0])
+    anchor = element
+    for separator, part in zip(parts[1::2], parts[2::2]):
+        anchor.addnext(element.makeelement(W_TAB if separator == "\t" else W_BR, {}))
+        anchor = anchor.getnext()
+        if part:
+            anchor.addnext(element.makeelement(W_T, {}))
+            anchor = anchor.getnext()
+            _set_preserved(anchor, part)
+
+
+def _set_preserved(element, text: str):
+    element.text = text
+    if text != text.strip():
+        element.set(XML_SPACE, "preserve")
+
+
+def align_left(paragraph):
+    """段落未设置对齐方式时设为左对齐；按 OOXML 的元素顺序插入 w:jc"""
+    properties = paragraph.find(W_PPR)
+    if properties is None:
+        properties = paragraph.makeelement(W_PPR, {})
+        paragraph.insert(0, properties)
+    elif properties.find(W_JC) is not None:
+        return
+    jc = properties.makeelement(W_JC, {W_VAL: "left"})
+    for child in properties:
+        if isinstance(child.tag, str) and child.tag.startswith(f"{{{W_NS}}}") and \
+                child.tag[len(W_NS) + 2:] in AFTER_JC:
+            child.addprevious(jc)
+            return
+    properties.append(jc)
+
+
+def clean_paragraph(paragraph, segments: list):
+    """
+    清理一个段落：删除各 w:t 中的空花括号，正文中（父元素为 body）的段落未设置对齐方式时设为左对齐。
+    只改写文本节点，run 中的图片、域代码等其他内容保持不变。
+    """
+    for segment in segments:
+        if segment.tag == W_T and segment.text and "{" in segment.text:
+            text = EMPTY_BRACES.sub("", segment.text)
+            if text != segment.text:
+                _set_preserved(segment, text)
+    parent = paragraph.getparent()
+    if parent is not None and parent.tag == W_BODY:
+        align_left(paragraph)
+
+
+def clean_document(roots: list):
+    """只做清理（见 clean_paragraph），一次遍历全部根元素"""
+    for root in roots:
+        for paragraph, segments in iter_paragraphs(root):
+            clean_paragraph(paragraph, segments)
+
+
+def locate(texts: List[str]) -> List[Tuple[int, int, int, int, str]]:
+    """
+    在段落各部分文本拼接成的完整文本中查找占位符。
+    :return: [(起始部分, 起始偏移, 结束部分, 结束偏移, 名称)]，偏移相对于所在部分
+    """
+    starts, position = [], 0
+    for text in texts:
+        starts.append(position)
+        position += len(text)
+    matches = []
+    for match in PLACEHOLDER.finditer("".join(texts)):
+        first = bisect_right(starts, match.start()) - 1
+        last = bisect_right(starts, match.end() - 1) - 1
+        matches.append((first, match.start() - starts[first], last, match.end() - starts[last], match.group(1).strip()))
+    return matches
+
+
+def substitute(text: Callable[[int], str], matches: List[Tuple[int, int, int, int, str]],
+               replacement: Callable[[str], str]) -> Dict[int, str]:
+    """
+    按 locate 得到的位置替换一个段落中的占位符：从后往前替换，前面的位置不受影响。
+    跨 run 的占位符：替换文本写入起始部分（保留该 run 的格式），中间部分清空，末尾部分去掉占位符的剩余部分。
+    :param text: 按序号返回段落某一部分的原文本
+    :param replacement: 按名称返回替换文本
+    :return: {部分序号: 新文本}，只包含改变的部分
+    """
+    texts: Dict[int, str] = {}
+
+    def current(position: int) -> str:
+        return texts[position] if position in texts else text(position)
+
+    for first, start, last, end, key in reversed(matches):
+        value = replacement(key)
+        if first == last:
+            texts[first] = current(first)[:start] + value + current(first)[end:]
+        else:
+            texts[first] = current(first)[:start] + value
+            for middle in range(first + 1, last):
+                texts[middle] = ""
+            texts[last] = current(last)[end:]
+    return texts
+
+
+class FillPlan:
+    """
+    文档的占位符位置表，值可以逐个加入：段落中的占位符全部有值时立即改写该段落，
+    finish() 时遍历一次文档，改写其余段落（缺少的值置为空格）并清理。每个段落只改写一次。
+    位置表可以通过 to_map() 导出，之后用 from_map() 直接恢复，无需再扫描文档文本。
+    Placeholder locations of a document, each paragraph rewritten exactly once
+    """
+    def __init__(self, roots: list, empty_text: str = EMPTY_TEXT):
+        """
+        扫描 roots 下全部段落的文本，记录占位符位置。
+        :param roots: 要填充的 XML 根元素，见 document_roots
+        :param empty_text: 未提取到值的占位符的替换文本
+        """
+        start = time.perf_counter()
+        self._reset(roots, empty_text)
+        self.stats["passes"] += 1
+        for root in roots:
+            for _, segments in iter_paragraphs(root):
+                self.stats["paragraphs"] += 1
+                texts = segment_texts(segments)
+                if not any("{" in text for text in texts):
+                    continue
+                matches = locate(texts)
+                if matches:
+                    self._add_paragraph(segments, matches)
+        self.timings["locate"] = time.perf_counter() - start
+
+    def _reset(self, roots: list, empty_text: str):
+        self.roots = roots
+        self.empty_text = empty_text
+        self.values: Dict[str, str] = {}
+        # 每个段落：(段落各部分的元素, [(起始部分, 起始偏移, 结束部分, 结束偏移, 名称)])
+        self.paragraphs: List[Tuple[list, List[Tuple[int, int, int, int, str]]]] = []
+        self.key_paragraphs: Dict[str, List[int]] = {}
+        self.missing: List[int] = []  # 每个段落尚未收到值的占位符数
+        self.rendered: List[bool] = []
+        self.first_texts: Dict[object, int] = {}  # 段落中第一处占位符起始的 w:t -> 段落序号
+        self.leftovers: List[str] = []
+        # passes 为遍历整个文档的次数
+        self.stats = {"paragraphs": 0, "placeholders": 0, "split": 0, "filled": 0, "leftover": 0, "passes": 0}
+        self.timings = {"locate": 0.0, "fill": 0.0, "finish": 0.0}  # 各阶段耗时（秒）
+
+    def _add_paragraph(self, segments: list, matches: List[Tuple[int, int, int, int, str]]):
+        index = len(self.paragraphs)
+        self.paragraphs.append((segments, matches))
+        keys = {match[4] for match in matches}
+        for key in keys:
+            self.key_paragraphs.setdefault(key, []).append(index)
+        self.missing.append(len(keys))
+        self.rendered.append(False)
+        self.first_texts[segments[matches[0][0]]] = index
+        self.stats["placeholders"] += len(matches)
+        self.stats["split"] += sum(1 for first, _, last, _, _ in matches if first != last)
+
+    def to_map(self) -> Optional[dict]:
+        """
+        导出位置表：每处占位符记为 [起始 w:t 序号, 起始偏移, 结束 w:t 序号, 结束偏移, 名称序号]，
+        w:t 序号为其在各根元素下按文档顺序的编号，按段落分组。
+        跨 run 的占位符中间夹有文本框等其他段落的文本时无法用序号区间表示，返回 None。
+        """
+        ordinals = {element: i for i, element in enumerate(self._texts(self.roots))}
+        keys = self.keys
+        key_index = {key: i for i, key in enumerate(keys)}
+        paragraphs = []
+        for segments, matches in self.paragraphs:
+            for first, _, last, _, _ in matches:
+                if ordinals[segments[last]] - ordinals[segments[first]] != last - first:
+                    return None
+            paragraphs.append([value for first, start, last, end, key in matches
+                               for value in (ordinals[segments[first]], start, ordinals[segments[last]], end,
+                                             key_index[key])])
+        return {"texts": len(ordinals), "paragraphs_total": self.stats["paragraphs"],
+                "keys": keys, "paragraphs": paragraphs}
+
+    @classmethod
+    def from_map(cls, roots: list, data: dict, empty_text: str = EMPTY_TEXT) -> Optional["FillPlan"]:
+        """由 to_map() 导出的位置表恢复，只需按顺序列出 w:t 元素；文档结构与位置表不一致时返回 None"""
+        start = time.perf_counter()
+        texts = cls._texts(roots)
+        if len(texts) != data.get("texts"):
+            return None
+        plan = cls.__new__(cls)
+        plan._reset(roots, empty_text)
+        plan.stats["paragraphs"] = data.get("paragraphs_total", 0)
+        keys = data["keys"]
+        for flat in data["paragraphs"]:
+            matches = [tuple(flat[i:i + 4]) + (keys[flat[i + 4]],) for i in range(0, len(flat), 5)]
+            if not (texts[matches[0][0]].text or "")[matches[0][1]:].startswith("{"):
+                return None
+            plan._add_paragraph(texts, matches)
+        plan.timings["locate"] = time.perf_counter() - start
+        return plan
+
+    @staticmethod
+    def _texts(roots: list) -> list:
+        return [element for root in roots for element in root.iter(W_T)]
+
+    @property
+    def keys(self) -> List[str]:
+        """文档中出现的全部占位符名称"""
+        return list(self.key_paragraphs)
+
+    def fill(self, key: str, text: str) -> int:
+        """
+        加入一个占位符的替换文本，该占位符所在段落的值全部收到时立即改写。
+        :return: 文档中包含该占位符的段落数
+        """
+        key = key.strip()
+        if key in self.values:
+            return 0
+        start = time.perf_counter()
+        self.values[key] = text
+        paragraphs = self.key_paragraphs.get(key, [])
+        for index in paragraphs:
+            self.missing[index] -= 1
+            if self.missing[index] == 0:
+                self._render(index)
+        self.timings["fill"] += time.perf_counter() - start
+        return len(paragraphs)
+
+    def finish(self, clean: bool = True) -> List[str]:
+        """
+        遍历一次文档：改写尚未改写的段落（缺少值的占位符置为空格），clean 为 True 时同时清理每个段落
+        （见 clean_paragraph）。
+        :return: 未提取到值的占位符名称
+        """
+        start = time.perf_counter()
+        if clean:
+            self.stats["passes"] += 1
+            for root in self.roots:
+                for paragraph, segments in iter_paragraphs(root):
+                    for segment in segments:
+                        index = self.first_texts.get(segment)
+                        if index is not None:
+                            self._render(index)
+                    clean_paragraph(paragraph, segments)
+        for index in range(len(self.paragraphs)):
+            self._render(index)
+        self.timings["finish"] = time.perf_counter() - start
+        return list(dict.fromkeys(self.leftovers))
+
+    def _render(self, index: int):
+        """按占位符位置改写一个段落：从后往前替换，前面的位置不受影响"""
+        if self.rendered[index]:
+            return
+        self.rendered[index] = True
+        segments, matches = self.paragraphs[index]
+
+        def replacement(key: str) -> str:
+            value = self.values.get(key)
+            if value is None:
+                self.leftovers.append(key)
+                self.stats["leftover"] += 1
+                return self.empty_text
+            self.stats["filled"] += 1
+            return value
+
+        texts = substitute(lambda position: segments[position].text or "", matches, replacement)
+        for position, value in texts.items():
+            set_text(segments[position], value)
@@ -0,0 +1,128 @@
+"""
+增量 JSON 对象解析
+Incremental JSON Object Parser
+大模型流式输出 {"键": "值", ...} 时，每收到一段文本就继续解析，键值对一完整就立即返回，
+无需等待整个响应结束。只解析第一个顶层对象，对象前的说明文字和 ```json 代码块标记会被跳过。
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class JSONObjectStream:
+    """
+    逐段输入文本，返回新完成的顶层键值对
+    Feed text chunks, get completed top-level key/value pairs
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0           # 下一个待解析字符的位置
+        self.state = "start"   # start/key/colon/value/done
+        self.key = None
+        self.result: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已经结束"""
+        return self.state == "done"
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """追加一段文本，返回本次新完成的 (键, 值) 列表"""
+        self.buffer += text
+        items = []
+        while self.state != "done":
+            if self.state == "start":
+                start = self.buffer.find("{", self.pos)
+                if start == -1:
+                    self.pos = len(self.buffer)
+                    break
+                self.pos = start + 1
+                self.state = "key"
+            elif self.state == "key":
+                self._skip(" \t\r\n,")
+                if self.pos >= len(self.buffer):
+                    break
+                char = self.buffer[self.pos]
+                if char == "}":
+                    self.pos += 1
+                    self.state = "done"
+                    break
+                end = self._string_end(self.pos) if char == '"' else -1
+                if end == -1:
+                    if char != '"':
+                        self.state = "done"  # 键不是字符串，不是合法 JSON，交由调用方整体解析
+                    break
+                self.key = json.loads(self.buffer[self.pos:end])
+                self.pos = end
+                self.state = "colon"
+            elif self.state == "colon":
+                self._skip(" \t\r\n")
+                if self.pos >= len(self.buffer):
+                    break
+                if self.buffer[self.pos] != ":":
+                    self.state = "done"
+                    break
+                self.pos += 1
+                self.state = "value"
+            elif self.state == "value":
+                self._skip(" \t\r\n")
+                end = self._value_end(self.pos)
+                if end == -1:
+                    break
+                raw = self.buffer[self.pos:end]
+                try:
+                    value = json.loads(raw)
+                except ValueError:
+                    value = raw.strip()
+                self.result[self.key] = value
+                items.append((self.key, value))
+                self.pos = end
+                self.state = "key"
+        return items
+
+    def _skip(self, chars: str):
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+            self.pos += 1
+
+    def _string_end(self, start: int) -> int:
+        """start 处为引号，返回字符串结束后的位置；字符串尚未完整时返回 -1"""
+        i = start + 1
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == "\\":
+                i += 2
+                continue
+            if char == '"':
+                return i + 1
+            i += 1
+        return -1
+
+    def _value_end(self, start: int) -> int:
+        """返回从 start 开始的值结束后的位置；值尚未完整时返回 -1"""
+        if start >= len(self.buffer):
+            return -1
+        char = self.buffer[start]
+        if char == '"':
+            return self._string_end(start)
+        if char in "{[":
+            # 嵌套的对象或数组：跟踪括号深度，跳过字符串中的括号
+            depth, i = 0, start
+            while i < len(self.buffer):
+                char = self.buffer[i]
+                if char == '"':
+                    i = self._string_end(i)
+                    if i == -1:
+                        return -1
+                    continue
+                if char in "{[":
+                    depth += 1
+                elif char in "}]":
+                    depth -= 1
+                    if depth == 0:
+                        return i + 1
+                i += 1
+            return -1
+        # 数字、true/false/null：遇到分隔符才能确定已经结束
+        for i in range(start, len(self.buffer)):
+            if self.buffer[i] in ",}\r\n":
+                return i
+        return -1
@@ -0,0 +1,529 @@
+"""
+知识库索引管理
+Knowledge Base Index
+每个合同类型对应一个按模板ID映射的 FAISS 索引。模板拥有稳定ID，支持单个模板的新增、替换和删除。
+
+目录结构 / Layout (contracts/RAG/<type>/):
+    index_meta.json             元数据（提交点）：索引文件名、代次、模板ID映射
+    knowledge_base-<gen>.index  当前代次的 FAISS 索引
+    vectors-<gen>.npy           按ID排序的原始向量（仅近似/量化索引，用于重建、转换索引类型和精确重排）
+    filenames.txt               按ID排序的模板文件名列表（由元数据派生，供查看和旧版本兼容）
+
+索引类型 / Index types (index_meta.json 中的 index_type 和 index_params):
+    flat   精确检索（IndexFlatL2），适合几千个以内的模板
+    hnsw   HNSW 图索引，参数 M、efConstruction，检索参数 efSearch
+    ivf    倒排索引（IVF-Flat），参数 nlist（0 表示按模板数自动选择），检索参数 nprobe
+    sq8    标量量化（每维 1 字节，约为原始向量的 1/4），检索参数 rescore
+    pq     乘积量化，参数 m（子空间数，每个向量 m 字节）、nbits，检索参数 rescore
+
+量化索引（sq8/pq）先取 k*rescore 个候选，再用原始向量（内存映射，只读取候选所在的页）计算精确距离重排，
+rescore 为 0 时直接返回量化距离。
+
+保存时先写入新代次的索引文件，再原子替换 index_meta.json，最后更新 filenames.txt 并删除旧索引，
+读取方总是看到一致的索引与文件名映射。索引文件写入后不再修改，因此可以只读内存映射加载：
+同一台机器上的多个进程共享操作系统页缓存中的同一份数据，启动时也不必整体读入内存。没有 index_meta.json 的旧格式目录（扁平索引 + filenames.txt，
+行号即ID）可直接读取，在第一次修改时转换为新格式。
+"""
+import os
+import json
+from typing import Dict, List, Optional
+
+META_FILE = "index_meta.json"
+FILENAMES_FILE = "filenames.txt"
+LEGACY_INDEX_FILE = "knowledge_base.index"
+INDEX_FORMAT = 2
+
+# 各索引类型的默认参数，efSearch/nprobe 为检索参数，加载时按元数据设置
+DEFAULT_INDEX_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 80, "efSearch": 64},
+    "ivf": {"nlist": 0, "nprobe": 8},
+    "sq8": {"rescore": 4},
+    "pq": {"m": 48, "nbits": 8, "rescore": 20},
+}
+INDEX_TYPES = tuple(DEFAULT_INDEX_PARAMS)
+FAISS_SEARCH_PARAMS = ("efSearch", "nprobe")
+SEARCH_PARAMS = FAISS_SEARCH_PARAMS + ("rescore",)
+
+
+def _write_atomic(path, write):
+    """先写入临时文件再原子替换目标文件，write 为接收临时文件路径的回调"""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_text_atomic(path, text):
+    """原子写入文本文件"""
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+    _write_atomic(path, write)
+
+
+def index_params(index_type: str, params: Optional[dict] = None) -> dict:
+    """合并索引类型的默认参数和传入参数"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选: {', '.join(INDEX_TYPES)}")
+    merged = dict(DEFAULT_INDEX_PARAMS[index_type])
+    merged.update(params or {})
+    return merged
+
+
+def create_index(index_type: str, vectors, ids, params: Optional[dict] = None):
+    """
+    创建指定类型的 FAISS 索引并加入向量，检索返回的是 ids 中的模板ID。
+    Create a FAISS index of the given type holding `vectors` under `ids`.
+    :param vectors: 形状为 (n, dim) 的 float32 矩阵
+    :param ids: 长度为 n 的 int64 模板ID
+    :return: (索引, 合并默认值后的参数)
+    """
+    import faiss
+    import numpy as np
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    dimension = vectors.shape[1]
+    params = index_params(index_type, params)
+
+    if index_type == "hnsw":
+        index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dimension, int(params["M"])))
+        faiss.downcast_index(index.index).hnsw.efConstruction = int(params["efConstruction"])
+    elif index_type == "ivf":
+        nlist = int(params["nlist"])
+        if nlist <= 0:
+            # 约 4*sqrt(n) 个聚类中心，且保证每个中心至少有 39 个训练样本
+            nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39))
+        # IVF 自带ID映射并支持按ID删除，不能再包一层 IndexIDMap（删除后ID会错位）
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat")
+        index.train(vectors)
+    elif index_type == "sq8":
+        index = faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit))
+        index.train(vectors)
+    elif index_type == "pq":
+        m = int(params["m"])
+        if dimension % m:
+            raise ValueError(f"PQ 子空间数 m={m} 必须整除向量维度 {dimension}")
+        # 每个子空间的聚类中心数 2^nbits 不能超过训练样本数
+        nbits = int(params["nbits"])
+        while nbits > 1 and (1 << nbits) > len(vectors):
+            nbits -= 1
+        index = faiss.IndexIDMap2(faiss.IndexPQ(dimension, m, nbits))
+        index.train(vectors)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    apply_search_params(index, params)
+    return index, params
+
+
+def read_index(path, mmap: bool = False):
+    """
+    读取 FAISS 索引文件。mmap 为 True 时以只读内存映射方式打开，向量数据不复制到进程堆中。
+    内存映射的索引不能直接修改（FAISS 会直接终止进程），修改前须通过 KnowledgeBase 复制。
+    """
+    import faiss
+
+    if not mmap:
+        return faiss.read_index(path)
+    # 旧版本 FAISS 没有 IO_FLAG_MMAP_IFC，IO_FLAG_MMAP 只对 IVF 倒排表生效
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(path, flags)
+
+
+def apply_search_params(index, params: dict):
+    """将元数据中的检索参数（efSearch/nprobe）设置到索引上"""
+    import faiss
+
+    parameter_space = faiss.ParameterSpace()
+    for name in FAISS_SEARCH_PARAMS:
+        if name in params:
+            parameter_space.set_index_parameter(index, name, params[name])
+
+
+# 规范化模板文件名
+def template_filename(name: str) -> str:
+    """将模板名（可带或不带扩展名）统一为关键词文件名，如 '保管合同' -> '保管合同.txt'"""
+    name = name.strip()
+    for ext in (".txt", ".docx"):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return f"{name}.txt"
+
+
+class KnowledgeBase:
+    """
+    单个合同类型的知识库索引
+    Knowledge base index of one contract type
+    templates 保存 模板ID -> 关键词文件名 的映射，FAISS 检索返回的就是模板ID。
+    """
+    def __init__(self, type_path, index, templates: Dict[int, str], meta: Optional[dict] = None, vectors=None,
+                 read_only: bool = False):
+        """
+        :param type_path: 知识库目录 contracts/RAG/<type>
+        :param index: FAISS 索引（新格式按模板ID检索，旧格式为扁平索引）
+        :param templates: 模板ID -> 关键词文件名
+        :param meta: index_meta.json 内容，旧格式为 None
+        :param vectors: 按模板ID排序的原始向量，仅近似索引需要
+        :param read_only: 索引是否为只读内存映射，修改前会先复制到进程内存
+        """
+        self.type_path = str(type_path)
+        self.index = index
+        self.templates = templates
+        self.meta = meta if meta is not None else {}
+        self.vectors = vectors
+        self.read_only = read_only
+        self._row_ids = None
+
+    @property
+    def ntotal(self) -> int:
+        """索引中的向量数量"""
+        return self.index.ntotal
+
+    @property
+    def index_type(self) -> str:
+        """索引类型：flat/hnsw/ivf/sq8/pq"""
+        return self.meta.get("index_type", "flat")
+
+    @property
+    def index_params(self) -> dict:
+        """索引参数（含检索参数）"""
+        return self.meta.get("index_params", {})
+
+    @property
+    def next_id(self) -> int:
+        """下一个可分配的模板ID，已删除的ID不会被复用"""
+        used = max(self.templates) + 1 if self.templates else 0
+        return max(self.meta.get("next_id", 0), used)
+
+    @property
+    def filenames(self) -> List[str]:
+        """按模板ID排序的关键词文件名列表"""
+        return [self.templates[template_id] for template_id in sorted(self.templates)]
+
+    def __len__(self):
+        return len(self.templates)
+
+    def id_of(self, filename: str) -> Optional[int]:
+        """根据模板名查找模板ID"""
+        filename = template_filename(filename)
+        for template_id, name in self.templates.items():
+            if name == filename:
+                return template_id
+        return None
+
+    # 读取模板名列表（不加载索引）
+    @staticmethod
+    def read_filenames(type_path) -> List[str]:
+        """读取知识库中的模板文件名，优先使用元数据，旧格式读取 filenames.txt"""
+        meta_path = os.path.join(type_path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            templates = {int(k): v for k, v in meta["templates"].items()}
+            return [templates[template_id] for template_id in sorted(templates)]
+        with open(os.path.join(type_path, FILENAMES_FILE), "r", encoding="utf-8") as f:
+            return [line.strip() for line in f.readlines() if line.strip()]
+
+    # 从磁盘加载
+    @classmethod
+    def load(cls, type_path, mmap: bool = False) -> "KnowledgeBase":
+        """
+        从知识库目录加载索引和模板映射。
+        Load the index and template mapping from a knowledge base directory.
+        :param mmap: 是否以只读内存映射方式打开索引，多个进程共享同一份页缓存
+        """
+        meta_path = os.path.join(type_path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            index = read_index(os.path.join(type_path, meta["index_file"]), mmap)
+            apply_search_params(index, meta.get("index_params", {}))
+            # 模板映射单独保存在 templates 中，元数据里不再保留一份（模板很多时两份映射占用可观的内存）
+            templates = {int(k): v for k, v in meta.pop("templates").items()}
+            vectors = None
+            if meta.get("vectors_file"):
+                import numpy as np
+                vectors = np.load(os.path.join(type_path, meta["vectors_file"]), mmap_mode="r")
+            return cls(type_path, index, templates, meta, vectors, read_only=mmap)
+
+        # 旧格式：扁平索引 + filenames.txt，行号即模板ID
+        index_files = sorted(name for name in os.listdir(type_path) if name.endswith(".index"))
+        if not index_files:
+            raise FileNotFoundError(f"知识库目录中没有索引文件: {type_path}")
+        index = read_index(os.path.join(type_path, index_files[0]), mmap)
+        filenames = cls.read_filenames(type_path)
+        return cls(type_path, index, dict(enumerate(filenames)), read_only=mmap)
+
+    # 从向量构建
+    @classmethod
+    def build(cls, type_path, filenames: List[str], embeddings, model_id: Optional[str] = None,
+              index_type: str = "flat", params: Optional[dict] = None) -> "KnowledgeBase":
+        """
+        由文件名列表和对应的向量矩阵构建新的知识库，模板ID从0开始按顺序分配。
+        Build a new knowledge base; template IDs are assigned in order starting from 0.
+        :param index_type: 索引类型 flat/hnsw/ivf/sq8/pq
+        :param params: 索引参数，未指定的使用默认值
+        """
+        import numpy as np
+
+        templates = {i: template_filename(name) for i, name in enumerate(filenames)}
+        knowledge_base = cls(type_path, None, templates, {"model": model_id, "next_id": len(filenames)})
+        knowledge_base._set_index(index_type, params, np.arange(len(filenames), dtype="int64"), embeddings)
+        return knowledge_base
+
+    def copy(self) -> "KnowledgeBase":
+        """复制知识库（索引深拷贝），修改副本不影响正在检索的原对象"""
+        import faiss
+        import numpy as np
+
+        vectors = None if self.vectors is None else np.array(self.vectors)
+        return KnowledgeBase(self.type_path, self._writable_index(), dict(self.templates), dict(self.meta), vectors)
+
+    def _writable_index(self):
+        """返回索引的可修改副本；clone_index 对内存映射的索引仍然只复制映射视图，需要序列化后重新读取"""
+        import faiss
+
+        if self.read_only:
+            return faiss.deserialize_index(faiss.serialize_index(self.index))
+        return faiss.clone_index(self.index)
+
+    def _ensure_writable(self):
+        """修改前确保索引不是只读内存映射"""
+        if self.read_only:
+            self.index = self._writable_index()
+            self.read_only = False
+
+    def _set_index(self, index_type, params, ids, vectors):
+        """用给定的向量重新创建索引；近似索引同时保留原始向量"""
+        import numpy as np
+
+        self.index, params = create_index(index_type, vectors, ids, params)
+        self.read_only = False
+        self.meta["index_type"] = index_type
+        self.meta["index_params"] = params
+        self.vectors = None if index_type == "flat" else np.array(vectors, dtype="float32")
+        self._row_ids = None
+
+    # 检索
+    def search(self, query_vectors, k):
+        """
+        检索最相近的 k 个模板，返回值与 faiss.Index.search 相同：(距离矩阵, 模板ID矩阵)，不足 k 个时ID为 -1。
+        量化索引先取 k*rescore 个候选，再用原始向量计算精确的 L2 距离重新排序。
+        """
+        import numpy as np
+
+        rescore = int(self.index_params.get("rescore", 0))
+        if rescore <= 1 or self.vectors is None:
+            return self.index.search(query_vectors, k)
+
+        query_vectors = np.asarray(query_vectors, dtype="float32").reshape(-1, self.index.d)
+        _, candidates = self.index.search(query_vectors, k * rescore)
+        distances = np.full((len(query_vectors), k), np.finfo("float32").max, dtype="float32")
+        ids = np.full((len(query_vectors), k), -1, dtype="int64")
+        row_ids = self.row_ids()
+        for row, (query, candidate_ids) in enumerate(zip(query_vectors, candidates)):
+            candidate_ids = candidate_ids[candidate_ids >= 0]
+            # 按行号排序读取，内存映射的向量文件只需访问候选所在的页
+            rows = np.searchsorted(row_ids, candidate_ids)
+            order = np.argsort(rows)
+            exact = ((self.vectors[rows[order]] - query) ** 2).sum(axis=1)
+            best = np.argsort(exact)[:k]
+            distances[row, :len(best)] = exact[best]
+            ids[row, :len(best)] = candidate_ids[order][best]
+        return distances, ids
+
+    def row_ids(self):
+        """原始向量各行对应的模板ID（升序）"""
+        import numpy as np
+
+        if self._row_ids is None:
+            self._row_ids = np.array(sorted(self.templates), dtype="int64")
+        return self._row_ids
+
+    # 按模板ID顺序取出全部向量
+    def all_vectors(self):
+        """
+        返回 (按顺序排列的模板ID, 对应的向量矩阵)。
+        近似索引读取保存的原始向量，扁平索引直接从索引中取出。
+        """
+        import faiss
+        import numpy as np
+
+        ids = np.array(sorted(self.templates), dtype="int64")
+        if self.vectors is not None:
+            return ids, np.asarray(self.vectors, dtype="float32")
+        self._ensure_id_map()
+        stored_ids = faiss.vector_to_array(self.index.id_map)
+        stored = faiss.downcast_index(self.index.index).reconstruct_n(0, self.index.ntotal)
+        order = np.argsort(stored_ids)
+        return stored_ids[order], stored[order]
+
+    # 转换索引类型或调整参数
+    def rebuild_index(self, index_type: Optional[str] = None, params: Optional[dict] = None):
+        """
+        用已有向量重新创建索引（不重新编码），可切换索引类型或修改构建参数。
+        Recreate the index from the stored vectors, optionally switching its type.
+        """
+        index_type = index_type or self.index_type
+        if params is None and index_type == self.index_type:
+            params = self.index_params
+        ids, vectors = self.all_vectors()
+        self._set_index(index_type, params, ids, vectors)
+
+    # 调整检索参数
+    def set_search_params(self, **params):
+        """修改检索参数（efSearch/nprobe/rescore），保存后写入元数据，下次加载时生效"""
+        supported = [name for name in SEARCH_PARAMS if name in DEFAULT_INDEX_PARAMS[self.index_type]]
+        unknown = [name for name in params if name not in supported]
+        if unknown:
+            raise ValueError(f"{self.index_type} 索引不支持检索参数: {', '.join(unknown)}，"
+                             f"可用: {', '.join(supported) or '无'}")
+        merged = dict(self.index_params)
+        merged.update(params)
+        apply_search_params(self.index, merged)
+        self.meta["index_params"] = merged
+
+    def _ensure_id_map(self):
+        """旧格式扁平索引转换为 IndexIDMap2，行号作为模板ID；没有对应文件名的多余向量被丢弃"""
+        import faiss
+        import numpy as np
+
+        if self.meta.get("index_type") or isinstance(self.index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return
+        ids = np.array(sorted(i for i in self.templates if i < self.index.ntotal), dtype="int64")
+        vectors = np.vstack([self.index.reconstruct(int(i)) for i in ids]) if len(ids) else None
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.index.d))
+        if vectors is not None:
+            index.add_with_ids(vectors, ids)
+        self.templates = {int(i): self.templates[int(i)] for i in ids}
+        self._row_ids = None
+        self.index = index
+        self.read_only = False
+
+    # 新增模板
+    def add(self, filename: str, vector) -> int:
+        """
+        新增一个模板，返回分配的模板ID。
+        :param vector: 形状为 (dim,) 或 (1, dim) 的 float32 向量
+        """
+        import numpy as np
+
+        filename = template_filename(filename)
+        if self.id_of(filename) is not None:
+            raise ValueError(f"模板已存在: {filename}")
+        self._ensure_writable()
+        self._ensure_id_map()
+        template_id = self.next_id
+        vector = np.asarray(vector, dtype="float32").reshape(1, -1)
+        self.index.add_with_ids(vector, np.array([template_id], dtype="int64"))
+        if self.vectors is not None:
+            # 新ID总是最大的，追加到末尾即保持按ID排序
+            self.vectors = np.vstack([self.vectors, vector])
+        self.templates[template_id] = filename
+        self._row_ids = None
+        self.meta["next_id"] = template_id + 1
+        return template_id
+
+    # 替换模板向量
+    def replace(self, filename: str, vector) -> int:
+        """替换已有模板的向量，模板ID保持不变"""
+        import numpy as np
+
+        filename = template_filename(filename)
+        template_id = self.id_of(filename)
+        if template_id is None:
+            raise KeyError(f"模板不存在: {filename}")
+        self._ensure_writable()
+        self._ensure_id_map()
+        vector = np.asarray(vector, dtype="float32").reshape(1, -1)
+        if self.vectors is not None:
+            vectors = np.array(self.vectors)
+            vectors[int(np.searchsorted(self.row_ids(), template_id))] = vector[0]
+            self.vectors = vectors
+        if self.index_type == "hnsw":
+            # HNSW 不支持删除，用更新后的向量重建
+            self.rebuild_index()
+        else:
+            ids = np.array([template_id], dtype="int64")
+            self.index.remove_ids(ids)
+            self.index.add_with_ids(vector, ids)
+        return template_id
+
+    # 删除模板
+    def remove(self, filename: str) -> int:
+        """删除模板，返回被删除的模板ID"""
+        import numpy as np
+
+        filename = template_filename(filename)
+        template_id = self.id_of(filename)
+        if template_id is None:
+            raise KeyError(f"模板不存在: {filename}")
+        self._ensure_writable()
+        self._ensure_id_map()
+        if self.vectors is not None:
+            self.vectors = np.delete(self.vectors, int(np.searchsorted(self.row_ids(), template_id)), axis=0)
+        del self.templates[template_id]
+        self._row_ids = None
+        if self.index_type == "hnsw":
+            # HNSW 不支持删除，用剩余向量重建
+            self.rebuild_index()
+        else:
+            self.index.remove_ids(np.array([template_id], dtype="int64"))
+        self.meta["next_id"] = self.next_id
+        return template_id
+
+    # 保存到磁盘
+    def save(self):
+        """
+        保存为新代次的索引文件并原子替换元数据，随后更新 filenames.txt、删除旧索引文件。
+        Save as a new index generation, atomically swap the metadata, then refresh filenames.txt.
+        """
+        import faiss
+        import numpy as np
+
+        self._ensure_id_map()
+        os.makedirs(self.type_path, exist_ok=True)
+        generation = self.meta.get("generation", 0) + 1
+        index_file = f"knowledge_base-{generation}.index"
+        _write_atomic(os.path.join(self.type_path, index_file), lambda path: faiss.write_index(self.index, path))
+
+        vectors_file = None
+        if self.vectors is not None:
+            vectors_file = f"vectors-{generation}.npy"
+
+            def write_vectors(path):
+                with open(path, "wb") as f:
+                    np.save(f, np.asarray(self.vectors, dtype="float32"))
+            _write_atomic(os.path.join(self.type_path, vectors_file), write_vectors)
+
+        meta = dict(self.meta)
+        meta.update({
+            "format": INDEX_FORMAT,
+            "generation": generation,
+            "index_file": index_file,
+            "dimension": self.index.d,
+            "index_type": self.index_type,
+            "index_params": self.index_params,
+            "vectors_file": vectors_file,
+            "next_id": self.next_id,
+            "templates": {str(k): self.templates[k] for k in sorted(self.templates)},
+        })
+        _write_text_atomic(os.path.join(self.type_path, META_FILE), json.dumps(meta, ensure_ascii=False, indent=2))
+        # 与加载时一致，内存中的元数据不保留模板映射（已在 templates 中）
+        meta.pop("templates")
+        self.meta = meta
+
+        _write_text_atomic(os.path.join(self.type_path, FILENAMES_FILE), "".join(f"{name}\n" for name in self.filenames))
+
+        # 删除旧代次和旧格式的索引文件及向量文件
+        for name in os.listdir(self.type_path):
+            if name.endswith((".index", ".npy")) and name not in (index_file, vectors_file):
+                try:
+                    os.remove(os.path.join(self.type_path, name))
+                except OSError as e:
+                    print(f"删除旧索引文件失败: {name}, {str(e)}")
@@ -0,0 +1,148 @@
+"""
+大模型响应持久化缓存
+LLM Response Cache
+以（模型名称, 消息列表）的哈希为键，将大模型返回的文本保存在本地 SQLite 数据库中。
+同一份会议纪要或模板再次提交时直接返回已有结果，不再重复调用 API。
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class LLMResponseCache:
+    """
+    内容寻址的大模型响应缓存
+    Content-addressed LLM response cache
+    按调用类型（kind）设置有效期，总大小超过上限时淘汰最久未使用的条目；可被多个线程和进程共享。
+    """
+    def __init__(self, db_path, max_bytes: int = 0, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 0):
+        """
+        :param db_path: SQLite 数据库文件路径，不存在时自动创建
+        :param max_bytes: 缓存响应文本的总字节数上限，0 为不限制
+        :param ttls: 调用类型 -> 有效期（秒），0 表示该类型不缓存
+        :param default_ttl: ttls 中未列出的调用类型使用的有效期
+        """
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " response TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]]) -> str:
+        """由模型名称和消息列表（规范化为 JSON）计算缓存键"""
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{model}\0{payload}".encode("utf-8")).hexdigest()
+
+    def ttl(self, kind: str) -> float:
+        """调用类型对应的有效期（秒）"""
+        return self.ttls.get(kind, self.default_ttl)
+
+    def _count(self, kind: str, name: str):
+        counter = self._counters.setdefault(kind, {"hits": 0, "misses": 0})
+        counter[name] += 1
+
+    def get(self, model: str, messages: List[Dict[str, Any]], kind: str) -> Optional[str]:
+        """读取缓存的响应文本，不存在或已过期时返回 None"""
+        ttl = self.ttl(kind)
+        if ttl <= 0:
+            return None
+        key = self.make_key(model, messages)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[0] > ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self._count(kind, "misses")
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._count(kind, "hits")
+            return row[1]
+
+    def put(self, model: str, messages: List[Dict[str, Any]], kind: str, response: str):
+        """写入响应文本，写入后按总大小淘汰最久未使用的条目"""
+        if self.ttl(kind) <= 0:
+            return
+        key = self.make_key(model, messages)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, kind, now, now, size, response)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """总大小超过上限时按最近访问时间从旧到新删除，直到降到上限的 90%（调用方持有锁）"""
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        removed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= target:
+                break
+            removed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+        self.evictions += len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回条目数、总字节数、淘汰数及按调用类型的命中统计（hits/misses/hit_rate）"""
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            kinds = {kind: dict(counter) for kind, counter in self._counters.items()}
+        for counter in kinds.values():
+            lookups = counter["hits"] + counter["misses"]
+            counter["hit_rate"] = counter["hits"] / lookups if lookups else 0.0
+        hits = sum(counter["hits"] for counter in kinds.values())
+        lookups = hits + sum(counter["misses"] for counter in kinds.values())
+        return {
+            "entries": entries,
+            "bytes": total,
+            "evictions": self.evictions,
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "kinds": kinds,
+        }
+
+    def clear(self):
+        """删除全部缓存条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,322 @@
+"""
+大模型调用客户端
+LLM Client
+所有大模型调用的统一入口：复用 HTTP 连接池，按调用设置截止时间，对临时性错误（超时、连接失败、
+429、5xx）按带随机抖动的指数退避重试；支持流式输出，逐段返回生成的文本。
+传输层（后端）可替换，便于接入本地模拟服务进行离线压测。
+"""
+import json
+import time
+import random
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+
+# 可重试的 HTTP 状态码：限流和服务端错误
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# DashScope 文本生成接口（相对 base_url 的路径）
+GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+
+class LLMError(Exception):
+    """大模型调用失败"""
+    def __init__(self, message: str, retryable: bool = False, status: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+
+class LLMTimeoutError(LLMError):
+    """超过调用截止时间"""
+    def __init__(self, message: str):
+        super().__init__(message, retryable=True)
+
+
+class LLMResponseError(LLMError):
+    """响应格式不正确"""
+
+
+class HTTPBackend:
+    """
+    直接请求 DashScope HTTP 接口的后端，使用 requests.Session 连接池在多次调用和多个线程间复用连接
+    HTTP backend with a pooled requests.Session
+    """
+    def __init__(self, base_url: str, api_key: str, pool_size: int = 8):
+        """
+        :param base_url: 接口根地址，如 https://dashscope.aliyuncs.com/api/v1 或本地模拟服务地址
+        :param api_key: API 密钥
+        :param pool_size: 连接池大小，应不小于并发调用数
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = base_url.rstrip("/") + GENERATION_PATH
+        self.api_key = api_key
+        self.session = requests.Session()
+        # 重试由 LLMClient 负责，适配器本身不重试
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def generate(self, messages: List[Dict[str, Any]], model: str, timeout: float) -> Dict[str, Any]:
+        """发送一次生成请求，返回响应 JSON；timeout 为本次请求的剩余时间（秒）"""
+        response = self._post(messages, model, timeout, stream=False)
+        try:
+            return response.json()
+        except ValueError:
+            raise LLMResponseError(f"响应不是合法的JSON: {response.text[:200]}")
+
+    def stream(self, messages: List[Dict[str, Any]], model: str, timeout: float) -> Iterator[str]:
+        """以 SSE 流式请求生成，逐段返回新增的文本；超过 timeout 仍未结束时抛出 LLMTimeoutError"""
+        import requests
+
+        deadline = time.monotonic() + timeout
+        response = self._post(messages, model, timeout, stream=True)
+        try:
+            for line in response.iter_lines():
+                if time.monotonic() > deadline:
+                    raise LLMTimeoutError(f"流式输出超过截止时间 {timeout:.1f}s")
+                if not line.startswith(b"data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:])
+                except ValueError:
+                    raise LLMResponseError(f"流式响应不是合法的JSON: {line[:200]!r}")
+                if "output" not in data and data.get("code"):
+                    raise LLMError(f"{data.get('code')}: {data.get('message', '')}", retryable=False)
+                piece = LLMClient._content(data)
+                if piece:
+                    yield piece
+        except requests.RequestException as e:
+            raise LLMError(f"流式读取失败: {str(e)}", retryable=True)
+        finally:
+            response.close()
+
+    def _post(self, messages, model, timeout, stream):
+        """发送请求并检查状态码，可重试的错误抛出 retryable=True 的 LLMError"""
+        import requests
+
+        parameters = {"result_format": "message"}
+        headers = {}
+        if stream:
+            parameters["incremental_output"] = True  # 每个事件只包含新增的文本
+            headers = {"X-DashScope-SSE": "enable", "Accept": "text/event-stream"}
+        payload = {"model": model, "input": {"messages": messages}, "parameters": parameters}
+        try:
+            response = self.session.post(self.url, json=payload, headers=headers, stream=stream,
+                                         timeout=(min(timeout, 10), timeout))
+        except requests.Timeout as e:
+            raise LLMTimeoutError(f"请求超时: {str(e)}")
+        except requests.ConnectionError as e:
+            raise LLMError(f"连接失败: {str(e)}", retryable=True)
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("message", response.text)
+            except ValueError:
+                detail = response.text
+            response.close()
+            raise LLMError(f"HTTP {response.status_code}: {detail}",
+                           retryable=response.status_code in RETRYABLE_STATUS, status=response.status_code)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class SDKBackend:
+    """
+    通过 dashscope SDK 的 Generation.call 调用的后端（不复用连接，仅在无法直接访问 HTTP 接口时使用）
+    Backend using the dashscope SDK
+    """
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def generate(self, messages: List[Dict[str, Any]], model: str, timeout: float) -> Dict[str, Any]:
+        from dashscope import Generation
+
+        try:
+            response = Generation.call(
+                api_key=self.api_key,
+                model=model,
+                messages=messages,
+                result_format="message",
+                request_timeout=max(1, int(timeout))
+            )
+        except Exception as e:
+            raise LLMError(f"SDK调用失败: {str(e)}", retryable=True)
+        status = getattr(response, "status_code", 200)
+        if status != 200:
+            raise LLMError(f"HTTP {status}: {getattr(response, 'message', '')}",
+                           retryable=status in RETRYABLE_STATUS, status=status)
+        return response
+
+    def stream(self, messages: List[Dict[str, Any]], model: str, timeout: float) -> Iterator[str]:
+        from dashscope import Generation
+
+        try:
+            responses = Generation.call(
+                api_key=self.api_key,
+                model=model,
+                messages=messages,
+                result_format="message",
+                stream=True,
+                incremental_output=True,
+                request_timeout=max(1, int(timeout))
+            )
+            for response in responses:
+                status = getattr(response, "status_code", 200)
+                if status != 200:
+                    raise LLMError(f"HTTP {status}: {getattr(response, 'message', '')}",
+                                   retryable=status in RETRYABLE_STATUS, status=status)
+                piece = LLMClient._content(response)
+                if piece:
+                    yield piece
+        except LLMError:
+            raise
+        except Exception as e:
+            raise LLMError(f"SDK调用失败: {str(e)}", retryable=True)
+
+    def close(self):
+        pass
+
+
+class LLMClient:
+    """
+    大模型调用客户端，可在多个线程间共享
+    Thread-safe LLM client with deadlines and jittered retries
+    """
+    def __init__(self, backend, model: str, timeout: float = 60, max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8):
+        """
+        :param backend: 传输后端，需提供 generate(messages, model, timeout) -> 响应字典，
+                        以及 stream(messages, model, timeout) -> 逐段文本的迭代器
+        :param model: 默认模型名称
+        :param timeout: 默认的单次调用截止时间（秒），包含全部重试和退避等待
+        :param max_retries: 临时性错误的最大重试次数
+        :param backoff: 首次重试的退避上限（秒），之后每次翻倍
+        :param max_backoff: 单次退避的最大等待时间（秒）
+        """
+        self.backend = backend
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def chat(self, messages: List[Dict[str, Any]], model: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """
+        调用大模型并返回响应文本
+        :param messages: 消息列表
+        :param model: 模型名称，默认使用客户端的模型
+        :param timeout: 本次调用的截止时间（秒），默认使用客户端的设置
+        :return: 响应文本
+        :raises LLMError: 重试耗尽、超过截止时间、不可重试的错误或响应格式不正确
+        """
+        self._count("calls")
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("failures")
+                raise LLMTimeoutError(f"大模型调用超过截止时间 {timeout or self.timeout}s")
+            try:
+                return self._content(self.backend.generate(messages, model or self.model, remaining))
+            except LLMError as e:
+                self._retry_or_raise(e, attempt, deadline, timeout or self.timeout)
+                attempt += 1
+
+    def stream(self, messages: List[Dict[str, Any]], model: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        流式调用大模型，逐段返回生成的文本。
+        只在收到第一段文本之前重试；已经输出部分内容后失败时直接抛出，避免调用方收到重复的文本。
+        :raises LLMError: 同 chat
+        """
+        self._count("calls")
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("failures")
+                raise LLMTimeoutError(f"大模型调用超过截止时间 {timeout or self.timeout}s")
+            started = False
+            try:
+                for piece in self.backend.stream(messages, model or self.model, remaining):
+                    started = True
+                    yield piece
+                return
+            except LLMError as e:
+                if started:
+                    self._count("failures")
+                    raise
+                self._retry_or_raise(e, attempt, deadline, timeout or self.timeout)
+                attempt += 1
+
+    def _retry_or_raise(self, error: LLMError, attempt: int, deadline: float, timeout: float):
+        """可以重试时按退避时间等待后返回，否则计入失败并抛出"""
+        if not error.retryable or attempt >= self.max_retries:
+            self._count("failures")
+            raise error
+        # 全抖动指数退避：在 [0, min(max_backoff, backoff*2^attempt)] 中随机等待，避免并发请求同时重试
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            self._count("failures")
+            raise LLMTimeoutError(f"大模型调用超过截止时间 {timeout}s（最后一次错误: {str(error)}）")
+        print(f"大模型调用失败，{delay:.2f}s 后第 {attempt + 1} 次重试: {str(error)}")
+        self._count("retries")
+        time.sleep(delay)
+
+    @staticmethod
+    def _content(response) -> str:
+        """从响应中取出第一条回复的文本"""
+        try:
+            return response["output"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMResponseError(f"API响应格式不正确: {str(response)[:200]}")
+
+    def stats(self) -> Dict[str, int]:
+        """返回调用次数、重试次数和最终失败次数"""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """关闭后端连接"""
+        self.backend.close()
+
+
+def make_backend(name: str, api_key: str, base_url: str, pool_size: int = 8):
+    """按名称创建后端：http（连接池直连接口）或 sdk（dashscope SDK）"""
+    if name == "http":
+        return HTTPBackend(base_url, api_key, pool_size)
+    if name == "sdk":
+        return SDKBackend(api_key)
+    raise ValueError(f"未知的大模型后端: {name}（可选 http/sdk）")
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """返回进程内共享的客户端，首次调用时按配置创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from core.config import (API_KEY, LLM_MODEL_NAME, LLM_BACKEND, LLM_BASE_URL, LLM_POOL_SIZE,
+                                         LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF)
+                backend = make_backend(LLM_BACKEND, API_KEY, LLM_BASE_URL, LLM_POOL_SIZE)
+                _client = LLMClient(backend, LLM_MODEL_NAME, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF)
+    return _client
@@ -0,0 +1,69 @@
+"""
+日志缓冲
+Buffered Log Sink
+后台线程把进度日志写入有界缓冲，界面线程按固定间隔批量取出并一次写入日志控件，
+日志再多也不会逐行触发界面刷新。服务中的调试输出使用分级的 logging 日志，默认不输出 DEBUG 级别。
+"""
+import sys
+import logging
+import threading
+from collections import deque
+from typing import List, Tuple
+
+LOGGER_NAME = "services"  # 各服务模块使用 logging.getLogger(__name__)，都位于该日志器之下
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level="INFO", stream=None) -> logging.Logger:
+    """
+    设置服务日志的级别和输出（默认标准错误），重复调用只更新级别。
+    :param level: 日志级别名称或数值，如 "DEBUG"
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+
+class LogBuffer:
+    """
+    线程安全的有界日志缓冲：任意线程写入，界面线程定时批量取出；超出容量时丢弃最早的日志并计数
+    Bounded thread-safe buffer between worker threads and the GUI log
+    """
+    def __init__(self, capacity: int):
+        """
+        :param capacity: 最多缓存的日志行数
+        """
+        self._lines = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.dropped = 0  # 上次取出后因缓冲已满而丢弃的行数
+
+    def put(self, message: str):
+        """写入一条日志（可包含多行），可在任意线程调用"""
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self.dropped += 1
+            self._lines.append(message)
+
+    def drain(self, max_lines: int) -> Tuple[List[str], int]:
+        """
+        取出最多 max_lines 条日志。
+        :return: (日志列表, 上次取出后丢弃的条数)
+        """
+        with self._lock:
+            count = min(max_lines, len(self._lines))
+            lines = [self._lines.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
+            self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._lines)
@@ -0,0 +1,146 @@
+"""
+长会议纪要分段处理
+Long Input Map-Reduce
+超长的会议纪要（如数小时的谈判记录）按段落切分后逐段并发调用模型，再合并各段结果：
+占位符取值按“最新或最具体者优先”解决冲突，关键词去重合并，需求分析按多数合同类别合并。
+同时提供在途 token 预算，限制同一时刻发往模型的 token 总量。
+"""
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# 视为“未提取到”的取值，合并时让位于其他分段的有效取值
+EMPTY_VALUES = ("", "无", "没有内容", "未提及", "不详", "N/A", "n/a")
+NO_CONTRACT = "无相关合同"
+
+
+def split_segments(text: str, max_chars: int) -> List[str]:
+    """
+    按段落把文本切分为不超过 max_chars 的分段，尽量不在段落中间断开；
+    单个段落超长时再按句末标点切分，仍超长的句子按长度硬切。
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        if not paragraph.strip():
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[。！？；!?;])", paragraph):
+            for start in range(0, len(sentence), max_chars):
+                if sentence[start:start + max_chars]:
+                    pieces.append(sentence[start:start + max_chars])
+
+    segments, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            segments.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        segments.append(current)
+    return segments
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], output_tokens: int = 0) -> int:
+    """粗略估算一次调用的 token 数：中文约每字 1 个，其他字符约每 4 个 1 个，加上预计的输出长度"""
+    total = 0
+    for message in messages:
+        content = message.get("content", "")
+        cjk = len(re.findall(r"[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]", content))
+        total += cjk + (len(content) - cjk) // 4
+    return total + output_tokens
+
+
+class TokenBudget:
+    """
+    在途 token 预算
+    In-flight token budget
+    每次调用前预留估算的 token 数，总量超过上限时等待其他调用结束；单次调用超过上限时按上限预留。
+    """
+    def __init__(self, max_tokens: int):
+        """
+        :param max_tokens: 同时在途的 token 总数上限，0 为不限制
+        """
+        self.max_tokens = max_tokens
+        self.in_flight = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, tokens: int):
+        """在 with 块内占用 tokens 个预算"""
+        if self.max_tokens <= 0:
+            yield
+            return
+        tokens = min(tokens, self.max_tokens)
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight + tokens <= self.max_tokens)
+            self.in_flight += tokens
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= tokens
+                self._condition.notify_all()
+
+
+def is_empty_value(value) -> bool:
+    """取值是否视为未提取到"""
+    return value is None or (isinstance(value, str) and value.strip() in EMPTY_VALUES)
+
+
+def resolve_value(candidates: List[Any]) -> Any:
+    """
+    合并同一占位符在各分段（按时间顺序）中的取值：
+    默认取最后一个有效值（最新的约定覆盖早先的）；若较早的某个值包含该值（更具体，如“北京市海淀区”
+    之于“北京”），则取更具体的值。全部为空时返回最后一个值。
+    """
+    values = [value for value in candidates if not is_empty_value(value)]
+    if not values:
+        return candidates[-1] if candidates else ""
+    winner = values[-1]
+    for value in reversed(values[:-1]):
+        if str(winner) in str(value) and len(str(value)) > len(str(winner)):
+            winner = value
+    return winner
+
+
+def merge_placeholders(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并各分段的占位符提取结果（results 按分段顺序排列）"""
+    keys = list(dict.fromkeys(key for result in results for key in result))
+    return {key: resolve_value([result[key] for result in results if key in result]) for key in keys}
+
+
+def merge_keywords(results: List[str]) -> str:
+    """合并各分段的关键词（已清理为空格分隔），按首次出现的顺序去重"""
+    words = [word for result in results for word in result.split() if word]
+    return " ".join(dict.fromkeys(words))
+
+
+def merge_analysis(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并各分段的需求分析：合同类别取出现次数最多的有效类别（相同时取较晚分段的），
+    具体类型同样在该类别的分段中取出现次数最多的，特别关注点去重合并。
+    """
+    def majority(values: List[str], empty) -> Optional[str]:
+        values = [value for value in values if value and value not in empty]
+        if not values:
+            return None
+        counts = Counter(values)
+        best = max(counts.values())
+        return [value for value in values if counts[value] == best][-1]
+
+    category = majority([result.get("contract_category") for result in results], (NO_CONTRACT,)) or NO_CONTRACT
+    matching = [result for result in results if result.get("contract_category") == category] or results
+    specific_type = majority([result.get("specific_type") for result in matching], ("N/A",)) or "N/A"
+    concerns = [concern for result in results for concern in result.get("special_concerns") or []]
+    return {
+        "contract_category": category,
+        "specific_type": specific_type,
+        "special_concerns": list(dict.fromkeys(concerns)),
+    }
@@ -0,0 +1,326 @@
+"""
+流式 OOXML 填充
+Streaming OOXML Fill
+不构建 python-docx 对象模型，直接从模板 zip 中流式读取 word/document.xml 及页眉页脚，边读边替换占位符文本并写入
+输出 zip；其余部件按原始压缩数据逐字节复制，不解压也不重新压缩（依赖 zipfile 的内部属性，
+当前 Python 版本不支持或文件头不符合预期时改为解压后重新写入）。XML 按标签切分逐段处理，只缓存当前段落，
+内存占用只与最长的段落有关，与文档大小无关。
+占位符定位和替换与 fill_engine 相同（跨 run 的占位符同样能填入），清理与 clean_paragraph 一致：
+删除全部段落中的空花括号，正文中未设置对齐方式的段落设为左对齐。
+"""
+import re
+import copy
+import codecs
+import struct
+import zipfile
+from html import unescape
+from typing import Callable, Dict, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from services.fill_engine import AFTER_JC, EMPTY_BRACES, EMPTY_TEXT, W_NS, locate, substitute
+
+# 需要填充的部件，其余部件原样复制
+FILL_PARTS = re.compile(r"word/(document|header\d*|footer\d*)\.xml$")
+CHUNK_SIZE = 64 * 1024
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")  # zip 本地文件头（与 zipfile.structFileHeader 一致）
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# 标签（属性值中可能含有 >）、注释、CDATA 和处理指令
+TOKEN = re.compile(r"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<(?:[^>\"']|\"[^\"]*\"|'[^']*')*>", re.S)
+TAG_NAME = re.compile(r"<(/?)([^\s/>]+)")
+NAMESPACE = re.compile(r"xmlns:([\w.-]+)=[\"']" + re.escape(W_NS) + r"[\"']")
+
+
+def iter_tokens(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """把 XML 字节流切分为标签和标签之间的文本，跨块的标签会等待下一块补全"""
+    decoder = codecs.getincrementaldecoder("utf-8")()  # 多字节字符可能跨块
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += decoder.decode(chunk, final=not chunk)
+        position = 0
+        while True:
+            start = buffer.find("<", position)
+            if start == -1:
+                if not chunk and position < len(buffer):
+                    yield buffer[position:]
+                    position = len(buffer)
+                break  # 文本可能在下一块继续，留到下一块一起输出
+            if start > position:
+                yield buffer[position:start]
+            match = TOKEN.match(buffer, start)
+            if not match:
+                position = start  # 标签不完整，等待下一块
+                break
+            yield match.group(0)
+            position = match.end()
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer:
+                raise ValueError("XML 在标签中间结束")
+            return
+
+
+class _Paragraph:
+    """缓存中的一个段落：标记列表和其中的文本部分"""
+    def __init__(self, start_tag: str, top_level: bool):
+        self.tokens = [start_tag]
+        self.top_level = top_level
+        self.texts: List[int] = []  # w:t 文本在 tokens 中的位置；制表符和换行为 -1
+        self.in_text = False
+
+
+class PartRewriter:
+    """
+    逐个标记改写一个 XML 部件：段落之外的标记直接输出，段落结束时替换其中的占位符后整体输出。
+    Token-level rewriter for one WordprocessingML part
+    """
+    def __init__(self, write: Callable[[str], None], replacement: Callable[[str], str], align: bool):
+        """
+        :param write: 输出文本的函数
+        :param replacement: 按占位符名称返回替换文本
+        :param align: 是否为正文中未设置对齐方式的段落设置左对齐（仅 word/document.xml）
+        """
+        self.write = write
+        self.replacement = replacement
+        self.align = align
+        self.prefix = "w:"
+        self.stack: List[str] = []  # 段落之外尚未结束的元素
+        self.paragraphs: List[_Paragraph] = []  # 正在缓存的段落，文本框中的段落嵌套在外层段落中
+
+    def feed(self, token: str):
+        if not token.startswith("<") or token.startswith(("<?", "<!")):
+            self._emit(token, text=not token.startswith("<"))
+            return
+        closing, name = TAG_NAME.match(token).groups()
+        empty = token.endswith("/>")
+        if not self.stack and not self.paragraphs:
+            declaration = NAMESPACE.search(token)
+            if declaration:
+                self.prefix = declaration.group(1) + ":"
+        local = name[len(self.prefix):] if name.startswith(self.prefix) else None
+
+        if local == "p" and not closing:
+            top_level = not self.paragraphs and self.stack[-1:] == [self.prefix + "body"]
+            if empty and not (self.align and top_level):
+                self._emit(token)
+                return
+            # 空段落 <w:p/> 同样需要设置对齐方式，展开为起止标签
+            self.paragraphs.append(_Paragraph(token[:-2] + ">" if empty else token, top_level))
+            if not empty:
+                return
+            closing, token = "/", f"</{name}>"
+        if local == "p" and closing:
+            paragraph = self.paragraphs.pop()
+            paragraph.tokens.append(token)
+            self._emit(self._render(paragraph))
+            return
+
+        if self.paragraphs:
+            paragraph = self.paragraphs[-1]
+            if local == "t":
+                paragraph.in_text = not closing and not empty
+                if empty:
+                    paragraph.tokens.append(token)
+                    paragraph.texts.append(len(paragraph.tokens))
+                    paragraph.tokens.append("")
+                    return
+            elif local in ("tab", "br", "cr"):
+                paragraph.texts.append(-1)
+            paragraph.tokens.append(token)
+            return
+
+        if not empty:
+            if closing:
+                self.stack.pop()
+            else:
+                self.stack.append(name)
+        self.write(token)
+
+    def _emit(self, token: str, text: bool = False):
+        """输出一个标记；在段落中时先缓存（w:t 中的文本记为文本部分）"""
+        if not self.paragraphs:
+            self.write(token)
+            return
+        paragraph = self.paragraphs[-1]
+        if text and paragraph.in_text:
+            paragraph.texts.append(len(paragraph.tokens))
+            paragraph.in_text = False  # 同一个 w:t 中只有一段文本
+        paragraph.tokens.append(token)
+
+    def _render(self, paragraph: _Paragraph) -> str:
+        """替换段落中的占位符，返回改写后的段落 XML"""
+        tokens = paragraph.tokens
+        positions = paragraph.texts
+        texts = [unescape(tokens[position]) if position >= 0 else "\n" for position in positions]
+        changed = substitute(lambda i: texts[i], locate(texts), self.replacement)
+        for i, text in enumerate(texts):
+            text = changed.get(i, text)
+            if positions[i] >= 0 and "{" in text:
+                cleaned = EMPTY_BRACES.sub("", text)
+                if cleaned != text:
+                    changed[i] = cleaned
+        for i, text in changed.items():
+            position = positions[i]
+            tokens[position] = self._text_xml(text)
+            start_tag = position - 1
+            if tokens[start_tag].endswith("/>"):  # <w:t/> 改写为带文本的元素
+                tokens[start_tag] = tokens[start_tag][:-2] + ">"
+                tokens[position] += f"</{self.prefix}t>"
+            if text != text.strip() and "xml:space" not in tokens[start_tag]:
+                tokens[start_tag] = tokens[start_tag][:-1] + ' xml:space="preserve">'
+        if self.align and paragraph.top_level:
+            self._align_left(tokens)
+        return "".join(tokens)
+
+    def _text_xml(self, text: str) -> str:
+        """w:t 中的文本；制表符和换行转换为 w:tab/w:br（与 python-docx 的 run.text 一致）"""
+        parts = re.split(r"([\t\n])", text)
+        xml = escape(parts[0])
+        for separator, part in zip(parts[1::2], parts[2::2]):
+            element = "tab" if separator == "\t" else "br"
+            xml += f'</{self.prefix}t><{self.prefix}{element}/><{self.prefix}t xml:space="preserve">{escape(part)}'
+        return xml
+
+    def _align_left(self, tokens: List[str]):
+        """段落未设置对齐方式时设为左对齐（与 fill_engine.align_left 一致）"""
+        jc = f'<{self.prefix}jc {self.prefix}val="left"/>'
+        if len(tokens) < 2 or not tokens[1].startswith(f"<{self.prefix}pPr"):
+            tokens.insert(1, f"<{self.prefix}pPr>{jc}</{self.prefix}pPr>")
+            return
+        if tokens[1].endswith("/>"):
+            tokens[1] = tokens[1][:-2] + f">{jc}</{self.prefix}pPr>"
+            return
+        depth, insert_at = 0, None
+        for i in range(1, len(tokens)):
+            token = tokens[i]
+            if not token.startswith("<"):
+                continue
+            closing, name = TAG_NAME.match(token).groups()
+            if depth == 1 and not closing and name == self.prefix + "jc":
+                return
+            if depth == 1 and insert_at is None and not closing and name[len(self.prefix):] in AFTER_JC:
+                insert_at = i
+            if depth == 1 and closing:  # pPr 结束
+                tokens.insert(i if insert_at is None else insert_at, jc)
+                return
+            if not token.endswith("/>"):
+                depth += -1 if closing else 1
+
+
+def _can_copy_raw(source: zipfile.ZipFile, target: zipfile.ZipFile) -> bool:
+    """原样复制用到的 zipfile 内部属性是否存在（这些属性不是公开接口，可能随 Python 版本变化）"""
+    return (hasattr(source, "fp")
+            and all(hasattr(target, name) for name in ("fp", "filelist", "NameToInfo", "start_dir"))
+            and hasattr(zipfile.ZipInfo, "FileHeader")
+            and getattr(target, "_seekable", True)
+            and hasattr(source.fp, "seek") and hasattr(target.fp, "tell"))
+
+
+def _copy_raw(source: zipfile.ZipFile, info: zipfile.ZipInfo, target: zipfile.ZipFile) -> bool:
+    """
+    把一个部件的压缩数据原样复制到输出 zip（不解压、不重新压缩）。
+    :return: 是否已复制；本地文件头不符合预期时不写入任何内容并返回 False，由调用方改为重新写入
+    """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size:
+        return False
+    fields = LOCAL_HEADER.unpack(header)
+    name_length, extra_length = fields[-2:]
+    if fields[0] != LOCAL_HEADER_SIGNATURE or name_length != len(info.orig_filename.encode(
+            "utf-8" if info.flag_bits & 0x800 else "cp437")):
+        return False
+    source.fp.seek(info.header_offset + LOCAL_HEADER.size + name_length + extra_length)
+
+    copied = copy.copy(info)
+    copied.flag_bits &= ~0x08  # 大小已写在文件头中，不再使用数据描述符
+    copied.extra = b""
+    copied.header_offset = target.fp.tell()
+    target.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(remaining, CHUNK_SIZE))
+        if not chunk:
+            raise ValueError(f"部件数据不完整: {info.filename}")
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+    # zipfile 没有写入已压缩数据的公开接口，这里按 ZipFile.write 的方式登记条目
+    target.filelist.append(copied)
+    target.NameToInfo[copied.filename] = copied
+    target.start_dir = target.fp.tell()
+    return True
+
+
+def stream_fill(template_path: str, output, values: Dict[str, str], empty_text: str = EMPTY_TEXT,
+                raw_copy: bool = True) -> Dict[str, int]:
+    """
+    把 values 填入模板并写出 docx。
+    :param template_path: 模板路径
+    :param output: 输出路径或可写、可定位的二进制文件对象
+    :param values: {占位符名称: 替换文本}，未提供的占位符替换为 empty_text
+    :param raw_copy: 其余部件是否原样复制压缩数据，False 或不支持时解压后重新写入
+    :return: 统计：填入和未提取到值的占位符数、改写、原样复制和重新写入的部件数
+    """
+    values = {key.strip(): value for key, value in values.items()}
+    stats = {"filled": 0, "leftover": 0, "rewritten_parts": 0, "copied_parts": 0, "recompressed_parts": 0}
+
+    def replacement(key: str) -> str:
+        if key in values:
+            stats["filled"] += 1
+            return values[key]
+        stats["leftover"] += 1
+        return empty_text
+
+    with zipfile.ZipFile(template_path) as source, zipfile.ZipFile(output, "w") as target:
+        raw_copy = raw_copy and _can_copy_raw(source, target)
+        for info in source.infolist():
+            if not FILL_PARTS.match(info.filename):
+                if raw_copy and _copy_raw(source, info, target):
+                    stats["copied_parts"] += 1
+                else:
+                    target.writestr(info, source.read(info))
+                    stats["recompressed_parts"] += 1
+                continue
+            rewritten = zipfile.ZipInfo(info.filename, info.date_time)
+            rewritten.compress_type = zipfile.ZIP_DEFLATED
+            rewritten.external_attr = info.external_attr
+            with source.open(info) as reader, target.open(rewritten, "w") as writer:
+                pending: List[str] = []
+                size = 0
+
+                def write(text: str):
+                    nonlocal size
+                    pending.append(text)
+                    size += len(text)
+                    if size >= CHUNK_SIZE:
+                        flush()
+
+                def flush():
+                    nonlocal size
+                    writer.write("".join(pending).encode("utf-8"))
+                    pending.clear()
+                    size = 0
+
+                rewriter = PartRewriter(write, replacement, align=info.filename == "word/document.xml")
+                for token in iter_tokens(reader):
+                    rewriter.feed(token)
+                flush()
+            stats["rewritten_parts"] += 1
+    return stats
+
+
+class StreamedDocument:
+    """
+    流式填充的结果：保存时才从模板流式生成 docx，接口与 Document.save 一致，可直接交给 save_contract
+    Deferred streaming fill with a Document-like save()
+    """
+    def __init__(self, template_path: str, values: Dict[str, str], empty_text: str = EMPTY_TEXT):
+        self.template_path = template_path
+        self.values = values
+        self.empty_text = empty_text
+        self.stats: Optional[Dict[str, int]] = None
+
+    def save(self, output):
+        """output 为路径或可写、可定位的二进制文件对象"""
+        self.stats = stream_fill(self.template_path, output, self.values, self.empty_text)
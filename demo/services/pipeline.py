@@ -0,0 +1,366 @@
+"""
+合同推荐与生成流程
+Recommendation and Generation Pipelines
+与界面无关的合同推荐、生成主流程，供 Qt 后台线程和命令行入口共用。
+"""
+import os
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+from services.contract import ContractService
+from services.timing import TimingTrace, current_trace, in_context, span
+from core.config import *
+
+logger = logging.getLogger(__name__)
+
+
+def _ignore(*args):
+    """默认的进度回调，不做任何处理"""
+    pass
+
+
+# 合同推荐主流程
+def run_recommendation(contract_service: ContractService, user_input, contract_type,
+                       progress: Optional[Callable[[str], None]] = None,
+                       update_progress: Optional[Callable[[int], None]] = None) -> Optional[dict]:
+    """
+    根据用户输入进行合同模板推荐。
+    Recommend contract templates for the user input.
+    :param contract_service: 合同服务实例
+    :param user_input: 用户输入文本（会议纪要）
+    :param contract_type: 合同类型
+    :param progress: 日志回调，参数为日志文本
+    :param update_progress: 进度回调，参数为 0-100 的进度值
+    :return: 推荐结果字典；输入为空或无相关合同时返回 None
+    """
+    progress = progress or _ignore
+    update_progress = update_progress or _ignore
+    # 启用追踪时各阶段记入调用方（后台线程、命令行）的追踪，否则只在本次结果中返回
+    trace = current_trace() or TimingTrace("合同推荐")
+
+    progress("开始处理合同推荐任务...")
+    update_progress(5)
+    
+    # 检查用户输入是否为空或过短
+    user_input_check = user_input.strip() if user_input else ""
+    input_length = len(user_input_check)
+
+    if not user_input_check:
+        print("用户输入为空，无法推荐合同")
+        return
+    # 对极短文本特殊处理
+    is_extremely_short = input_length < 10
+    if is_extremely_short:
+        print(f"用户输入极短({input_length}字符)，这可能导致不准确的推荐")
+
+    # # 限制过长的用户输入
+    # max_input_length = 5000  # 设置最大输入长度限制
+    # if input_length > max_input_length:
+    #     print(f"用户输入过长({input_length}字符)，截断至{max_input_length}字符")
+    #     user_input = user_input[:max_input_length]
+
+    # 确保模型、索引和合同空白模板已加载；若后台线程正在加载则等待其完成
+    if not contract_service.is_loaded():
+        progress("等待模型和索引加载完成...")
+    with trace.stage("ensure_loaded"):
+        contract_service.ensure_loaded()
+
+    def analyze():
+        with trace.stage("analyze_user_needs"):
+            return contract_service.analyze_user_needs(user_input)
+
+    def extract():
+        with trace.stage("extract_keywords"):
+            return contract_service.extract_keywords(user_input)
+
+    user_input_keywords = None
+    if is_extremely_short:
+        # 1. 对用户需求进行深度分析
+        # 极短输入先单独分析，分析显示无相关合同时可以省去关键词提取的调用
+        user_analysis = analyze()
+    else:
+        # 1-2. 需求分析和关键词提取互不依赖，两次大模型调用并发进行，检索前汇合
+        print(f"并发进行需求分析和关键词提取...")
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm") as executor:
+            analysis_future = executor.submit(analyze)
+            keywords_future = executor.submit(extract)
+            user_analysis = analysis_future.result()
+            user_input_keywords = keywords_future.result()
+
+    # 特殊判断：如果分析结果显示无相关合同且输入极短，直接返回空结果
+    no_relevant_contract = not user_analysis["contract_category"] or user_analysis["contract_category"] == "无相关合同"
+    if no_relevant_contract and is_extremely_short:
+        print(f"分析结果显示无相关合同且输入极短，返回空结果")
+        return
+    
+    update_progress(15)
+    
+    # 2. 提取用户输入的关键词
+    if user_input_keywords is None:
+        print(f"提取关键词...")
+        user_input_keywords = extract()
+    # 增强关键词，添加分析出的合同类型和关注点
+    query = contract_service.enhance_query(user_input_keywords, user_analysis)
+    print(f"增强后的查询关键词: {query}")
+
+    update_progress(35)
+
+    # 3. 加载合同类型分类映射
+    print(f"加载合同类型映射...")
+    with trace.stage("load_categories"):
+        categories_map = contract_service.load_contract_categories(TEMPLATE_DIR, contract_type)
+
+    # 4. 使用高级搜索算法进行检索
+    print(f"执行向量搜索...")
+    with trace.stage("vector_search"):
+        results = contract_service.advanced_search_in_knowledge_base(
+            query, 
+            contract_service.model, 
+            contract_service.knowledge_bases[contract_type],
+            contract_service.knowledge_bases[contract_type].templates, 
+            categories_map, 
+            user_input, 
+            top_k=5
+        )
+
+    # 构造返回结果
+    print(f"构造返回结果...")
+    update_progress(85)
+
+    # 按输入长度和需求分析结果换算匹配度，选取前5个匹配结果（或更少，如果结果不足5个）
+    filtered_recommendations = contract_service.score_recommendations(results, input_length, no_relevant_contract)
+    
+    # 记录结果数量
+    print(f"返回的匹配结果数量: {len(filtered_recommendations)}")
+    
+    # 更新任务状态为已完成
+    print(f"推荐任务完成，找到 {len(filtered_recommendations)} 个匹配")
+    print(trace.format())
+    
+    progress(f"找到 {len(filtered_recommendations)} 个推荐合同")
+    update_progress(100)
+    
+    # 返回最终结果
+    return {
+        "status": "completed",
+        "message": "推荐任务完成",
+        "data": {
+            "recommendations": filtered_recommendations,
+            "analysis": user_analysis,
+            "timings": trace.to_list()
+        }
+    }
+
+
+# 合同生成主流程
+def run_generation(contract_service: ContractService, user_input, contract_name, contract_type,
+                   progress: Optional[Callable[[str], None]] = None,
+                   update_progress: Optional[Callable[[int], None]] = None) -> Optional[dict]:
+    """
+    根据用户输入和模板生成定制化合同。
+    Generate a customized contract from the user input and a template.
+    :param contract_service: 合同服务实例
+    :param user_input: 用户输入文本（会议纪要）
+    :param contract_name: 合同模板名称
+    :param contract_type: 合同类型
+    :param progress: 日志回调，参数为日志文本
+    :param update_progress: 进度回调，参数为 0-100 的进度值
+    :return: 包含文件名和填充后 Document（GENERATION_BACKEND 为 stream 时为 StreamedDocument）的结果字典；模板或占位符缺失时返回 None
+    """
+    progress = progress or _ignore
+    update_progress = update_progress or _ignore
+
+    progress("开始处理合同生成任务...")
+    update_progress(5)
+
+    # 寻找合同模板目录
+    contracts_dir = os.path.join(TRAN_TEMPLATE_DIR, f"{contract_type}模版")
+    logger.debug("寻找合同模板目录: %s", contracts_dir)
+
+    try:
+        # 列出目录内容
+        if os.path.exists(contracts_dir):
+            dir_contents = os.listdir(contracts_dir)
+    except Exception as e:
+        print(f"列出目录内容时出错: {str(e)}")
+        return
+
+    # 检查合同名称是否有效
+    if not contract_name:
+        return
+    else:
+        contract_name = contract_name.removesuffix(".docx")
+
+    # 定义部委模板和地方模板的占位符文件路径
+    ph_path = os.path.join(TRAN_TEMPLATE_DIR, f"{contract_type}","占位符",f"{contract_name}.json")
+    docx_path = os.path.join(TRAN_TEMPLATE_DIR, f"{contract_type}",f"{contract_name}.docx")
+    logger.debug("占位符文件路径: %s，模板文件路径: %s", ph_path, docx_path)
+
+    if LLM_STREAM:
+        filled_docx = _stream_fill(contract_service, user_input, ph_path, docx_path, progress, update_progress)
+        if filled_docx is None:
+            return
+        return _generation_result(contract_name, filled_docx)
+
+    # 检查ph是否存在
+    if os.path.exists(ph_path):
+        print(f"占位符文件存在，准备提取占位符")
+        try:
+            ph_json = contract_service.extract_ph(user_input, ph_path)
+            print(f"占位符提取完成: {len(ph_json) if ph_json else 0} 个键值对")
+            
+            # 确保ph_json不为None
+            if ph_json is None:
+                ph_json = {}
+                print(f"警告: 提取到的占位符为空，使用空字典代替")
+                return
+            
+        except Exception as e:
+            print(f"提取占位符失败: {str(e)}")
+            return
+    else:
+        print(f"占位符文件不存在: {ph_path}")
+        return
+    
+    update_progress(80)
+
+    if GENERATION_BACKEND == "stream":
+        if not os.path.exists(docx_path):
+            print(f"合同模板文件不存在: {docx_path}")
+            return
+        progress("开始填充合同...")
+        filled_docx = contract_service.stream_template(docx_path, ph_json)
+        update_progress(95)
+        return _generation_result(contract_name, filled_docx)
+    
+    # 检查模板是否存在
+    if os.path.exists(docx_path):
+        try:
+            docx, plan = contract_service.load_template(docx_path)
+        except Exception as e:
+            print(f"加载合同模板失败: {str(e)}")
+            return
+    else:
+        print(f"合同模板文件不存在: {docx_path}")
+        return
+    
+    update_progress(85)
+    
+    progress("开始填充合同...")
+    # 填充模板
+    try:
+        filled_docx = contract_service.fill_template(docx, ph_json, plan)
+    except Exception as e:
+        print(f"填充模板失败: {str(e)}")
+        return
+    
+    update_progress(95)
+    return _generation_result(contract_name, filled_docx)
+
+
+def _generation_result(contract_name, filled_docx) -> dict:
+    """生成唯一文件名并构造合同生成的返回结果（尚未保存，由 save_generation_result 保存后报告完成）"""
+    # 生成唯一文件名 - 以生成的时间戳为前缀，保持原文件名
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    new_contract_name = f"generated_{timestamp}_{unique_id}_{contract_name}"
+    file_name = f"{new_contract_name}.docx"
+
+    # 创建保存目录
+    os.makedirs(GENERATED_DIR, exist_ok=True)
+
+    # 返回最终结果
+    return {
+        "status": "completed",
+        "message": "生成任务完成",
+        "data": {
+            "file_name": file_name,
+            "filled_docx": filled_docx
+        }
+    }
+
+
+def save_generation_result(contract_service: ContractService, result: dict, file_path: Optional[str] = None) -> dict:
+    """
+    保存 run_generation 生成的合同（先写临时文件再替换），结果中的文档替换为文件路径和字节数，
+    供后台线程保存后只把路径交给界面。
+    :param file_path: 保存路径，默认保存到 GENERATED_DIR 下
+    :return: 更新后的结果字典，data 中为 file_name、file_path 和 file_size
+    """
+    data = result["data"]
+    file_path = file_path or os.path.join(GENERATED_DIR, data["file_name"])
+    contract_service.save_contract(data.pop("filled_docx"), file_path)
+    data["file_path"] = file_path
+    data["file_size"] = os.path.getsize(file_path)
+    return result
+
+
+def _stream_fill(contract_service: ContractService, user_input, ph_path, docx_path, progress, update_progress):
+    """
+    流式提取占位符，同时在后台线程加载模板；模板就绪后每收到一个键值对就立即填入，
+    模型输出结束时文档也基本填充完毕。进度按已完成的占位符数量在 5%-80% 之间推进。
+    :return: 填充后的 Document（流式生成时为 StreamedDocument）；占位符文件或模板缺失、模板加载失败时返回 None
+    """
+    if not os.path.exists(ph_path):
+        print(f"占位符文件不存在: {ph_path}")
+        return
+    if not os.path.exists(docx_path):
+        print(f"合同模板文件不存在: {docx_path}")
+        return
+
+    if GENERATION_BACKEND == "stream":
+        # 流式改写模板不需要预先加载，提取完成后保存时一次生成
+        def on_progress(key, value, received, total):
+            update_progress(5 + 75 * min(received, total) // max(total, 1))
+
+        print(f"占位符文件存在，准备流式提取占位符")
+        progress("正在提取合同信息...")
+        ph_json = contract_service.extract_ph_stream(user_input, ph_path, on_progress)
+        print(f"占位符提取完成: {len(ph_json)} 个键值对")
+        update_progress(90)
+        progress("开始填充合同...")
+        return contract_service.stream_template(docx_path, ph_json)
+
+    pending = []  # 模板就绪前收到的键值对
+    filled = {}
+
+    def apply_pending(template):
+        docx, plan = template
+        while pending:
+            key, value = pending.pop(0)
+            filled[key] = contract_service.fill_placeholder(plan, key, value)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="template") as executor:
+        template_future = executor.submit(in_context(contract_service.load_template), docx_path)
+
+        def on_item(key, value, received, total):
+            # 回调由 extract_ph_stream 加锁串行执行，文档不会被并发修改
+            pending.append((key, value))
+            update_progress(5 + 75 * min(received, total) // max(total, 1))
+            if template_future.done() and template_future.exception() is None:
+                apply_pending(template_future.result())
+
+        print(f"占位符文件存在，准备流式提取占位符")
+        progress("正在提取合同信息...")
+        ph_json = contract_service.extract_ph_stream(user_input, ph_path, on_item)
+        print(f"占位符提取完成: {len(ph_json)} 个键值对")
+        update_progress(80)
+
+        try:
+            template = template_future.result()
+        except Exception as e:
+            print(f"加载合同模板失败: {str(e)}")
+            return
+
+    progress("开始填充合同...")
+    with span("fill_placeholders"):
+        apply_pending(template)
+    print(f"已填入 {sum(1 for count in filled.values() if count)} 个占位符")
+    update_progress(90)
+    try:
+        return contract_service.finish_fill(*template)
+    except Exception as e:
+        print(f"填充模板失败: {str(e)}")
+        return
@@ -0,0 +1,106 @@
+"""
+模板占位符位置表
+Template Placeholder Maps
+离线把每个模板中占位符的位置（所在 w:t 序号和字符偏移）编译成紧凑的 JSON 文件，存放在模板同级的
+“占位符位置”目录中。生成合同时直接按位置表定位占位符，无需逐段扫描模板文本。
+位置表记录模板文件的 SHA-256，模板被修改后哈希不一致，自动重新扫描并更新位置表。
+"""
+import os
+import json
+import hashlib
+from io import BytesIO
+from typing import Optional, Tuple
+
+from services.fill_engine import FillPlan, document_roots
+
+MAP_VERSION = 2  # 2: 位置表包含页眉和页脚
+MAP_DIRNAME = "占位符位置"
+
+
+def map_path(docx_path: str) -> str:
+    """模板对应的位置表路径：<模板目录>/占位符位置/<模板名>.json"""
+    directory, file_name = os.path.split(docx_path)
+    return os.path.join(directory, MAP_DIRNAME, os.path.splitext(file_name)[0] + ".json")
+
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_map(docx_path: str, digest: str) -> Optional[dict]:
+    """读取与模板哈希一致的位置表，不存在、版本或哈希不一致、文件损坏时返回 None"""
+    path = map_path(docx_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取占位符位置表失败: {str(e)}")
+        return None
+    if data.get("version") != MAP_VERSION or data.get("sha256") != digest:
+        return None
+    return data
+
+
+def write_map(docx_path: str, digest: str, plan: FillPlan) -> bool:
+    """把扫描得到的位置写入位置表（先写临时文件再替换），无法表示或写入失败时返回 False"""
+    data = plan.to_map()
+    if data is None:
+        return False
+    data.update({"version": MAP_VERSION, "sha256": digest})
+    path = map_path(docx_path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        return True
+    except OSError as e:
+        print(f"写入占位符位置表失败: {str(e)}")
+        return False
+
+
+def template_plan(docx_path: str, digest: str, docx, update: bool = True) -> FillPlan:
+    """
+    取得已加载模板的占位符位置：位置表与模板哈希一致时直接使用，否则扫描模板文本，
+    并在 update 为 True 时写入新的位置表。
+    """
+    roots = document_roots(docx)
+    placeholder_map = read_map(docx_path, digest)
+    plan = FillPlan.from_map(roots, placeholder_map) if placeholder_map else None
+    if plan is None:
+        plan = FillPlan(roots)
+        if update:
+            write_map(docx_path, digest, plan)
+    return plan
+
+
+def load_template(docx_path: str, update: bool = True) -> Tuple[object, FillPlan]:
+    """
+    加载模板和占位符位置（见 template_plan）。
+    :return: (Document, FillPlan)
+    """
+    from docx import Document
+
+    with open(docx_path, "rb") as f:
+        data = f.read()
+    digest = file_hash(data)
+    docx = Document(BytesIO(data))
+    return docx, template_plan(docx_path, digest, docx, update)
+
+
+def compile_template(docx_path: str, force: bool = False) -> bool:
+    """
+    编译一个模板的位置表，已有且哈希一致时跳过。
+    :return: 是否写入了新的位置表
+    """
+    with open(docx_path, "rb") as f:
+        data = f.read()
+    digest = file_hash(data)
+    if not force and read_map(docx_path, digest):
+        return False
+    from docx import Document
+
+    docx = Document(BytesIO(data))
+    return write_map(docx_path, digest, FillPlan(document_roots(docx)))
@@ -0,0 +1,160 @@
+"""
+占位符规则预提取
+Rule-based Placeholder Pre-extraction
+在调用大模型之前，用确定性的规则从会议纪要中提取日期、金额、电话、身份证号、统一社会信用代码、
+邮箱、地址和当事人名称等结构化字段。只填入高置信度的结果，其余占位符仍交给大模型。
+高置信度指：纪要中以“占位符名称：值”“占位符名称为值”的形式明确给出且格式校验通过，
+或（电话、证件号等格式唯一的字段）纪要中只出现一个该类型的值；出现多个不同取值时交给大模型判断。
+标签后给出多个值（如“联系电话分别为…和…”），或金额、日期带有周期、区间（如“每月5000元”“至”）时，
+规则无法确定合同中应填写的内容，同样交给大模型。
+当事人只采用“甲方：XX有限公司”形式给出的机构名称；“甲方为买方”“甲方是本公司”等描述和自然人姓名交给大模型。
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CJK = r"一-龥"
+
+# 各类型的取值格式
+PATTERNS = {
+    "phone": re.compile(r"(?<!\d)(?:1[3-9]\d{9}|0\d{2,3}-?\d{7,8})(?!\d)"),
+    "id_card": re.compile(r"(?<![0-9A-Za-z])\d{17}[\dXx](?![0-9A-Za-z])"),
+    "credit_code": re.compile(r"(?<![0-9A-Z])[0-9A-HJ-NPQRTUWXY]{2}\d{6}[0-9A-HJ-NPQRTUWXY]{10}(?![0-9A-Z])"),
+    "email": re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"),
+    "postcode": re.compile(r"(?<!\d)\d{6}(?!\d)"),
+    "date": re.compile(r"\d{4}\s*年\s*\d{1,2}\s*月\s*\d{1,2}\s*日|\d{4}[-/.]\d{1,2}[-/.]\d{1,2}"),
+    "amount": re.compile(r"(?:人民币)?\s*\d[\d,，]*(?:\.\d+)?\s*(?:万|亿)?\s*元(?:整)?"),
+    "amount_upper": re.compile(r"(?:人民币)?[零壹贰叁肆伍陆柒捌玖拾佰仟万亿]+元[零壹贰叁肆伍陆柒捌玖拾角分整]*"),
+    "organization": re.compile(rf"[{CJK}（）()]{{2,40}}?(?:有限责任公司|股份有限公司|有限公司|公司|集团|研究院|研究所|"
+                               rf"大学|学院|医院|中心|委员会|事务所|合作社)"),
+}
+# 以量词或指代词开头的机构名称是描述而不是名称（如“一家科技公司”“本公司”“该公司”）
+NOT_A_NAME = re.compile(r"^(?:一家|一个|一所|本|该|此|这|那|其|我|贵|某)")
+
+# 由占位符名称判断字段类型，按顺序匹配第一个命中的规则
+FIELD_RULES: List[Tuple[Tuple[str, ...], str]] = [
+    (("统一社会信用代码", "信用代码"), "credit_code"),
+    (("身份证", "证件号码"), "id_card"),
+    (("邮箱", "电子邮件"), "email"),
+    (("邮政编码", "邮编"), "postcode"),
+    (("电话", "手机", "联系方式", "传真"), "phone"),
+    (("大写",), "amount_upper"),
+    (("比例", "百分比", "天数", "份数", "期限"), ""),  # 名称含金额/日期字样但不是金额/日期
+    (("金额", "价款", "总价", "租金", "定金", "保证金"), "amount"),
+    (("日期", "签订时间"), "date"),
+    (("地址", "住所", "地点"), "address"),
+    (("甲方", "乙方", "丙方", "出卖人", "买受人", "出租人", "承租人", "委托人", "受托人", "发包人", "承包人",
+      "借款人", "贷款人", "保管人", "寄存人"), "party"),
+]
+
+# 只在纪要中出现唯一取值时即可直接采用的类型（格式本身足以确定字段含义）
+UNIQUE_TYPES = ("phone", "id_card", "credit_code", "email")
+
+ADDRESS_CHARS = re.compile(r"[省市区县镇乡村路街道巷号楼室]")
+# 周期和区间限定：值本身不足以表达约定（如“每月5000元”不能只填“5000元”）
+QUALIFIERS = re.compile(r"每\s*(?:日|天|周|月|季度?|年)|[/／]\s*(?:日|天|周|月|季度?|年)|至|[~～]")
+
+
+def field_type(name: str) -> str:
+    """由占位符名称推断字段类型，无法判断时返回空字符串"""
+    for keywords, kind in FIELD_RULES:
+        if any(keyword in name for keyword in keywords):
+            return kind
+    return ""
+
+
+def _valid_id_card(value: str) -> bool:
+    """校验18位身份证号的校验码"""
+    weights = [7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2]
+    total = sum(int(digit) * weight for digit, weight in zip(value[:17], weights))
+    return "10X98765432"[total % 11] == value[17].upper()
+
+
+def match_values(kind: str, value: str) -> Optional[set]:
+    """
+    从标签后面的文本中取出全部符合类型格式的值。
+    :return: 取值集合（可能为空）；文本带有周期或区间限定、无法按原样填入时返回 None
+    """
+    value = value.strip()
+    if kind == "address":
+        return {value} if 4 <= len(value) <= 60 and ADDRESS_CHARS.search(value) else set()
+    if kind == "party":
+        organization = PATTERNS["organization"].search(value)
+        if organization and not NOT_A_NAME.match(organization.group(0)):
+            return {organization.group(0)}
+        return set()
+    if QUALIFIERS.search(value):
+        return None
+    return {found.group(0).strip() for found in PATTERNS[kind].finditer(value)
+            if kind != "id_card" or _valid_id_card(found.group(0))}
+
+
+class RuleExtractor:
+    """
+    占位符规则预提取器，可在多个线程间共享
+    Deterministic pre-extractor for structured placeholders
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"placeholders": 0, "prefilled": 0, "calls": 0, "calls_avoided": 0}
+
+    def extract(self, text: str, placeholders: List[str]) -> Dict[str, str]:
+        """
+        对每个能判断类型的占位符尝试规则提取，只返回高置信度的结果。
+        :return: {占位符: 值}
+        """
+        kinds = {name: field_type(name) for name in placeholders}
+        found = {}
+        for name, kind in kinds.items():
+            if not kind:
+                continue
+            values = self._labeled_values(text, name, kind)
+            if values is None:
+                continue
+            # 按“纪要中唯一取值”填入只适用于模板中该类型仅有一个占位符的情况，
+            # 否则（如“甲方联系电话”“乙方联系电话”）无法确定值属于哪一方
+            if not values and kind in UNIQUE_TYPES and list(kinds.values()).count(kind) == 1:
+                values = {match.group(0) for match in PATTERNS[kind].finditer(text)
+                          if kind != "id_card" or _valid_id_card(match.group(0))}
+            if len(values) == 1:
+                found[name] = values.pop()
+        return found
+
+    @staticmethod
+    def _labeled_values(text: str, name: str, kind: str) -> Optional[set]:
+        """
+        查找“名称：值”“名称为值”形式给出的值；带编号的占位符（如“日期2”）无法对应到纪要中的标签。
+        :return: 取值集合；某处标签后有多个不同取值或带有周期、区间限定时返回 None，该占位符交给大模型
+        """
+        if re.search(r"\d$", name):
+            return set()
+        labels = [name]
+        if kind == "party" and name.endswith("名称"):
+            labels.append(name[:-2])
+        # 格式严格的类型允许标签后直接跟值（如“统一社会信用代码91110108…”）或用“为/是”连接；
+        # 地址和名称必须用冒号给出，“甲方为买方”之类的叙述不是名称
+        separator = r"[：:]" if kind in ("address", "party") else r"(?:[：:]|为|是)?"
+        values = set()
+        for label in labels:
+            pattern = rf"{re.escape(label)}\s*{separator}\s*([^，,。；;\n]{{1,80}})"
+            for match in re.finditer(pattern, text):
+                found = match_values(kind, match.group(1))
+                if found is None or len(found) > 1:
+                    return None
+                values |= found
+        return values
+
+    def record(self, placeholders: int, prefilled: int, calls: int, calls_avoided: int):
+        """记录一次提取中预提取的占位符数和减少的模型调用数"""
+        with self._lock:
+            self._stats["placeholders"] += placeholders
+            self._stats["prefilled"] += prefilled
+            self._stats["calls"] += calls
+            self._stats["calls_avoided"] += calls_avoided
+
+    def stats(self) -> Dict[str, float]:
+        """返回累计的占位符数、预提取数、模型调用数、减少的调用数及预提取比例"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["prefill_rate"] = stats["prefilled"] / stats["placeholders"] if stats["placeholders"] else 0.0
+        return stats
@@ -0,0 +1,161 @@
+"""
+流程耗时追踪
+Timing Trace
+记录流程中各阶段的开始和结束时间（相对流程开始），用于查看并发阶段的重叠情况。
+阶段进行期间该追踪成为当前线程的当前追踪，其中调用的服务方法用 span/traced 记录子阶段；
+没有当前追踪时 span/traced 不做任何记录，开销只有一次 ContextVar 读取。
+"""
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# 当前追踪及所在阶段：(TimingTrace, 阶段名称)
+_current: contextvars.ContextVar = contextvars.ContextVar("timing_trace", default=None)
+_NULL_SPAN = nullcontext()
+
+
+class TimingTrace:
+    """
+    阶段耗时追踪，可在多个线程中同时记录
+    Thread-safe recorder of stage start/end offsets
+    """
+    def __init__(self, name: str = ""):
+        """
+        :param name: 流程名称，输出时作为标题
+        """
+        self.name = name
+        self.origin = time.perf_counter()
+        self.started_at = time.time()  # 流程开始的时间戳
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def bind(self):
+        """with 块内本追踪为当前追踪，其中的 span/traced 记为顶层阶段"""
+        token = _current.set((self, None))
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录 with 块的耗时，块内本追踪为当前追踪，其中的 span 记为该阶段的子阶段"""
+        previous = _current.get()
+        parent = previous[1] if previous and previous[0] is self else None
+        token = _current.set((self, name))
+        start = time.perf_counter() - self.origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self.origin
+            _current.reset(token)
+            with self._lock:
+                self.records.append({
+                    "stage": name,
+                    "start": start,
+                    "end": end,
+                    "thread": threading.current_thread().name,
+                    "parent": parent,
+                })
+
+    def elapsed(self) -> float:
+        """流程开始至今的时间（秒）"""
+        return time.perf_counter() - self.origin
+
+    def to_list(self, digits: Optional[int] = 3) -> List[Dict]:
+        """按开始时间排序的阶段记录，时间保留 digits 位小数（None 为不取整）"""
+        with self._lock:
+            records = sorted(self.records, key=lambda r: r["start"])
+        if digits is None:
+            return [dict(r) for r in records]
+        return [dict(r, start=round(r["start"], digits), end=round(r["end"], digits)) for r in records]
+
+    def format(self, width: int = 40) -> str:
+        """
+        以文本时间线输出各阶段，重叠的阶段在同一时间段都有刻度，子阶段缩进显示，例如：
+            analyze_user_needs   0.000-1.203s  |##########          |
+              llm.analysis       0.002-1.201s  |##########          |
+            extract_keywords     0.001-0.987s  |########            |
+        耗时之和与并发重叠只统计顶层阶段。
+        """
+        records = self.to_list()
+        total = max([self.elapsed()] + [r["end"] for r in records])
+        scale = width / total if total > 0 else 0
+        depths = {}
+        for r in records:
+            depths[r["stage"]] = depths.get(r["parent"], -1) + 1 if r["parent"] else 0
+        labels = ["  " * depths[r["stage"]] + r["stage"] for r in records]
+        name_width = max([len(label) for label in labels] + [5])
+        lines = [f"耗时追踪{f' - {self.name}' if self.name else ''}:"]
+        for r, label in zip(records, labels):
+            begin = int(r["start"] * scale)
+            length = max(1, int(r["end"] * scale) - begin)
+            bar = (" " * begin + "#" * length).ljust(width)[:width]
+            lines.append(f"  {label:<{name_width}}  {r['start']:.3f}-{r['end']:.3f}s  |{bar}|")
+        top_level = [r for r in records if not r["parent"]]
+        busy = sum(r["end"] - r["start"] for r in top_level)
+        lines.append(f"  总耗时 {total:.3f}s，各阶段耗时之和 {busy:.3f}s，并发重叠 {busy - self._covered(top_level):.3f}s")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _covered(records) -> float:
+        """各阶段时间区间的并集长度"""
+        covered, current_start, current_end = 0.0, None, None
+        for r in records:
+            if current_end is None or r["start"] > current_end:
+                if current_end is not None:
+                    covered += current_end - current_start
+                current_start, current_end = r["start"], r["end"]
+            else:
+                current_end = max(current_end, r["end"])
+        if current_end is not None:
+            covered += current_end - current_start
+        return covered
+
+
+def current_trace() -> Optional[TimingTrace]:
+    """当前线程（上下文）中正在记录的追踪，没有时返回 None"""
+    current = _current.get()
+    return current[0] if current else None
+
+
+def span(name: str):
+    """
+    在当前追踪中把 with 块记为一个阶段；没有当前追踪时返回空的上下文管理器。
+    用法：with span("index_search"): ...
+    """
+    current = _current.get()
+    if current is None:
+        return _NULL_SPAN
+    return current[0].stage(name)
+
+
+def traced(name: str):
+    """装饰器：在当前追踪中把函数调用记为名为 name 的阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = _current.get()
+            if current is None:
+                return func(*args, **kwargs)
+            with current[0].stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_context(func):
+    """
+    包装提交到线程池的函数，使其在提交时的追踪上下文中运行（线程池不会自动传递 ContextVar）。
+    每次调用使用上下文的副本，可被多个线程同时调用。
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
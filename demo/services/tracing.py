@@ -0,0 +1,230 @@
+"""
+分阶段耗时统计与导出
+Pipeline Tracing
+启用后，每次合同推荐/生成作为一条追踪记录各阶段（大模型调用、向量编码、索引检索、模板解析、填充、保存等）的耗时，
+结束时追加一行 JSON 到追踪文件，并按流程和阶段累计耗时直方图，以 Prometheus 文本格式写入文件或通过 HTTP 提供。
+未启用时 trace 不创建追踪，服务中的 span/traced 不做任何记录。
+"""
+import os
+import json
+import uuid
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.timing import TimingTrace, current_trace
+
+# 默认的耗时分桶（秒），覆盖毫秒级的检索到分钟级的大模型调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_METRIC = "contract_stage_duration_seconds"
+PIPELINE_METRIC = "contract_pipeline_duration_seconds"
+
+
+class LatencyHistogram:
+    """
+    累计耗时直方图（Prometheus histogram 语义：各桶为小于等于上界的累计次数）
+    Cumulative latency histogram
+    """
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)  # 落在各桶（不累计）的次数，超过最大上界的只计入 count
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """[(上界, 累计次数), ...]，最后一项为 +Inf"""
+        rows, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            rows.append((format_bound(bound), total))
+        rows.append(("+Inf", self.count))
+        return rows
+
+
+def format_bound(bound: float) -> str:
+    return str(int(bound)) if float(bound).is_integer() else repr(float(bound))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class TraceRecorder:
+    """
+    汇总已完成的追踪：累计直方图，追加 JSON 行，更新 Prometheus 文本文件
+    Aggregates finished traces and exports them as JSON lines and Prometheus text
+    """
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        :param jsonl_path: 追踪记录文件，每条追踪一行 JSON，None 为不写入
+        :param prometheus_path: Prometheus 文本格式的指标文件（可供 node_exporter textfile 收集），None 为不写入
+        :param buckets: 直方图分桶上界（秒）
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.buckets = buckets
+        self.stages: Dict[Tuple[str, str], LatencyHistogram] = {}  # (流程, 阶段) -> 直方图
+        self.pipelines: Dict[Tuple[str, str], LatencyHistogram] = {}  # (流程, 状态) -> 直方图
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def record(self, trace: TimingTrace, status: str = "ok") -> Dict:
+        """
+        记录一条已完成的追踪。
+        :param status: ok 或 error（流程抛出异常）
+        :return: 写入追踪文件的记录
+        """
+        duration = trace.elapsed()
+        spans = trace.to_list(digits=None)
+        with self._lock:
+            self._histogram(self.pipelines, (trace.name, status)).observe(duration)
+            for record in spans:
+                self._histogram(self.stages, (trace.name, record["stage"])).observe(record["end"] - record["start"])
+        entry = {
+            "trace_id": uuid.uuid4().hex,
+            "pipeline": trace.name,
+            "status": status,
+            "started_at": round(trace.started_at, 3),
+            "duration": round(duration, 6),
+            "spans": [dict(record, start=round(record["start"], 6), end=round(record["end"], 6),
+                           duration=round(record["end"] - record["start"], 6)) for record in spans],
+        }
+        try:
+            self._export(entry)
+        except OSError as e:
+            print(f"写入追踪记录失败: {str(e)}")
+        return entry
+
+    def _histogram(self, histograms: Dict, key: Tuple[str, str]) -> LatencyHistogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram(self.buckets)
+        return histogram
+
+    def _export(self, entry: Dict):
+        with self._write_lock:
+            if self.jsonl_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.jsonl_path)), exist_ok=True)
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.prometheus_path:
+                self.write_prometheus(self.prometheus_path)
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式（0.0.4）的全部直方图"""
+        families = [
+            (STAGE_METRIC, "各阶段耗时（秒）", ("pipeline", "stage"), self.stages),
+            (PIPELINE_METRIC, "整个流程的耗时（秒）", ("pipeline", "status"), self.pipelines),
+        ]
+        lines = []
+        with self._lock:
+            for metric, help_text, label_names, histograms in families:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key in sorted(histograms):
+                    histogram = histograms[key]
+                    labels = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(label_names, key))
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """写入指标文件（先写临时文件再替换，收集方不会读到写了一半的文件）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".prom.tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# 全局的追踪汇总，None 表示未启用
+_recorder: Optional[TraceRecorder] = None
+
+
+def enable_tracing(jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                   port: int = 0, buckets: Sequence[float] = DEFAULT_BUCKETS) -> TraceRecorder:
+    """
+    启用追踪。
+    :param port: 大于 0 时在该端口启动 HTTP 服务，通过 /metrics 提供 Prometheus 指标
+    """
+    global _recorder
+    _recorder = TraceRecorder(jsonl_path, prometheus_path, buckets)
+    if port:
+        serve_metrics(_recorder, port)
+    return _recorder
+
+
+def disable_tracing():
+    global _recorder
+    _recorder = None
+
+
+def get_recorder() -> Optional[TraceRecorder]:
+    return _recorder
+
+
+@contextmanager
+def trace(name: str):
+    """
+    把 with 块作为名为 name 的流程记录一条追踪，块内调用的 span/traced 记入该追踪。
+    未启用追踪，或已在其他追踪中（嵌套调用）时不新建追踪。
+    :return: 当前追踪（未启用时为 None）
+    """
+    recorder = _recorder
+    if recorder is None or current_trace() is not None:
+        yield current_trace()
+        return
+    timing = TimingTrace(name)
+    status = "ok"
+    try:
+        with timing.bind():
+            yield timing
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        recorder.record(timing, status)
+
+
+def serve_metrics(recorder: TraceRecorder, port: int, host: str = "127.0.0.1"):
+    """在后台线程中启动 HTTP 服务，GET /metrics 返回 Prometheus 文本格式的指标"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # 不在标准错误输出访问日志
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"追踪指标服务已启动: http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,95 @@
+# 近似索引基准：在合成的大规模模板向量上比较 flat / HNSW / IVF 的召回率和查询延迟
+# 用法（在项目根目录下）：python script/bench_ann.py [--size 50000] [--queries 500] [--k 10]
+# 召回率 recall@k 以精确的 flat 索引结果为基准；延迟为单条查询（与推荐流程一致）的 p50/p99。
+import os, sys, time, argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from services.knowledge_base import apply_search_params, create_index
+
+
+def synthetic_corpus(size, dimension, clusters, seed):
+    """
+    生成带聚类结构的归一化向量，模拟同类合同模板关键词向量彼此接近的分布。
+    返回 (语料向量, 查询向量生成器使用的随机数发生器)。
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, dimension).astype("float32")
+    labels = rng.randint(0, clusters, size)
+    vectors = centers[labels] + 0.6 * rng.randn(size, dimension).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, rng
+
+
+def make_queries(vectors, count, noise, rng):
+    """从语料中取样并加噪声作为查询，模拟与某些模板相近但不完全相同的会议纪要关键词"""
+    picks = vectors[rng.randint(0, len(vectors), count)]
+    queries = picks + noise * rng.randn(*picks.shape).astype("float32") / np.sqrt(picks.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype("float32")
+
+
+def measure(index, queries, k):
+    """逐条查询，返回 (结果ID矩阵, p50毫秒, p99毫秒)"""
+    results = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        _, indices = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results[row] = indices[0]
+    latencies = np.array(latencies) * 1000
+    return results, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def recall_at_k(results, truth):
+    """recall@k：近似结果与精确结果前 k 个的交集比例"""
+    hits = sum(len(set(row[row >= 0]) & set(expected)) for row, expected in zip(results, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似索引召回率与延迟基准")
+    parser.add_argument("--size", type=int, default=50000, help="合成模板数量")
+    parser.add_argument("--dimension", type=int, default=384, help="向量维度（all-MiniLM-L6-v2 为 384）")
+    parser.add_argument("--clusters", type=int, default=200, help="合成语料的聚类数（合同类别数）")
+    parser.add_argument("--queries", type=int, default=500, help="查询数量")
+    parser.add_argument("--noise", type=float, default=1.0, help="查询相对语料向量的噪声幅度（向量已归一化）")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS 线程数，默认单线程以获得稳定延迟")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    vectors, rng = synthetic_corpus(args.size, args.dimension, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    ids = np.arange(args.size, dtype="int64")
+    print(f"语料: {args.size} x {args.dimension}，查询: {args.queries}，k={args.k}，线程: {args.threads}")
+
+    # 每组为 (索引类型, 构建参数, 依次测试的检索参数)
+    configs = [
+        ("flat", {}, [{}]),
+        ("hnsw", {"M": 32, "efConstruction": 80}, [{"efSearch": ef} for ef in (16, 32, 64, 128, 256)]),
+        ("ivf", {"nlist": 0}, [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)]),
+    ]
+
+    truth = None
+    print(f"{'索引':<8}{'检索参数':<16}{'构建(s)':>10}{'recall@k':>10}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for index_type, build_params, search_params_list in configs:
+        start = time.perf_counter()
+        index, _ = create_index(index_type, vectors, ids, build_params)
+        build_time = time.perf_counter() - start
+        for search_params in search_params_list:
+            apply_search_params(index, search_params)
+            results, p50, p99 = measure(index, queries, args.k)
+            if truth is None:
+                truth = results
+            label = ", ".join(f"{key}={value}" for key, value in search_params.items()) or "-"
+            if index_type == "ivf":
+                label += f" /{faiss.extract_index_ivf(index).nlist}"
+            print(f"{index_type:<8}{label:<16}{build_time:>10.2f}{recall_at_k(results, truth):>10.3f}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
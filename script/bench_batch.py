@@ -0,0 +1,74 @@
+# 批量推荐吞吐基准：比较逐条调用单条推荐检索路径与 recommend_batch 的每秒请求数
+# 用法（在项目根目录下）：python script/bench_batch.py [--type Regional] [--requests 1000] [--batch-size 256]
+# 两条路径都不调用大模型，只比较清理、编码、检索、按合同类型重排序和匹配度换算；
+# 每次测量前清空查询向量缓存，保证两条路径都真正执行编码。
+import os, sys, time, random, argparse
+from contextlib import redirect_stdout
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+
+
+def synthetic_minutes(contract_service, contract_type, count, seed):
+    """用模板关键词拼接出 count 份互不相同的会议纪要，模拟历史纪要的用词"""
+    documents = contract_service.load_txt_files(contract_service.get_keywords_folder(contract_type))
+    words = [word for _, content in documents for word in content.replace(";", ",").split(",") if word.strip()]
+    rng = random.Random(seed)
+    return [f"双方就{'、'.join(rng.sample(words, 8))}等事项达成一致，第{i}次会议纪要。" for i in range(count)]
+
+
+def single_path(contract_service, contract_type, user_input, categories_map):
+    """单条推荐路径（与 run_recommendation 相同，但跳过大模型调用）"""
+    knowledge_base = contract_service.knowledge_bases[contract_type]
+    user_input = user_input.strip()
+    results = contract_service.advanced_search_in_knowledge_base(
+        contract_service.clean_text_for_legal(user_input),
+        contract_service.model,
+        knowledge_base,
+        knowledge_base.templates,
+        categories_map,
+        user_input,
+        top_k=5
+    )
+    return contract_service.score_recommendations(results, len(user_input))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量推荐吞吐基准")
+    parser.add_argument("--type", default="Regional", help="合同类型")
+    parser.add_argument("--requests", type=int, default=1000, help="请求数量")
+    parser.add_argument("--batch-size", type=int, default=256, help="recommend_batch 每批的输入数量")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, DEMO_DIR)
+    os.chdir(DEMO_DIR)
+    from core.config import TEMPLATE_DIR
+    from services.contract import ContractService
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        contract_service = ContractService()
+        minutes = synthetic_minutes(contract_service, args.type, args.requests, args.seed)
+        categories_map = contract_service.load_contract_categories(TEMPLATE_DIR, args.type)
+
+        contract_service.query_embedding_cache.clear()
+        start = time.perf_counter()
+        single = [single_path(contract_service, args.type, text, categories_map) for text in minutes]
+        single_time = time.perf_counter() - start
+
+        contract_service.query_embedding_cache.clear()
+        start = time.perf_counter()
+        batch = []
+        for offset in range(0, len(minutes), args.batch_size):
+            batch.extend(contract_service.recommend_batch(minutes[offset:offset + args.batch_size], args.type))
+        batch_time = time.perf_counter() - start
+
+    same = sum(result["recommendations"] == expected for result, expected in zip(batch, single))
+    print(f"合同类型: {args.type}，请求数: {args.requests}，批大小: {args.batch_size}")
+    print(f"{'路径':<10}{'耗时(s)':>10}{'请求/秒':>12}")
+    print(f"{'逐条':<10}{single_time:>10.2f}{args.requests / single_time:>12.1f}")
+    print(f"{'批量':<10}{batch_time:>10.2f}{args.requests / batch_time:>12.1f}")
+    print(f"加速比: {single_time / batch_time:.1f}x，结果一致: {same}/{args.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# 模板填充基准：在合成的大模板上比较原先逐段落×逐占位符×逐 run 的 str.replace 填充与单遍填充（FillPlan）的耗时，
+# 并统计跨 run 占位符的填入情况。两种方式都包含清理（删除空花括号、设置左对齐），按阶段输出耗时和遍历文档的次数：
+# 原先的方式段落填入、表格填入、段落清理残留、表格清理残留、clean_contract 共遍历 5 次，单遍填充使用位置表时只在收尾时遍历 1 次。
+# 另外比较扫描文本定位占位符与读取预编译的位置表（services/placeholder_map.py）的耗时。
+# 用法（在项目根目录下）：
+#   python script/bench_fill.py [--pages 500] [--placeholders 1000] [--split-rate 0.3]
+import os, sys, re, json, time, random, argparse, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from services.fill_engine import FillPlan, document_roots, iter_paragraphs, segment_texts
+
+PARAGRAPHS_PER_PAGE = 20
+TABLE_ROWS, TABLE_COLS = 4, 3
+
+
+def build_template(path, pages, placeholders, split_rate, seed):
+    """生成每页约 20 个段落和一个表格的模板；split_rate 比例的占位符被拆分到 2-3 个格式不同的 run 中"""
+    from docx import Document
+
+    rng = random.Random(seed)
+    names = [f"字段{i}" for i in range(placeholders)]
+    docx = Document()
+
+    def add_runs(paragraph):
+        paragraph.add_run("本合同双方经协商一致，")
+        for _ in range(rng.randint(0, 2)):
+            ph = f"{{{rng.choice(names)}}}"
+            if rng.random() < split_rate:
+                cuts = sorted(rng.sample(range(1, len(ph)), rng.randint(1, 2)))
+                for start, end in zip([0] + cuts, cuts + [len(ph)]):
+                    paragraph.add_run(ph[start:end]).bold = rng.random() < 0.5
+            else:
+                paragraph.add_run(ph)
+            paragraph.add_run("，按约定履行。")
+
+    for page in range(pages):
+        for _ in range(PARAGRAPHS_PER_PAGE):
+            add_runs(docx.add_paragraph())
+        table = docx.add_table(rows=TABLE_ROWS, cols=TABLE_COLS)
+        for row in table.rows:
+            for cell in row.cells:
+                add_runs(cell.paragraphs[0])
+        docx.add_page_break()
+    docx.save(path)
+    return names
+
+
+def legacy_fill(docx, values, placeholder_map=None):
+    """
+    原先的填充方式：段落、表格单元格分别遍历，每个 run 对每个占位符调用 str.replace，再两遍清理剩余占位符，
+    最后按 run 清理空花括号并设置对齐方式。
+    :return: ([(阶段, 耗时)], 遍历文档的次数)，每个阶段遍历一次文档
+    """
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    placeholders = {f"{{{key}}}": value for key, value in values.items()}
+
+    def fill_paragraph(paragraph):
+        runs_text = [run.text for run in paragraph.runs]
+        if not any(ph in text for ph in placeholders for text in runs_text):
+            return
+        for run in paragraph.runs:
+            text = run.text
+            for ph, value in placeholders.items():
+                if ph in text:
+                    text = text.replace(ph, value)
+            if text != run.text:
+                run.text = text
+
+    def clear_paragraph(paragraph):
+        for run in paragraph.runs:
+            if '{' in run.text and '}' in run.text:
+                for match in re.findall(r'\{[^{}]+\}', run.text):
+                    run.text = run.text.replace(match, "    ")
+
+    def clean_paragraph(paragraph):
+        for run in paragraph.runs:
+            run.text = re.sub(r'\{\s*\}', '', run.text)
+        if paragraph.alignment is None:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    def body(step):
+        for paragraph in docx.paragraphs:
+            step(paragraph)
+
+    def tables(step):
+        for table in docx.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    for paragraph in cell.paragraphs:
+                        step(paragraph)
+
+    stages = []
+    for label, walk, step in (("段落填入", body, fill_paragraph), ("表格填入", tables, fill_paragraph),
+                              ("段落清理残留", body, clear_paragraph), ("表格清理残留", tables, clear_paragraph),
+                              ("clean_contract", body, clean_paragraph)):
+        start = time.perf_counter()
+        walk(step)
+        stages.append((label, time.perf_counter() - start))
+    return stages, len(stages)
+
+
+def single_pass_fill(docx, values, placeholder_map):
+    """
+    单遍填充：按位置表定位，逐个填入值，收尾时一次遍历改写其余段落并清理。
+    :return: ([(阶段, 耗时)], 遍历文档的次数)
+    """
+    plan = FillPlan.from_map(document_roots(docx), placeholder_map)
+    for key, value in values.items():
+        plan.fill(key, value)
+    plan.finish()
+    stages = [("读取位置表", plan.timings["locate"]), ("填入", plan.timings["fill"]), ("收尾遍历", plan.timings["finish"])]
+    return stages, plan.stats["passes"]
+
+
+def count_result(docx):
+    """统计填入的值和残留的占位符碎片（跨 run 未能替换的部分）"""
+    text = "\n".join("".join(segment_texts(segments)) for _, segments in iter_paragraphs(docx.element.body))
+    return text.count("【值"), len(re.findall(r"[{}]", text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模板填充基准（合成模板）")
+    parser.add_argument("--pages", type=int, default=500, help="模板页数")
+    parser.add_argument("--placeholders", type=int, default=1000, help="不同占位符的数量")
+    parser.add_argument("--split-rate", type=float, default=0.3, help="被拆分到多个 run 中的占位符比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from docx import Document
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_template.docx")
+    start = time.perf_counter()
+    names = build_template(path, args.pages, args.placeholders, args.split_rate, args.seed)
+    values = {name: f"【值{i}】" for i, name in enumerate(names)}
+    print(f"合成模板: {args.pages} 页，{args.placeholders} 个占位符，跨 run 比例 {args.split_rate:.0%}，"
+          f"生成耗时 {time.perf_counter() - start:.1f}s")
+
+    docx = Document(path)
+    start = time.perf_counter()
+    plan = FillPlan(document_roots(docx))
+    scan_time = time.perf_counter() - start
+    placeholder_map = plan.to_map()
+    start = time.perf_counter()
+    FillPlan.from_map(document_roots(docx), placeholder_map)
+    map_time = time.perf_counter() - start
+    print(f"段落: {plan.stats['paragraphs']}，占位符出现次数: {plan.stats['placeholders']}，其中跨 run: {plan.stats['split']}")
+    print(f"定位占位符: 扫描文本 {scan_time:.3f}s，读取位置表 {map_time:.3f}s"
+          f"（位置表 {len(json.dumps(placeholder_map, separators=(',', ':'))) / 1024:.0f}KB）")
+
+    print(f"{'方式':<12}{'耗时(s)':>10}{'遍历次数':>10}{'填入值':>10}{'残留花括号':>12}")
+    try:
+        results = []
+        for label, fill in (("逐run替换", legacy_fill), ("单遍填充", single_pass_fill)):
+            docx = Document(path)
+            stages, passes = fill(docx, values, placeholder_map)
+            filled, leftover = count_result(docx)
+            print(f"{label:<12}{sum(seconds for _, seconds in stages):>10.2f}{passes:>10}{filled:>10}{leftover:>12}")
+            results.append((label, stages))
+        for label, stages in results:
+            print(f"{label} 各阶段: " + "，".join(f"{stage} {seconds:.3f}s" for stage, seconds in stages))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# 大模型客户端基准：对本地模拟服务并发发起请求，比较每次新建连接与连接池复用的吞吐和尾延迟，
+# 并统计重试次数和最终失败率。无需网络和 API 密钥。
+# 用法（在项目根目录下）：
+#   python script/bench_llm.py [--requests 400] [--concurrency 16] [--latency 50] [--error-rate 0.05] [--hang-rate 0.01]
+#   python script/bench_llm.py --url http://127.0.0.1:8765/api/v1    使用单独启动的模拟服务
+import os, sys, time, argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from services.llm_client import HTTPBackend, LLMClient, LLMError
+import mock_llm_server
+
+MESSAGES = [{"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "甲方向乙方采购一批设备，请提取合同关键词。"}]
+
+
+class NoPoolBackend(HTTPBackend):
+    """每次请求新建连接的对照组（与逐次调用 Generation.call 的连接行为一致）"""
+    def generate(self, messages, model, timeout):
+        self.session.close()
+        return super().generate(messages, model, timeout)
+
+
+def run(client, requests, concurrency):
+    """并发发起 requests 次调用，返回 (总耗时, 成功请求的延迟毫秒列表, 失败数)"""
+    def one(_):
+        start = time.perf_counter()
+        try:
+            client.chat(MESSAGES)
+            return time.perf_counter() - start
+        except LLMError:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    total = time.perf_counter() - start
+    latencies = [r * 1000 for r in results if r is not None]
+    return total, latencies, results.count(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型客户端吞吐与尾延迟基准（本地模拟服务）")
+    parser.add_argument("--url", help="已启动的模拟服务地址，默认在进程内启动")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=50, help="模拟服务平均延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=10, help="模拟服务延迟标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="返回 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="返回 429 的比例")
+    parser.add_argument("--hang-rate", type=float, default=0.01, help="不响应的比例")
+    parser.add_argument("--timeout", type=float, default=2, help="单次调用截止时间（秒，含重试）")
+    parser.add_argument("--attempt-timeout", type=float, default=0.5, help="单次请求超时（秒），超时后重试")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = mock_llm_server.start(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                                            error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                                            hang_rate=args.hang_rate, hang=args.timeout * 2, seed=args.seed)
+    print(f"模拟服务: {url}，请求: {args.requests}，并发: {args.concurrency}，截止时间: {args.timeout}s")
+
+    print(f"{'模式':<14}{'请求/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'重试':>8}{'失败率':>8}{'新连接':>8}")
+    for label, backend_class, retries in [("新建连接", NoPoolBackend, args.retries),
+                                          ("连接池", HTTPBackend, args.retries),
+                                          ("连接池不重试", HTTPBackend, 0)]:
+        backend = backend_class(url, "mock-key", pool_size=args.concurrency)
+        client = LLMClient(backend, "qwen-turbo", timeout=args.timeout, max_retries=retries, backoff=0.05)
+        # 单次请求超时短于截止时间，卡住的请求会被放弃并重试
+        backend_generate = backend.generate
+        backend.generate = lambda messages, model, timeout: backend_generate(messages, model, min(timeout, args.attempt_timeout))
+        connections = server.connections if server else 0
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull  # 屏蔽重试日志
+            try:
+                total, latencies, failures = run(client, args.requests, args.concurrency)
+            finally:
+                sys.stdout = stdout
+        client.close()
+        new_connections = (server.connections - connections) if server else "-"
+        p50, p99, worst = np.percentile(latencies, [50, 99, 100]) if latencies else (0, 0, 0)
+        print(f"{label:<14}{args.requests / total:>10.1f}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}"
+              f"{client.stats()['retries']:>8}{failures / args.requests:>8.1%}{new_connections:>8}")
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# 界面日志基准：后台线程连续输出大量日志时，比较原先每行追加到 QTextEdit 并调用 processEvents 的方式与
+# 日志缓冲（services/log_sink.py，定时批量写入、限制保留行数）在界面线程中处理日志所花的时间，以及界面线程的
+# 响应情况（每 10ms 触发一次的心跳定时器的最大间隔）。缓冲方式按固定速率写入，总耗时主要取决于刷新间隔。
+# 原先的方式在 processEvents 中会递归处理排队的日志，日志产生快于界面处理时递归过深导致进程崩溃，
+# 因此每次运行放在独立的子进程中。使用 offscreen 平台，无需显示器。
+# 用法（在项目根目录下）：
+#   python script/bench_log_sink.py [--lines 2000 10000] [--rate 2000]
+import os, sys, json, time, argparse, subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QTextEdit
+from core.config import LOG_BUFFER_LINES, LOG_FLUSH_MAX_LINES, LOG_FLUSH_MS, LOG_MAX_LINES
+from services.log_sink import LogBuffer
+
+BURST = 100  # 后台线程按批输出，每批 100 行
+
+
+class Producer(QThread):
+    progress = pyqtSignal(str)
+
+    def __init__(self, lines, rate):
+        super().__init__()
+        self.lines = lines
+        self.rate = rate
+
+    def run(self):
+        start = time.perf_counter()
+        for i in range(self.lines):
+            self.progress.emit(f"行{i + 1}: 占位符提取进度 {i}/{self.lines}，示例日志内容用于测量界面开销")
+            if self.rate and i % BURST == BURST - 1:
+                time.sleep(max(0.0, start + (i + 1) / self.rate - time.perf_counter()))
+
+
+def run(app, lines, rate, buffered):
+    """运行一次，返回 (全部日志显示完的耗时, 界面线程处理日志的耗时, 心跳最大间隔 ms, 日志控件中的行数)"""
+    text = QTextEdit()
+    text.setReadOnly(True)
+    text.resize(900, 400)
+    text.show()
+    producer = Producer(lines, rate)
+    state = {"shown": 0, "busy": 0.0, "last": time.perf_counter(), "max_gap": 0.0}
+
+    def heartbeat():
+        now = time.perf_counter()
+        state["max_gap"] = max(state["max_gap"], now - state["last"])
+        state["last"] = now
+
+    if buffered:
+        buffer = LogBuffer(LOG_BUFFER_LINES)
+        text.document().setMaximumBlockCount(LOG_MAX_LINES)
+
+        def flush():
+            started = time.perf_counter()
+            batch, dropped = buffer.drain(LOG_FLUSH_MAX_LINES)
+            if batch:
+                text.append("\n".join(batch))
+                text.verticalScrollBar().setValue(text.verticalScrollBar().maximum())
+                text.repaint()
+            state["shown"] += len(batch) + dropped
+            state["busy"] += time.perf_counter() - started
+
+        producer.progress.connect(buffer.put, Qt.DirectConnection)
+        flush_timer = QTimer()
+        flush_timer.timeout.connect(flush)
+        flush_timer.start(LOG_FLUSH_MS)
+    else:
+        def update_log(message):
+            # processEvents 中会嵌套调用本函数，只统计最外层的耗时
+            state["depth"] = state.get("depth", 0) + 1
+            started = time.perf_counter()
+            text.append(message)
+            text.verticalScrollBar().setValue(text.verticalScrollBar().maximum())
+            QApplication.processEvents()
+            state["shown"] += 1
+            state["depth"] -= 1
+            if not state["depth"]:
+                state["busy"] += time.perf_counter() - started
+
+        producer.progress.connect(update_log)
+
+    beat = QTimer()
+    beat.timeout.connect(heartbeat)
+    beat.start(10)
+    start = time.perf_counter()
+    producer.start()
+    while state["shown"] < lines:
+        app.processEvents()
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    beat.stop()
+    producer.wait()
+    text.close()
+    return elapsed, state["busy"], state["max_gap"] * 1000, text.document().blockCount()
+
+
+def child(lines, rate, buffered):
+    """子进程：运行一种方式，输出结果"""
+    app = QApplication(sys.argv[:1])
+    print(json.dumps(run(app, lines, rate, buffered)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面日志基准")
+    parser.add_argument("--lines", type=int, nargs="+", default=[2000, 10000], help="日志行数，可指定多个")
+    parser.add_argument("--rate", type=int, default=2000, help="后台线程每秒输出的日志行数，0为不限速")
+    parser.add_argument("--child", nargs=2, type=int, metavar=("LINES", "BUFFERED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.rate, bool(args.child[1]))
+        return
+
+    print(f"后台线程输出速率: {args.rate or '不限'} 行/秒")
+    print(f"{'行数':>8}{'方式':>10}{'总耗时(s)':>12}{'界面线程耗时(s)':>16}{'心跳最大间隔(ms)':>18}{'控件行数':>10}")
+    for lines in args.lines:
+        for label, buffered in (("逐行刷新", 0), ("缓冲批量", 1)):
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--rate", str(args.rate),
+                                     "--child", str(lines), str(buffered)], capture_output=True, text=True)
+            output = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not output:
+                crashed = "RecursionError" in result.stderr
+                print(f"{lines:>8}{label:>10}  运行失败{'（processEvents 递归过深）' if crashed else ''}")
+                continue
+            elapsed, busy, gap, blocks = json.loads(output[-1])
+            print(f"{lines:>8}{label:>10}{elapsed:>12.2f}{busy:>16.2f}{gap:>18.0f}{blocks:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# 多进程内存基准：N 个工作进程各自加载全部知识库索引，比较读入进程堆与只读内存映射两种方式的
+# 每进程常驻内存（RSS）和按共享比例分摊后的内存（PSS），以及索引加载耗时。
+# 用法（在项目根目录下，仅支持 Linux）：
+#   python script/bench_memory.py [--workers 4] [--size 200000]          合成知识库
+#   python script/bench_memory.py --workers 4 --rag-dir demo/contracts/RAG 项目自带知识库
+import os, sys, time, argparse, tempfile
+import multiprocessing as mp
+import numpy as np
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+from services.knowledge_base import KnowledgeBase
+
+
+def read_memory(pid):
+    """从 /proc/<pid>/smaps_rollup 读取 RSS 和 PSS（MB）"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def worker(type_paths, mode, queries, ready, release):
+    """加载索引并执行检索（使索引页真正驻留），上报后等待主进程测量完毕"""
+    import faiss
+    faiss.omp_set_num_threads(1)
+
+    start = time.perf_counter()
+    knowledge_bases = [] if mode == "baseline" else [KnowledgeBase.load(path, mmap=(mode == "mmap")) for path in type_paths]
+    load_time = time.perf_counter() - start
+    for knowledge_base in knowledge_bases:
+        rng = np.random.RandomState(os.getpid())
+        knowledge_base.index.search(rng.randn(queries, knowledge_base.index.d).astype("float32"), 5)
+    ready.put((os.getpid(), load_time))
+    release.wait()
+
+
+def run_mode(type_paths, mode, workers, queries):
+    """启动 workers 个进程，全部加载完成后同时测量，返回每个进程的测量结果"""
+    context = mp.get_context("spawn")  # 不继承父进程内存，结果与独立启动的服务进程一致
+    ready, release = context.Queue(), context.Event()
+    processes = [context.Process(target=worker, args=(type_paths, mode, queries, ready, release)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [ready.get() for _ in processes]
+    results = [dict(read_memory(pid), load_time=load_time) for pid, load_time in reports]
+    release.set()
+    for process in processes:
+        process.join()
+    return results
+
+
+def build_synthetic(root, size, dimension, index_type):
+    """在临时目录中生成一个合成知识库，返回其目录"""
+    type_path = os.path.join(root, "Synthetic")
+    vectors = np.random.RandomState(0).randn(size, dimension).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    filenames = [f"模板{i}.txt" for i in range(size)]
+    KnowledgeBase.build(type_path, filenames, vectors, index_type=index_type).save()
+    return type_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程索引内存基准（堆内读取 vs 内存映射）")
+    parser.add_argument("--workers", type=int, default=4, help="工作进程数")
+    parser.add_argument("--rag-dir", help="知识库根目录（如 demo/contracts/RAG），默认生成合成知识库")
+    parser.add_argument("--size", type=int, default=200000, help="合成知识库的模板数量")
+    parser.add_argument("--dimension", type=int, default=384, help="合成向量维度")
+    parser.add_argument("--index-type", default="flat", help="合成知识库的索引类型 flat/hnsw/ivf")
+    parser.add_argument("--queries", type=int, default=20, help="每个进程加载后执行的检索次数")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("需要 Linux 的 /proc/<pid>/smaps_rollup 才能测量 PSS")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as root:
+        if args.rag_dir:
+            type_paths = [os.path.join(args.rag_dir, name) for name in sorted(os.listdir(args.rag_dir))
+                          if os.path.isdir(os.path.join(args.rag_dir, name))]
+        else:
+            print(f"生成合成知识库: {args.size} x {args.dimension} ({args.index_type})")
+            type_paths = [build_synthetic(root, args.size, args.dimension, args.index_type)]
+        index_size = sum(os.path.getsize(os.path.join(path, name)) for path in type_paths
+                         for name in os.listdir(path) if name.endswith((".index", ".npy"))) / 1024 / 1024
+        print(f"知识库: {len(type_paths)} 个，索引文件共 {index_size:.1f} MB，工作进程: {args.workers}")
+
+        print(f"{'模式':<10}{'RSS/进程(MB)':>14}{'PSS/进程(MB)':>14}{'PSS合计(MB)':>14}{'加载(ms)':>10}")
+        for mode in ["baseline", "heap", "mmap"]:
+            results = run_mode(type_paths, mode, args.workers, args.queries)
+            rss = np.mean([r["Rss"] for r in results])
+            pss = [r["Pss"] for r in results]
+            load_time = np.mean([r["load_time"] for r in results]) * 1000
+            print(f"{mode:<10}{rss:>14.1f}{np.mean(pss):>14.1f}{sum(pss):>14.1f}{load_time:>10.1f}")
+        print("baseline 为只导入 faiss/numpy、不加载索引的进程；PSS 将共享页按进程数分摊，合计即真实占用")
+
+
+if __name__ == "__main__":
+    main()
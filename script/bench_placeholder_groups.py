@@ -0,0 +1,93 @@
+# 占位符分组基准：比较单次调用提取全部占位符与按 PH_GROUP_SIZE 分组并发提取的端到端耗时和 JSON 失败率
+# 用法（在项目根目录下）：
+#   python script/bench_placeholder_groups.py [--placeholders 172] [--trials 10] [--group-sizes 0,20,40,80]
+# 使用本地模拟服务：回复耗时随输出长度增长（--char-latency），输出越长越容易被截断成不合法的 JSON
+# （每个占位符 --truncate-rate 的概率），与真实模型长输出变慢、出错的特性一致。无需网络和 API 密钥。
+import os, sys, re, json, time, random, argparse, tempfile
+from contextlib import redirect_stdout
+import numpy as np
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+import mock_llm_server
+
+
+def make_reply(truncate_rate, seed):
+    """根据提示词中的关键词生成 JSON 回复，按关键词数量决定被截断的概率"""
+    rng = random.Random(seed)
+
+    def reply(messages):
+        keys = re.search(r"需要提取的关键词：\s*\n\s*(.*)\n", messages[-1]["content"]).group(1).split(",")
+        text = json.dumps({key: f"{key}的值" for key in keys}, ensure_ascii=False, indent=2)
+        if rng.random() < 1 - (1 - truncate_rate) ** len(keys):
+            text = text[:rng.randint(1, len(text) - 1)]  # 输出在中途被截断
+        return text
+    return reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description="占位符分组提取基准（本地模拟服务）")
+    parser.add_argument("--placeholders", type=int, default=172, help="占位符数量")
+    parser.add_argument("--trials", type=int, default=10, help="每种分组大小的提取次数")
+    parser.add_argument("--group-sizes", default="0,20,40,80", help="依次测试的 PH_GROUP_SIZE，0 为单次调用")
+    parser.add_argument("--workers", type=int, default=4, help="PH_GROUP_WORKERS")
+    parser.add_argument("--latency", type=float, default=300, help="每次调用的固定延迟（毫秒）")
+    parser.add_argument("--char-latency", type=float, default=1.0, help="每个输出字符的生成延迟（毫秒）")
+    parser.add_argument("--truncate-rate", type=float, default=0.003, help="每个占位符使输出被截断的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server, url = mock_llm_server.start(latency=args.latency / 1000, jitter=0, char_latency=args.char_latency / 1000,
+                                        reply=make_reply(args.truncate_rate, args.seed), seed=args.seed)
+    os.environ["LLM_BASE_URL"] = url
+    os.chdir(DEMO_DIR)
+    import services.contract as contract
+    contract.PH_GROUP_WORKERS = args.workers
+
+    names = [f"占位符{i}" for i in range(args.placeholders)]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8", delete=False) as f:
+        json.dump({"placeholders": names}, f, ensure_ascii=False)
+        ph_path = f.name
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        contract_service = contract.ContractService(lazy=True)
+    contract_service.llm_cache_enabled = False
+
+    print(f"占位符: {args.placeholders}，每组 {args.trials} 次，并发上限: {args.workers}，"
+          f"延迟: {args.latency:.0f}ms + {args.char_latency}ms/字符，截断率: {args.truncate_rate}/占位符")
+    print(f"{'分组大小':<10}{'组数':>6}{'p50(s)':>10}{'max(s)':>10}{'调用失败率':>12}{'缺失键比例':>12}")
+    try:
+        for group_size in [int(size) for size in args.group_sizes.split(",")]:
+            contract.PH_GROUP_SIZE = group_size
+            groups = len(contract_service.placeholder_groups(names))
+            requests_before = server.requests
+            latencies, missing = [], 0
+            failed_calls = 0
+
+            original = contract_service.extract_ph_group
+            def counted(messages):
+                nonlocal failed_calls
+                result = original(messages)
+                failed_calls += not result
+                return result
+            contract_service.extract_ph_group = counted
+
+            for trial in range(args.trials):
+                with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    result = contract_service.extract_ph(f"第{trial}次会议纪要", ph_path)
+                    latencies.append(time.perf_counter() - start)
+                missing += sum(1 for name in names if name not in result)
+            contract_service.extract_ph_group = original
+
+            calls = server.requests - requests_before
+            label = str(group_size) if group_size else "单次调用"
+            print(f"{label:<10}{groups:>6}{np.percentile(latencies, 50):>10.2f}{max(latencies):>10.2f}"
+                  f"{failed_calls / calls:>12.1%}{missing / (args.placeholders * args.trials):>12.1%}")
+    finally:
+        os.remove(ph_path)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# 量化索引报告：在合成模板向量上比较 flat / sq8 / pq 的每向量内存、召回率损失和查询延迟
+# 用法（在项目根目录下）：python script/bench_quantization.py [--size 100000] [--queries 300] [--k 10]
+# recall@k 以 flat 精确检索为基准，分别给出不重排（rescore=0）和用原始向量重排后的结果。
+# 每向量内存为常驻内存的索引大小；重排使用的原始向量以内存映射方式读取，只访问候选所在的页。
+import os, sys, time, argparse, tempfile
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from services.knowledge_base import KnowledgeBase
+from bench_ann import synthetic_corpus, make_queries, recall_at_k
+
+
+def measure(knowledge_base, queries, k):
+    """逐条查询，返回 (结果ID矩阵, p50毫秒)"""
+    results = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = knowledge_base.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results[row] = ids[0]
+    return results, float(np.percentile(latencies, 50)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化索引内存与召回率报告")
+    parser.add_argument("--size", type=int, default=100000, help="合成模板数量")
+    parser.add_argument("--dimension", type=int, default=384, help="向量维度（all-MiniLM-L6-v2 为 384）")
+    parser.add_argument("--clusters", type=int, default=200, help="合成语料的聚类数")
+    parser.add_argument("--noise", type=float, default=1.0, help="查询相对语料向量的噪声幅度")
+    parser.add_argument("--queries", type=int, default=300, help="查询数量")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    vectors, rng = synthetic_corpus(args.size, args.dimension, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    filenames = [f"模板{i}.txt" for i in range(args.size)]
+    print(f"语料: {args.size} x {args.dimension}，查询: {args.queries}，k={args.k}")
+
+    # (索引类型, 构建参数, 依次测试的 rescore)
+    configs = [
+        ("flat", {}, [0]),
+        ("sq8", {}, [0, 2, 4]),
+        ("pq", {"m": 96}, [0, 4, 10]),
+        ("pq", {"m": 48}, [0, 4, 10, 20]),
+        ("pq", {"m": 24}, [0, 10, 20, 40]),
+    ]
+
+    truth = None
+    print(f"{'索引':<10}{'rescore':>8}{'字节/向量':>10}{'压缩比':>8}{'recall@k':>10}{'召回损失':>10}{'p50(ms)':>10}")
+    with tempfile.TemporaryDirectory() as root:
+        for index_type, params, rescores in configs:
+            type_path = os.path.join(root, f"{index_type}{params.get('m', '')}")
+            KnowledgeBase.build(type_path, filenames, vectors, index_type=index_type, params=params).save()
+            # 与服务相同的加载方式：索引和原始向量都以只读内存映射打开
+            knowledge_base = KnowledgeBase.load(type_path, mmap=True)
+            bytes_per_vector = faiss.serialize_index(knowledge_base.index).nbytes / args.size
+            label = index_type + (f" m={params['m']}" if "m" in params else "")
+            for rescore in rescores:
+                knowledge_base.meta["index_params"] = dict(knowledge_base.index_params, rescore=rescore)
+                results, p50 = measure(knowledge_base, queries, args.k)
+                if truth is None:
+                    truth = results
+                recall = recall_at_k(results, truth)
+                ratio = args.dimension * 4 / bytes_per_vector
+                print(f"{label:<10}{rescore:>8}{bytes_per_vector:>10.1f}{ratio:>8.1f}{recall:>10.3f}{1 - recall:>10.3f}{p50:>10.3f}")
+    print(f"字节/向量含每个向量 8 字节的 ID 映射；原始向量文件另占磁盘 {args.dimension * 4} 字节/向量，仅按需映射")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# 启动耗时基准：比较同步加载与后台加载两种模式下的首帧绘制时间和首次推荐时间
+# 用法（在项目根目录下）：python script/bench_startup.py [--runs 3] [--query "..."]
+import os, sys, time, json, argparse, subprocess
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+
+
+def run_child(mode, query):
+    """
+    在当前进程中测量一次启动：
+    - first_paint: 进程启动到主窗口第一次收到 Paint 事件的时间
+    - first_recommendation: 进程启动到首次向量检索返回结果的时间（不含大模型调用）
+    """
+    t0 = time.perf_counter()
+    sys.path.insert(0, DEMO_DIR)
+    os.chdir(DEMO_DIR)
+
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    from services.contract import ContractService
+    from core.config import TEMPLATE_DIR
+    import demo
+
+    timings = {}
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and "first_paint" not in timings:
+                timings["first_paint"] = time.perf_counter() - t0
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    app = QApplication(sys.argv[:1])
+    service = ContractService(lazy=(mode == "lazy"))
+    window = demo.ContractGenerator(service)
+    watcher = PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    app.exec_()
+
+    # 首次推荐：等待（而不是重新触发）后台加载，然后执行一次检索
+    service.ensure_loaded()
+    contract_type = next(iter(service.get_template_types()), None)
+    if contract_type is not None and contract_type in service.index:
+        categories_map = service.load_contract_categories(TEMPLATE_DIR, contract_type)
+        service.advanced_search_in_knowledge_base(
+            service.clean_text_for_legal(query),
+            service.model,
+            service.knowledge_bases[contract_type],
+            service.knowledge_bases[contract_type].templates,
+            categories_map,
+            query,
+            top_k=5
+        )
+    timings["first_recommendation"] = time.perf_counter() - t0
+
+    # 等待后台线程退出，避免 QThread 在进程退出时被销毁
+    if window.resource_worker is not None and window.resource_worker.isRunning():
+        window.resource_worker.wait()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合同生成器启动耗时基准")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式的运行次数")
+    parser.add_argument("--query", default="保管合同 保管物 保管费 仓储", help="首次推荐使用的查询")
+    parser.add_argument("--mode", choices=["eager", "lazy"], help="仅在子进程中使用")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_child(args.mode, args.query)))
+        return
+
+    # 每次测量都在独立进程中进行，保证模块导入和模型加载不受缓存影响
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    print(f"{'模式':<8}{'首帧绘制(s)':>14}{'首次推荐(s)':>14}")
+    for mode in ["eager", "lazy"]:
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--query", args.query],
+                check=True, capture_output=True, text=True, encoding="utf-8"
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        paint = sorted(r["first_paint"] for r in results)[len(results) // 2]
+        recommend = sorted(r["first_recommendation"] for r in results)[len(results) // 2]
+        print(f"{mode:<8}{paint:>14.3f}{recommend:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
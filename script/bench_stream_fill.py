@@ -0,0 +1,121 @@
+# 流式填充基准：在不同页数的合成模板上比较当前生成路径（python-docx 加载 + FillPlan 填充和清理 + 保存）
+# 与流式 OOXML 填充（services/ooxml_stream.py）的耗时和峰值内存。每种方式在独立的子进程中运行，峰值内存取子进程的
+# 最大常驻内存（Linux 下读取 /proc/self/status 的 VmHWM；ru_maxrss 会继承父进程在 fork 时的峰值），其中包含
+# Python 解释器和模块本身约 20-30MB 的基础占用。流式填充同时测量不原样复制压缩数据（解压后重新写入其余部件）的回退方式。
+# 每个输出都会校验：zip 的 CRC 校验通过（testzip），且能被 python-docx 打开；校验失败时以非零状态退出。
+# 用法（在项目根目录下）：
+#   python script/bench_stream_fill.py [--pages 100 500 1000] [--placeholders 1000] [--split-rate 0.3]
+import os, sys, json, time, resource, argparse, tempfile, subprocess
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_docx(template, output, values):
+    from docx import Document
+    from services.fill_engine import FillPlan, document_roots
+
+    docx = Document(template)
+    plan = FillPlan(document_roots(docx))
+    for key in plan.keys:
+        if key in values:
+            plan.fill(key, values[key])
+    plan.finish()
+    docx.save(output)
+
+
+def run_stream(template, output, values, raw_copy=True):
+    from services.ooxml_stream import stream_fill
+
+    stats = stream_fill(template, output, values, raw_copy=raw_copy)
+    expected = "copied_parts" if raw_copy else "recompressed_parts"
+    if not stats[expected]:
+        raise RuntimeError(f"未按预期方式复制其余部件: {stats}")
+
+
+def run_recompress(template, output, values):
+    run_stream(template, output, values, raw_copy=False)
+
+
+METHODS = {"docx": run_docx, "stream": run_stream, "recompress": run_recompress}
+
+
+def verify(output):
+    """输出可以作为 zip 完整读取且能被 python-docx 打开"""
+    import zipfile
+    from docx import Document
+
+    with zipfile.ZipFile(output) as archive:
+        if archive.testzip() is not None:
+            return False
+    Document(output)
+    return True
+
+
+def child(method, template, output):
+    """子进程：只执行一种填充方式，输出耗时和峰值内存"""
+    with open(template + ".json", "r", encoding="utf-8") as f:
+        values = json.load(f)
+    start = time.perf_counter()
+    METHODS[method](template, output, values)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "peak_mb": peak_kb() / 1024}))
+
+
+def peak_kb():
+    """当前进程的峰值常驻内存（KB）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else peak  # macOS 下单位为字节
+
+
+def measure(method, template, output):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", method, template, output],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式填充基准（合成模板）")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 500, 1000], help="模板页数，可指定多个")
+    parser.add_argument("--placeholders", type=int, default=1000, help="不同占位符的数量")
+    parser.add_argument("--split-rate", type=float, default=0.3, help="被拆分到多个 run 中的占位符比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", nargs=3, metavar=("METHOD", "TEMPLATE", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    from bench_fill import build_template
+
+    values = {f"字段{i}": f"值{i}" for i in range(0, args.placeholders, 2)}  # 一半占位符有值
+    failed = False
+    print(f"{'页数':>6}{'模板(MB)':>10}{'方式':>10}{'耗时(s)':>10}{'峰值内存(MB)':>14}{'输出(MB)':>10}{'校验':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in args.pages:
+            template = os.path.join(directory, f"template_{pages}.docx")
+            build_template(template, pages, args.placeholders, args.split_rate, args.seed)
+            with open(template + ".json", "w", encoding="utf-8") as f:
+                json.dump(values, f, ensure_ascii=False)
+            size = os.path.getsize(template) / 1024 / 1024
+            for method, label in (("docx", "当前"), ("stream", "流式"), ("recompress", "流式重压缩")):
+                output = os.path.join(directory, f"{method}_{pages}.docx")
+                result = measure(method, template, output)
+                valid = verify(output)
+                failed = failed or not valid
+                print(f"{pages:>6}{size:>10.1f}{label:>10}{result['seconds']:>10.2f}{result['peak_mb']:>14.0f}"
+                      f"{os.path.getsize(output) / 1024 / 1024:>10.1f}{'通过' if valid else '失败':>6}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# 耗时追踪开销基准：比较未启用追踪和启用追踪时 span/traced 每次调用的额外耗时，以及每条追踪结束时
+# 累计直方图、追加 JSON 行和更新 Prometheus 文件（services/tracing.py）的耗时。
+# 用法（在项目根目录下）：
+#   python script/bench_tracing.py [--calls 200000] [--traces 200] [--spans 20]
+import os, sys, time, argparse, tempfile
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+from services.timing import span, traced
+from services.tracing import disable_tracing, enable_tracing, trace
+
+
+def plain():
+    pass
+
+
+@traced("decorated")
+def decorated():
+    pass
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def with_span():
+    with span("stage"):
+        pass
+
+
+def measure(calls):
+    """[(方式, 每次调用耗时 ns), ...]，在当前追踪状态下测量"""
+    baseline = per_call_ns(plain, calls)
+    return [("直接调用", baseline), ("span", per_call_ns(with_span, calls)),
+            ("traced", per_call_ns(decorated, calls))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="耗时追踪开销基准")
+    parser.add_argument("--calls", type=int, default=200000, help="每种方式的调用次数")
+    parser.add_argument("--traces", type=int, default=200, help="测量导出耗时的追踪条数")
+    parser.add_argument("--spans", type=int, default=20, help="每条追踪中的阶段数")
+    args = parser.parse_args()
+
+    disable_tracing()
+    with trace("bench"):
+        disabled = measure(args.calls)
+    with tempfile.TemporaryDirectory() as directory:
+        enable_tracing()  # 只累计直方图，不写文件，测量记录阶段本身的开销
+        # 启用时每次调用都会留下一条记录，分批放在多条追踪中测量，避免单条追踪过大
+        batches = []
+        for _ in range(max(1, args.calls // 10000)):
+            with trace("bench"):
+                batches.append(measure(min(args.calls, 10000)))
+        enabled = [(label, sum(batch[i][1] for batch in batches) / len(batches))
+                   for i, (label, _) in enumerate(batches[0])]
+
+        print(f"{'方式':>10}{'未启用(ns/次)':>16}{'启用(ns/次)':>14}")
+        for (label, off), (_, on) in zip(disabled, enabled):
+            print(f"{label:>10}{off:>16.0f}{on:>14.0f}")
+
+        recorder = enable_tracing(os.path.join(directory, "traces.jsonl"), os.path.join(directory, "latency.prom"))
+        start = time.perf_counter()
+        for _ in range(args.traces):
+            with trace("bench"):
+                for i in range(args.spans):
+                    with span(f"stage{i}"):
+                        pass
+        seconds = (time.perf_counter() - start) / args.traces
+        print(f"每条追踪（{args.spans} 个阶段）记录并写入 JSON 行和指标文件: {seconds * 1000:.2f}ms，"
+              f"指标文件 {os.path.getsize(recorder.prometheus_path) / 1024:.1f}KB")
+        disable_tracing()
+
+
+if __name__ == "__main__":
+    main()
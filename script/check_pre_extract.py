@@ -0,0 +1,52 @@
+# 占位符规则预提取回归检查：对一组会议纪要片段运行 RuleExtractor（services/pre_extract.py），核对预提取结果。
+# 预提取的值会覆盖大模型的结果，因此除了应当提取的情况，也覆盖了必须交给大模型的情况（多个取值、周期和区间、
+# 当事人的身份描述等）。任一用例不符时以非零状态退出，可直接用于 CI 检查。
+# 用法（在项目根目录下）：python script/check_pre_extract.py
+import os, sys
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+from services.pre_extract import RuleExtractor
+
+# (纪要片段, 占位符列表, 期望的预提取结果)
+CASES = [
+    # 明确给出且格式校验通过
+    ("联系电话：13800138000，", ["联系电话"], {"联系电话": "13800138000"}),
+    ("租金：5000元，", ["租金"], {"租金": "5000元"}),
+    ("签订日期为2024年1月1日", ["签订日期"], {"签订日期": "2024年1月1日"}),
+    ("身份证号码：11010519491231002X", ["身份证号码"], {"身份证号码": "11010519491231002X"}),
+    ("甲方：北京某某科技有限公司，", ["甲方"], {"甲方": "北京某某科技有限公司"}),
+    ("甲方名称：上海华东机械制造有限公司。", ["甲方名称"], {"甲方名称": "上海华东机械制造有限公司"}),
+    ("住所：北京市海淀区中关村大街1号，", ["住所"], {"住所": "北京市海淀区中关村大街1号"}),
+    # 多个取值、周期和区间：交给大模型
+    ("联系电话分别为13800138000和13900139000。", ["联系电话"], {}),
+    ("租金为每月5000元，", ["租金"], {}),
+    ("租金为5000元/月", ["租金"], {}),
+    ("有效期2024年1月1日至2024年12月31日", ["日期"], {}),
+    # 当事人的身份描述不是名称：交给大模型
+    ("经协商，甲方为买方，乙方为卖方", ["甲方", "乙方"], {}),
+    ("甲方是本公司", ["甲方名称"], {}),
+    ("甲方是一家科技公司", ["甲方名称"], {}),
+    ("乙方为供货方", ["乙方名称"], {}),
+    ("甲方：本公司，", ["甲方"], {}),
+    ("乙方：出租人，", ["乙方"], {}),
+    ("甲方：张三，", ["甲方"], {}),
+]
+
+
+def main():
+    extractor = RuleExtractor()
+    failures = 0
+    for text, placeholders, expected in CASES:
+        actual = extractor.extract(text, placeholders)
+        if actual != expected:
+            failures += 1
+            print(f"不符: {text}\n  占位符: {placeholders}\n  期望: {expected}\n  实际: {actual}")
+    if failures:
+        print(f"\n{failures}/{len(CASES)} 个用例不符")
+        sys.exit(1)
+    print(f"检查通过：{len(CASES)} 个用例")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# 编译模板的占位符位置表，存放在各模板目录下的“占位符位置”目录中，生成合同时直接按位置填充
+# 模板修改后位置表的哈希不再一致，会在下次生成时自动重新扫描；也可以重新运行本脚本
+# 用法（在项目根目录下）：
+#   python script/compilePlaceholderMap.py [--type Ministerial] [--force]
+import os, sys, time, argparse
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+sys.path.insert(0, DEMO_DIR)
+from services.placeholder_map import compile_template, map_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译模板占位符位置表")
+    parser.add_argument("--dir", default=os.path.join(DEMO_DIR, "contracts", "tran_template"), help="模板根目录")
+    parser.add_argument("--type", help="只处理指定的合同类型目录，如 Ministerial")
+    parser.add_argument("--force", action="store_true", help="哈希一致也重新编译")
+    args = parser.parse_args()
+
+    types = [args.type] if args.type else sorted(os.listdir(args.dir))
+    start = time.perf_counter()
+    compiled = skipped = failed = 0
+    for contract_type in types:
+        folder = os.path.join(args.dir, contract_type)
+        if not os.path.isdir(folder):
+            continue
+        file_names = sorted(name for name in os.listdir(folder) if name.endswith(".docx"))
+        for i, file_name in enumerate(file_names, start=1):
+            docx_path = os.path.join(folder, file_name)
+            try:
+                if compile_template(docx_path, args.force):
+                    compiled += 1
+                    print(f"已编译: {map_path(docx_path)} 进度:{i}/{len(file_names)}")
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                print(f"文件有问题，不做处理: {file_name} ({str(e)})")
+    print(f"全部完成: 编译 {compiled} 个，未变化 {skipped} 个，失败 {failed} 个，耗时 {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# 导入耗时报告：基于 python -X importtime 统计各服务模块的导入耗时，并检查重型依赖是否被提前导入
+# 用法（在项目根目录下）：python script/import_report.py [--top 15]
+# 若某个模块在导入时拉入了不允许的重型依赖，脚本以非零状态退出，可直接用于 CI 检查
+import os, sys, re, argparse, subprocess
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo")
+
+# 重型依赖：只允许在首次用到对应功能时导入
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "dashscope", "docx", "numpy", "PyQt5", "PyQt5.QtWidgets"]
+
+# 每个被检查的模块及其导入时允许出现的重型依赖
+CHECKED_MODULES = {
+    "services.contract": [],
+    "services.pipeline": [],
+    "cli": [],
+    "services.RecommendationWorker": ["PyQt5"],
+    "services.GenerationWorker": ["PyQt5"],
+    "services.ResourceLoadWorker": ["PyQt5"],
+}
+
+# -X importtime 的输出格式：import time:  self [us] | cumulative | imported package
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def import_times(module):
+    """
+    在子进程中导入模块，返回 [(模块名, 自身耗时us, 累计耗时us, 嵌套深度), ...]
+    module 为 None 时只启动解释器，用于得到解释器启动阶段（site 等）的基线
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [DEMO_DIR, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+        cwd=DEMO_DIR, env=env, capture_output=True, text=True, encoding="utf-8"
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr}")
+    records = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务模块导入耗时报告")
+    parser.add_argument("--top", type=int, default=15, help="每个模块显示累计耗时最高的前N个依赖")
+    parser.add_argument("modules", nargs="*", help="要检查的模块，默认检查全部服务模块")
+    args = parser.parse_args()
+
+    modules = args.modules or list(CHECKED_MODULES)
+    baseline = {name for name, _, _, _ in import_times(None)}
+    violations = []
+    for module in modules:
+        records = [r for r in import_times(module) if r[0] not in baseline]
+        total = next((cumulative for name, _, cumulative, _ in records if name == module), 0)
+        print(f"\n== {module}  总导入耗时: {total / 1000:.1f} ms")
+        print(f"{'自身(ms)':>10}{'累计(ms)':>10}  模块")
+        for name, self_us, cumulative_us, depth in sorted(records, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}  {'  ' * depth}{name}")
+
+        allowed = CHECKED_MODULES.get(module, [])
+        imported = {name for name, _, _, _ in records}
+        for heavy in HEAVY_MODULES:
+            hit = any(name == heavy or name.startswith(heavy + ".") for name in imported)
+            if hit and heavy not in allowed:
+                violations.append((module, heavy))
+
+    if violations:
+        print("\n以下模块在导入时拉入了重型依赖：")
+        for module, heavy in violations:
+            print(f"  {module} -> {heavy}")
+        sys.exit(1)
+    print("\n检查通过：服务模块导入时未加载重型依赖")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# 本地大模型模拟服务：实现 DashScope 文本生成接口（/api/v1/services/aigc/text-generation/generation），
+# 按配置的延迟分布和失败率返回，用于在离线环境中测试 LLMClient 的吞吐、尾延迟、超时和重试。
+# 请求头带 X-DashScope-SSE: enable 时按 SSE 流式返回，回复被切成若干段在延迟时间内依次发出。
+# 用法（在项目根目录下）：
+#   python script/mock_llm_server.py [--port 8765] [--latency 800] [--jitter 200] [--error-rate 0.05] [--hang-rate 0.01]
+#   LLM_BASE_URL=http://127.0.0.1:8765/api/v1 python demo/cli.py recommend --type Ministerial --input 纪要.txt
+import sys, json, time, socket, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认回复可被需求分析解析为 JSON，也可作为关键词文本使用
+DEFAULT_REPLY = json.dumps({"contract_category": "买卖合同", "specific_type": "N/A", "special_concerns": []}, ensure_ascii=False)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """带可配置延迟和失败率的模拟服务，统计收到的请求数和新建连接数"""
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.8, jitter=0.2, error_rate=0.0, throttle_rate=0.0,
+                 hang_rate=0.0, hang=30.0, reply=DEFAULT_REPLY, seed=None, chunk=4, char_latency=0.0):
+        """
+        :param latency: 平均响应延迟（秒）
+        :param jitter: 延迟的标准差（秒），延迟服从截断正态分布
+        :param error_rate: 返回 500 的比例
+        :param throttle_rate: 返回 429 限流的比例
+        :param hang_rate: 长时间不响应（模拟卡住的请求）的比例
+        :param hang: 卡住的请求等待的时间（秒）
+        :param reply: 回复的文本，也可以是 callable(请求中的消息列表) -> 文本
+        :param chunk: 流式返回时每段的字符数
+        :param char_latency: 每个输出字符额外增加的延迟（秒），模拟输出越长生成越慢
+        """
+        super().__init__(address, MockHandler)
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.hang_rate, self.hang = hang_rate, hang
+        self.reply = reply
+        self.chunk = chunk
+        self.char_latency = char_latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    def draw(self):
+        """为一次请求抽取 (结果类型, 延迟秒数)"""
+        with self.lock:
+            self.requests += 1
+            roll = self.rng.random()
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter))
+        if roll < self.hang_rate:
+            return "hang", self.hang
+        roll -= self.hang_rate
+        if roll < self.error_rate:
+            return "error", delay
+        roll -= self.error_rate
+        if roll < self.throttle_rate:
+            return "throttle", 0.0
+        return "ok", delay
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持长连接，客户端的连接复用才能生效
+
+    def setup(self):
+        super().setup()
+        # 响应头和响应体分两次写出，关闭 Nagle 算法以免长连接上每个响应多等一个延迟确认
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已超时放弃该请求
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/generation"):
+            self.send_json(404, {"code": "NotFound", "message": self.path})
+            return
+        messages = request.get("input", {}).get("messages", [])
+        reply = self.server.reply(messages) if callable(self.server.reply) else self.server.reply
+        outcome, delay = self.server.draw()
+        if outcome != "hang":
+            delay += self.server.char_latency * len(reply)
+        if outcome == "ok" and self.headers.get("X-DashScope-SSE") == "enable":
+            self.send_stream(reply, delay)
+            return
+        time.sleep(delay)
+        if outcome == "error":
+            self.send_json(500, {"code": "InternalError", "message": "模拟的服务端错误"})
+        elif outcome == "throttle":
+            self.send_json(429, {"code": "Throttling", "message": "模拟的限流"})
+        else:
+            self.send_json(200, {
+                "request_id": f"mock-{self.server.requests}",
+                "output": {"choices": [{"finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": reply}}]},
+                "usage": {"input_tokens": sum(len(m.get("content", "")) for m in messages),
+                          "output_tokens": len(reply)},
+            })
+
+    def send_stream(self, reply, delay):
+        """以分块传输编码发送 SSE 事件，每个事件只包含新增的文本（incremental_output）"""
+        pieces = [reply[i:i + self.server.chunk] for i in range(0, len(reply), self.server.chunk)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for number, piece in enumerate(pieces, start=1):
+                time.sleep(delay / len(pieces))
+                finish = "stop" if number == len(pieces) else "null"
+                data = json.dumps({"output": {"choices": [{"finish_reason": finish,
+                                                           "message": {"role": "assistant", "content": piece}}]}},
+                                  ensure_ascii=False)
+                event = f"id:{number}\nevent:result\n:HTTP_STATUS/200\ndata:{data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start(port=0, **options):
+    """在后台线程中启动模拟服务，返回 (服务对象, base_url)；port 为 0 时自动选择空闲端口"""
+    server = MockLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地大模型模拟服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=800, help="平均延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=200, help="延迟标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="长时间不响应的比例")
+    parser.add_argument("--hang", type=float, default=30, help="不响应的请求等待的秒数")
+    parser.add_argument("--char-latency", type=float, default=0, help="每个输出字符增加的延迟（毫秒）")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="回复文本")
+    args = parser.parse_args()
+
+    server = MockLLMServer(("127.0.0.1", args.port), args.latency / 1000, args.jitter / 1000, args.error_rate,
+                           args.throttle_rate, args.hang_rate, args.hang, args.reply,
+                           char_latency=args.char_latency / 1000)
+    print(f"模拟服务已启动: http://127.0.0.1:{args.port}/api/v1 （Ctrl+C 退出）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"共收到 {server.requests} 个请求，{server.connections} 个连接", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
-import os,gc,re
+import os,gc,re,sys
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
 
+# 复用 demo/services 中的模板向量持久化存储
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from services.embedding_store import EmbeddingStore, model_fingerprint
+from services.knowledge_base import KnowledgeBase, create_index
+
 # 加载所有 .txt 文件的内容
 def load_txt_files(folder_path):
     """
@@ -40,25 +45,29 @@ def clean_text(text):
     return text.strip()
 
 # 将文本内容向量化
-def generate_embeddings(documents, model):
+def generate_embeddings(documents, model, store=None, model_id=None):
     """
     使用 SentenceTransformer 模型将文档内容转换为向量。
     返回文件名列表和对应的向量矩阵。
+    传入 store 时，已编码过的内容直接从向量存储读取，只对新增或变化的内容编码。
     """
     filenames, contents = zip(*documents)  # 分离文件名和内容
     # 清理内容
     contents = [clean_text(content) for content in contents]
 
-    embeddings = model.encode(contents, convert_to_tensor=False)  # 生成向量
+    if store is not None:
+        embeddings = store.encode(model, contents, model_id)
+    else:
+        embeddings = model.encode(contents, convert_to_tensor=False)  # 生成向量
     return list(filenames), np.array(embeddings).astype('float32')
 
 # 构建 FAISS 索引并保存
-def build_faiss_index(embeddings, dimension):
+def build_faiss_index(embeddings, dimension, index_type="flat", params=None):
     """
     使用 FAISS 构建向量索引。
+    index_type 可选 flat（精确）、hnsw、ivf、sq8、pq（量化），params 为索引参数（如 M、efSearch、nlist、nprobe、m）。
     """
-    index = faiss.IndexFlatL2(dimension)  # 使用 L2 距离
-    index.add(embeddings)  # 添加向量到索引
+    index, _ = create_index(index_type, embeddings.reshape(-1, dimension), np.arange(len(embeddings)), params)
     return index
 
 # 加载 FAISS 索引
@@ -77,7 +86,8 @@ def search_in_knowledge_base(query, model, index, filenames, top_k=5):
     """
     query_vector = model.encode([query], convert_to_tensor=False).astype('float32')
     distances, indices = index.search(query_vector, top_k)
-    results = [(filenames[i], distances[0][j]) for j, i in enumerate(indices[0])]
+    # 近似索引在候选不足时返回 -1，需要跳过
+    results = [(filenames[i], distances[0][j]) for j, i in enumerate(indices[0]) if i in filenames]
     return results
 
 # 主程序
@@ -85,45 +95,38 @@ if __name__ == "__main__":
     # 配置路径和模型
     folder_path = "contracts/部委/关键词" 
     model_path = 'embed_model/all-MiniLM-L6-v2'
-    index_file = "contracts/RAG/部委/knowledge_base.index"
-    filenames_file = "contracts/RAG/部委/filenames.txt"  # 定义文件名列表文件路径
+    rag_dir = "contracts/RAG/部委"  # 知识库目录（索引、元数据和文件名列表）
+    store_file = "embed_model/embedding_store.sqlite3"  # 模板向量持久化存储
+    index_type = "flat"  # 索引类型：flat/hnsw/ivf/sq8/pq，模板数量较多时可使用近似或量化索引
+    index_params = {}  # 索引参数，如 {"M": 32, "efSearch": 64} 或 {"nlist": 256, "nprobe": 16}
 
     # 加载模型
     print("加载 SentenceTransformer 模型...")
     model = SentenceTransformer(model_path)
 
-    if not os.path.isfile(index_file):
+    if not os.path.isdir(rag_dir) or not any(name.endswith(".index") for name in os.listdir(rag_dir)):
         # 加载文档并生成向量
         print("加载 .txt 文件并生成向量...")
         documents = load_txt_files(folder_path)
-        filenames, embeddings = generate_embeddings(documents, model)
+        store = EmbeddingStore(store_file)
+        model_id = f"{os.path.basename(model_path)}@{model_fingerprint(model_path)}"
+        filenames, embeddings = generate_embeddings(documents, model, store, model_id)
+        print(f"向量存储统计: {store.stats()}")
         print(f"共加载 {len(filenames)} 个文档，每个向量维度为 {embeddings.shape[1]}")
 
-        # 构建 FAISS 索引
-        print("构建 FAISS 索引...")
-        index = build_faiss_index(embeddings, embeddings.shape[1])
-
-        # 保存索引
+        # 构建 FAISS 索引并保存（索引、元数据和文件名列表）
+        print(f"构建 FAISS 索引（{index_type}）...")
+        knowledge_base = KnowledgeBase.build(rag_dir, filenames, embeddings, model_id, index_type, index_params)
         print("保存 FAISS 索引...")
-        faiss.write_index(index, index_file)
-
-        # 保存文件名列表
-        print("保存文件名列表...")
-        with open(filenames_file, "w", encoding="utf-8") as f:
-            for filename in filenames:
-                f.write(filename + "\n")
+        knowledge_base.save()
     else:
-        # 直接加载索引文件
+        # 直接加载索引和模板ID映射
         print("加载 FAISS 索引...")
-        index = load_faiss_index(index_file)
+        knowledge_base = KnowledgeBase.load(rag_dir)
+        print(f"FAISS 索引已加载（{knowledge_base.index_type}），包含 {knowledge_base.index.ntotal} 个向量")
 
-        # 加载文件名列表
-        if not os.path.isfile(filenames_file):
-            raise FileNotFoundError(f"文件名列表文件 '{filenames_file}' 不存在！")
-        
-        print("加载文件名列表...")
-        with open(filenames_file, "r", encoding="utf-8") as f:
-            filenames = [line.strip() for line in f.readlines()]
+    index = knowledge_base  # 与 FAISS 索引相同的 search 接口，量化索引会用原始向量重排
+    filenames = knowledge_base.templates  # 模板ID -> 文件名
 
     while True:
         # 示例查询
@@ -1,10 +1,18 @@
 # 给原始合同范本生成含占位符的合同模版
 import os
+import sys
 import json,markdown,subprocess
-from dashscope import Generation
 from datetime import datetime
 from docx import Document 
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo"))
+from core.config import LLM_BACKEND, LLM_BASE_URL, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF
+from services.llm_client import LLMClient, LLMError, make_backend
+
+# 所有调用共享一个客户端，复用连接并在超时、限流时自动重试
+client = LLMClient(make_backend(LLM_BACKEND, "sk-4c0e21d21fb748bd81d918e0cdc346f3", LLM_BASE_URL),
+                   "qwen-turbo", LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF)
+
 
 # 记录开始时间
 start_time = datetime.now()
@@ -22,19 +30,11 @@ def model_response(input_text):
     # 格式化消息并调用大模型 API
     messages = format_message(input_text)
     # 调用API生成响应
-    response = Generation.call(
-        api_key="sk-4c0e21d21fb748bd81d918e0cdc346f3",
-        model="qwen-turbo",
-        messages=messages,
-        result_format="message"
-    )
-    
     response_md = ""
-    if hasattr(response, 'output') and hasattr(response.output, 'choices'):
-        # 获取处理后的结果
-        response_md = response['output']['choices'][0]['message']['content']
-    else:
-        print("API响应格式不正确")
+    try:
+        response_md = client.chat(messages)
+    except LLMError as e:
+        print(f"大模型调用失败: {str(e)}")
     return response_md
 
 def test(input_folder, output_folder):